@@ -0,0 +1,250 @@
+import os
+import json
+import wave
+import struct
+import numpy as np
+
+# Acoustic onset detection and snippet extraction for the station
+# recordings.
+#
+# Recordings are read straight from the WAV data chunk, so a file that
+# arecord is still writing can be followed block by block (its header
+# sizes are not final until it closes). The detector looks at fixed
+# blocks: an event starts when the block energy rises well above a slowly
+# tracked background and the spectral flux (rise of the log spectrum since
+# the previous block) is an outlier against its recent history. The onset
+# is then refined to the first sample above the energy threshold.
+
+BLOCK = 1024             # samples per analysis block (21 ms at 48 kHz)
+ENERGY_DB = 12.0         # block energy above background to trigger
+FLUX_K = 4.0             # flux must exceed median + FLUX_K * MAD of history
+FLUX_HISTORY = 256       # blocks of flux history (~5 s)
+BACKGROUND_ALPHA = 0.01  # background energy smoothing per block
+REFRACTORY_S = 0.5       # minimum spacing between events
+
+# Sidecar fields written by record-audio.py from the GPS clock model
+CLOCK_KEYS = ("clock_offset_s", "clock_uncertainty_s", "clock_source")
+
+
+# -------------------------------
+# WAV access
+# -------------------------------
+
+def wav_layout(path):
+    """
+    (data offset, channels, bytes per sample, sample rate) of a PCM WAV,
+    found by walking the RIFF chunks rather than trusting their sizes.
+    """
+    with open(path, "rb") as f:
+        if f.read(4) != b"RIFF":
+            raise ValueError(f"{path}: not a RIFF file")
+        f.read(4)
+        if f.read(4) != b"WAVE":
+            raise ValueError(f"{path}: not a WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk yet")
+            chunk, size = struct.unpack("<4sI", header)
+            if chunk == b"fmt ":
+                body = f.read(size)
+                _, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                fmt = (channels, bits // 8, rate)
+            elif chunk == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path}: data before fmt chunk")
+                return (f.tell(),) + fmt
+            else:
+                f.seek(size + (size & 1), 1)
+
+def available_frames(path, layout):
+    """Complete frames currently on disk (grows while recording)."""
+    offset, channels, width, _ = layout
+    return max(0, (os.path.getsize(path) - offset) // (channels * width))
+
+def read_frames(path, layout, start, count):
+    """Channel 0 of frames [start, start + count) as float32 in [-1, 1)."""
+    offset, channels, width, _ = layout
+    with open(path, "rb") as f:
+        f.seek(offset + start * channels * width)
+        raw = f.read(count * channels * width)
+    n = len(raw) // (channels * width)
+    if width == 1:
+        x = (np.frombuffer(raw[:n * channels], dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw[:n * channels * 2], dtype="<i2").astype(np.float32) / 32768.0
+    else:
+        raise ValueError(f"{path}: unsupported sample width {width}")
+    return x.reshape(n, channels)[:, 0]
+
+
+# -------------------------------
+# Detection
+# -------------------------------
+
+class OnsetDetector:
+    """
+    Streaming onset detector. feed() takes consecutive samples in any
+    chunk size and returns the events completed so far as dicts with the
+    absolute sample index of the onset.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.pending = np.empty(0, dtype=np.float32)
+        self.position = 0                 # absolute index of pending[0]
+        self.background = None            # mean block power
+        self.prev_spectrum = None
+        self.flux_history = np.empty(0)
+        self.last_event = -10 ** 12
+        self.window = np.hanning(BLOCK).astype(np.float32)
+
+    def feed(self, samples):
+        x = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32)])
+        nblocks = len(x) // BLOCK
+        self.pending = x[nblocks * BLOCK:]
+        if nblocks == 0:
+            return []
+        base = self.position
+        self.position += nblocks * BLOCK
+
+        blocks = x[:nblocks * BLOCK].reshape(nblocks, BLOCK)
+        power = np.mean(blocks * blocks, axis=1) + 1e-12
+        spectrum = np.log1p(np.abs(np.fft.rfft(blocks * self.window, axis=1)))
+        prev = np.vstack([spectrum[:1] if self.prev_spectrum is None else self.prev_spectrum[None, :], spectrum[:-1]])
+        flux = np.maximum(spectrum - prev, 0.0).sum(axis=1)
+        self.prev_spectrum = spectrum[-1]
+
+        events = []
+        for b in range(nblocks):
+            if self.background is None:
+                self.background = power[b]
+            hist = self.flux_history
+            if len(hist) >= 16:
+                med = np.median(hist)
+                mad = np.median(np.abs(hist - med)) + 1e-9
+                flux_ok = flux[b] > med + FLUX_K * mad
+            else:
+                flux_ok = False
+            level_db = 10.0 * np.log10(power[b] / self.background)
+            start = base + b * BLOCK
+
+            if level_db >= ENERGY_DB and flux_ok and start - self.last_event >= REFRACTORY_S * self.rate:
+                # First sample of the block above the trigger level
+                trigger = np.sqrt(self.background * 10 ** (ENERGY_DB / 10.0))
+                above = np.flatnonzero(np.abs(blocks[b]) >= trigger)
+                onset = start + (int(above[0]) if above.size else 0)
+                events.append({"sample": onset, "energy_db": round(float(level_db), 1),
+                               "flux": round(float(flux[b]), 2)})
+                self.last_event = onset
+            else:
+                # Only quiet blocks update the background
+                self.background += BACKGROUND_ALPHA * (power[b] - self.background)
+
+            self.flux_history = np.append(hist, flux[b])[-FLUX_HISTORY:]
+        return events
+
+
+# -------------------------------
+# Event index and snippets
+# -------------------------------
+
+def sidecar_path(wav_path):
+    return os.path.splitext(wav_path)[0] + ".json"
+
+def events_path(wav_path):
+    """<name>.events.jsonl: one detected event per line, then {"done": true}."""
+    return os.path.splitext(wav_path)[0] + ".events.jsonl"
+
+def read_sidecar(wav_path):
+    try:
+        with open(sidecar_path(wav_path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_events(wav_path):
+    """(events, done) from a recording's event index."""
+    events, done = [], False
+    try:
+        with open(events_path(wav_path), "r") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("done"):
+                    done = True
+                else:
+                    events.append(entry)
+    except (OSError, ValueError):
+        pass
+    return events, done
+
+def write_wav(path, samples_u8, rate):
+    """Mono 8-bit WAV from raw U8 bytes."""
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(rate)
+        w.writeframes(samples_u8)
+
+def cut_snippet(wav_path, center_time, half_width, out_path):
+    """
+    Copy [center_time - half_width, center_time + half_width] (clamped to
+    the recording) of wav_path into out_path, with a sidecar giving its
+    exact start time and the indexed events inside it. Times are epoch
+    seconds; the recording's start comes from its sidecar.
+    Returns the snippet sidecar dict, or None if the time is not covered.
+    """
+    meta = read_sidecar(wav_path)
+    if "start_time" not in meta:
+        return None
+    layout = wav_layout(wav_path)
+    offset, channels, width, rate = layout
+    if channels != 1 or width != 1:
+        raise ValueError(f"{wav_path}: snippets support mono 8-bit recordings only")
+    total = available_frames(wav_path, layout)
+
+    first = max(0, int(round((center_time - half_width - meta["start_time"]) * rate)))
+    last = min(total, int(round((center_time + half_width - meta["start_time"]) * rate)))
+    if last <= first:
+        return None
+
+    frame = channels * width
+    with open(wav_path, "rb") as f:
+        f.seek(offset + first * frame)
+        raw = f.read((last - first) * frame)
+    write_wav(out_path, raw, rate)
+
+    events, _ = load_events(wav_path)
+    info = {
+        "start_time": meta["start_time"] + first / rate,
+        # GPS clock offset of the recording, if the recorder had one
+        **{k: meta[k] for k in CLOCK_KEYS if k in meta},
+        "sample_rate": rate,
+        "source": os.path.basename(wav_path),
+        "source_offset_samples": first,
+        "events": [
+            {**e, "sample": e["sample"] - first}
+            for e in events if first <= e["sample"] < last
+        ],
+    }
+    with open(sidecar_path(out_path), "w") as f:
+        json.dump(info, f)
+    return info
+
+def recording_at(directory, when):
+    """The recording in directory whose samples cover epoch time `when`."""
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".wav"):
+            continue
+        path = os.path.join(directory, name)
+        meta = read_sidecar(path)
+        if "start_time" not in meta or meta["start_time"] > when:
+            continue
+        try:
+            layout = wav_layout(path)
+        except (OSError, ValueError):
+            continue
+        if when < meta["start_time"] + available_frames(path, layout) / layout[3]:
+            return path
+    return None
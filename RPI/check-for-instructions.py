@@ -2,8 +2,12 @@ import os
 import json
 import time
 import glob
+import tempfile
+import threading
 import requests
-import paramiko
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import sftp_upload
 
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -27,6 +31,42 @@ password = config.get('password')
 instructions_url = config.get('instructions_url')
 audio_upload_directory = config.get('audio_upload_directory')
 
+# Seconds of audio uploaded either side of a sound_request's time;
+# 0 uploads the whole recording instead
+snippet_seconds = float(config.get('snippet_seconds', 2.0))
+snippet_directory = os.path.join(tempfile.gettempdir(), 'snippets')
+
+# Lossless FLAC before upload (needs the flac package); false sends WAV
+compress_uploads = bool(config.get('compress_uploads', True))
+compress_directory = os.path.join(tempfile.gettempdir(), 'flac')
+
+# Incremental sync: ask the server only for this station's pending
+# instructions (304 when unchanged), long-polling up to instruction_wait
+# seconds; false polls the full list every minute as before
+instruction_sync = bool(config.get('instruction_sync', True))
+instruction_wait = int(config.get('instruction_wait', 50))
+pending_url = instructions_url.replace('/get_instructions', '/pending')
+
+# Instruction IDs already run here, kept across restarts (not in
+# base_directory, which erase_recordings empties)
+handled_path = config.get(
+    'handled_instructions_path',
+    os.path.join(os.path.dirname(config_path), 'handled_instructions.json')
+)
+
+# Uploads run beside the polling loop on a few workers, each giving up
+# after upload_attempts tries so one unreachable transfer cannot hold a
+# worker (the instruction is retried on a later poll)
+upload_workers = int(config.get('upload_workers', 2))
+upload_attempts = int(config.get('upload_attempts', 5))
+
+POLL_INTERVAL = 60       # seconds between full-list polls
+DEFERRED_RETRY_S = 5     # re-check of instructions waiting on the recorder
+ACK_RETRY_S = 30         # retry interval for completions the server has not taken
+ACK_WAIT_S = 10          # how long reboot/shutdown wait for their completion
+MAX_QUEUED_TRANSFERS = 2 * upload_workers   # queued + running uploads
+
+
 
 # =========================
 # Requests session (infinite retry)
@@ -59,53 +99,78 @@ session = create_requests_session()
 # SFTP Upload
 # =========================
 
+# One session per upload worker, reconnected only when it drops
+uploaders = threading.local()
+
 def upload_file_via_sftp(local_file_path, remote_file_path):
     """
-    Upload file via SFTP with infinite retries and overwrite support.
+    Upload file via SFTP with retries, resuming partial transfers and
+    overwriting any earlier copy (see sftp_upload.py). False if every
+    attempt failed.
     """
-    attempt = 0
-
-    while True:
-        transport = None
-        try:
-            attempt += 1
-            print(f"SFTP upload attempt {attempt}")
-
-            transport = paramiko.Transport((hostname, port))
-            transport.connect(username=username, password=password)
+    if not hasattr(uploaders, 'uploader'):
+        uploaders.uploader = sftp_upload.Uploader(hostname, port, username, password)
+    return uploaders.uploader.upload(local_file_path, remote_file_path, max_attempts=upload_attempts)
 
-            sftp = paramiko.SFTPClient.from_transport(transport)
-
-            # Explicit overwrite: remove remote file if it exists
+def upload_audio(local_wav, remote_wav):
+    """
+    Upload a recording, FLAC-compressed when possible (sent as .flac next
+    to where the WAV would go; the server decodes it before merging).
+    """
+    if compress_uploads:
+        flac_file = sftp_upload.compress_flac(local_wav, compress_directory)
+        if flac_file:
             try:
-                sftp.stat(remote_file_path)
-                sftp.remove(remote_file_path)
-                print(f"Existing remote file removed: {remote_file_path}")
-            except FileNotFoundError:
-                pass  # File does not exist → normal case
+                print(f"Compressed {os.path.getsize(local_wav)} → {os.path.getsize(flac_file)} bytes")
+                return upload_file_via_sftp(flac_file, os.path.splitext(remote_wav)[0] + ".flac")
+            finally:
+                os.remove(flac_file)
+    return upload_file_via_sftp(local_wav, remote_wav)
 
-            sftp.put(local_file_path, remote_file_path)
-
-            print(f"Uploaded {local_file_path} → {remote_file_path}")
-
-            sftp.close()
-            transport.close()
-            return True
 
-        except Exception as e:
-            print(f"SFTP upload failed (attempt {attempt}): {e}")
+# =========================
+# Snippet upload
+# =========================
 
-            if transport:
-                try:
-                    transport.close()
-                except Exception:
-                    pass
+def requested_time(instruction_value):
+    """Epoch seconds of a YYYY-MM-DD-HH-MM-SS instruction value (local time)."""
+    try:
+        return datetime.strptime(instruction_value, "%Y-%m-%d-%H-%M-%S").timestamp()
+    except (TypeError, ValueError):
+        return None
 
-            # Exponential backoff (max 5 minutes)
-            sleep_time = min(5 * (2 ** (attempt - 1)), 300)
-            print(f"Retrying SFTP in {sleep_time} seconds...")
-            time.sleep(sleep_time)
+def upload_snippet(instruction_value, when):
+    """
+    Cut ±snippet_seconds around `when` out of the recording covering it and
+    upload it as <instruction_value>_audio<station>.wav, with a sidecar
+    holding its exact start time and the events detected in it.
+    Returns None when no recording covers the time, False when the upload
+    failed.
+    """
+    import audio_events  # numpy; only loaded once a snippet is needed
+
+    source = audio_events.recording_at(base_directory, when)
+    if source is None:
+        return None
+
+    os.makedirs(snippet_directory, exist_ok=True)
+    local_file = os.path.join(snippet_directory, f"{instruction_value}_audio{stationID}.wav")
+    info = audio_events.cut_snippet(source, when, snippet_seconds, local_file)
+    if info is None:
+        return None
+
+    remote_file = os.path.join(audio_upload_directory, os.path.basename(local_file))
+    print(f"Uploading snippet of {source} ({len(info['events'])} events) → {remote_file}")
+    uploaded = upload_audio(local_file, remote_file) and upload_file_via_sftp(
+        audio_events.sidecar_path(local_file), os.path.splitext(remote_file)[0] + ".json"
+    )
 
+    for path in (local_file, audio_events.sidecar_path(local_file)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return uploaded
 
 
 # =========================
@@ -137,24 +202,223 @@ def mark_station_complete(instruction_id):
 
     try:
         response = session.put(update_url, json=data, timeout=10)
+        if response.status_code == 404:
+            print(f"Instruction {instruction_id} no longer exists on the server")
+            return True
         response.raise_for_status()
         print(f"Marked station {stationID} complete for instruction {instruction_id}")
+        return True
     except requests.exceptions.RequestException as e:
         print(f"Failed to update instruction {instruction_id}, will retry later: {e}")
+        return False
 
 
 # =========================
-# Process instructions
+# Handled-instruction journal
 # =========================
 
-def process_instructions():
+def load_handled():
+    try:
+        with open(handled_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# instruction id -> True once the server has our completion, False while
+# the completion still has to be sent (retried by ack_journal)
+handled = load_handled()
+handled_lock = threading.Lock()
+ack_wake = threading.Event()
+
+def save_handled():
+    # Caller holds handled_lock
+    tmp = handled_path + '.tmp'
     try:
+        with open(tmp, 'w') as f:
+            json.dump(handled, f)
+        os.replace(tmp, handled_path)
+    except OSError as e:
+        print(f"Could not save handled instructions: {e}")
+
+def complete(instruction_id, wait_s=0):
+    """
+    Journal the instruction as run here, so it is never run twice (e.g. a
+    reboot whose completion did not get through), and hand the completion
+    to ack_journal. wait_s waits that long for the server to take it.
+    """
+    with handled_lock:
+        handled[instruction_id] = False
+        save_handled()
+    ack_wake.set()
+
+    deadline = time.monotonic() + wait_s
+    while time.monotonic() < deadline and not handled.get(instruction_id):
+        time.sleep(0.2)
+
+def ack_journal():
+    """Send journalled completions until the server has each one."""
+    while True:
+        ack_wake.wait(ACK_RETRY_S)
+        ack_wake.clear()
+        with handled_lock:
+            outstanding = [i for i, acked in handled.items() if not acked]
+        for instruction_id in outstanding:
+            if mark_station_complete(instruction_id):
+                with handled_lock:
+                    handled[instruction_id] = True
+                    save_handled()
+
+def prune_handled(instructions):
+    """Forget acknowledged IDs the server no longer lists."""
+    listed = {instr.get('_id') for instr in instructions}
+    with handled_lock:
+        stale = [i for i, acked in handled.items() if acked and i not in listed]
+        for i in stale:
+            del handled[i]
+        if stale:
+            save_handled()
+
+
+# =========================
+# Fetch instructions
+# =========================
+
+etag = None
+pending = []
+
+def fetch_instructions(wait):
+    """
+    This station's instructions, or None when the server is unavailable.
+    In sync mode only the pending ones are sent, and a 304 reuses the list
+    from the previous poll.
+    """
+    global etag, pending, instruction_sync
+
+    if not instruction_sync:
         response = session.get(instructions_url, timeout=10)
         response.raise_for_status()
-        instructions = response.json()
-    except requests.exceptions.RequestException as e:
+        return response.json()
+
+    # The server only holds a poll open against a version we already have;
+    # without an ETag (e.g. stripped by a proxy) the poll is a plain one
+    if not etag:
+        wait = 0
+    headers = {'If-None-Match': etag} if etag else {}
+    response = session.get(
+        pending_url,
+        params={'station': stationID, 'wait': wait},
+        headers=headers,
+        timeout=(10, wait + 15)
+    )
+    if response.status_code == 404:
+        print("Server has no pending-instruction endpoint, polling the full list.")
+        instruction_sync = False
+        return fetch_instructions(wait)
+    if response.status_code == 304:
+        return pending
+    response.raise_for_status()
+
+    etag = response.headers.get('ETag')
+    pending = response.json()
+    print(f"{len(pending)} pending instruction(s)")
+    return pending
+
+
+# =========================
+# Transfer lane
+# =========================
+
+# instruction id -> Future of its upload, while one is queued or running
+in_flight = {}
+# Sound requests last found to have no audio here (retried, but they do
+# not hold back an erase)
+no_audio = set()
+transfers = None
+
+def upload_recording(instruction_value):
+    """
+    Upload the whole recording whose name matches the requested minute.
+    None when there is no such file, else whether the upload succeeded.
+    """
+    prefix = instruction_value.rsplit('-', 1)[0]
+    pattern = os.path.join(base_directory, f"{prefix}-*.wav")
+    matches = sorted(glob.glob(pattern))
+
+    if not matches:
+        return None
+
+    local_file = matches[0]
+    real_filename = os.path.basename(local_file)
+    name, ext = os.path.splitext(real_filename)
+
+    remote_filename = f"{name}_audio{stationID}{ext}"
+    remote_file = os.path.join(audio_upload_directory, remote_filename)
+
+    print(f"Uploading {local_file} → {remote_file}")
+
+    if not upload_audio(local_file, remote_file):
+        return False
+    # Start-time sidecar written by record-audio.py, used by the
+    # server to align the stations
+    local_sidecar = os.path.splitext(local_file)[0] + ".json"
+    if os.path.exists(local_sidecar):
+        remote_sidecar = os.path.splitext(remote_file)[0] + ".json"
+        return upload_file_via_sftp(local_sidecar, remote_sidecar)
+    return True
+
+def sound_request(instruction_id, instruction_value):
+    """Upload-worker body for a sound_request; journals it once uploaded."""
+    when = requested_time(instruction_value)
+    uploaded = None
+    if snippet_seconds > 0 and when is not None:
+        uploaded = upload_snippet(instruction_value, when)
+        if uploaded is None:
+            print("No recording covers the requested time, uploading the matching file.")
+    if uploaded is None:
+        uploaded = upload_recording(instruction_value)
+        if uploaded is None:
+            print("No matching audio file found.")
+            no_audio.add(instruction_id)
+            return
+    no_audio.discard(instruction_id)
+
+    if uploaded:
+        complete(instruction_id)
+    else:
+        print(f"Upload for instruction {instruction_id} failed, retrying on a later poll.")
+
+def submit_transfer(instruction_id, instruction_value):
+    future = transfers.submit(sound_request, instruction_id, instruction_value)
+    in_flight[instruction_id] = future
+
+    def finished(f):
+        in_flight.pop(instruction_id, None)
+        if f.exception() is not None:
+            print(f"Transfer for instruction {instruction_id} failed: {f.exception()}")
+
+    future.add_done_callback(finished)
+
+
+# =========================
+# Process instructions
+# =========================
+
+def process_instructions(wait=0):
+    """
+    Run this station's outstanding instructions in order: control commands
+    at once in this loop, sound requests handed to the upload workers, so
+    no transfer holds up a later instruction. Returns True if one has to be
+    re-checked shortly, None if the server could not be reached.
+    """
+    try:
+        instructions = fetch_instructions(wait)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Server unavailable, retrying later: {e}")
-        return
+        return None
+
+    prune_handled(instructions)
+    deferred = False
+    uploads_ahead = False   # an earlier sound request is not uploaded yet
 
     for instr in instructions:
         instruction_id = instr.get('_id')
@@ -165,50 +429,53 @@ def process_instructions():
         all_complete = instr.get('all_complete', False)
         station_complete = instr.get(f'station{stationID}_complete', False)
 
-        print(f"Processing instruction {instruction_id}")
-
         if all_complete or station_complete:
             continue
 
         if instruction_target not in [stationID, 'ALL']:
             continue
 
+        if instruction_id in handled:
+            continue  # run already; completion journalled
+        if instruction_id in in_flight:
+            uploads_ahead = uploads_ahead or instruction_id not in no_audio
+            continue
+
+        print(f"Processing instruction {instruction_id}")
+
         # =========================
         # SOUND REQUEST
         # =========================
         if instruction_type == 'sound_request':
-            prefix = instruction_value.rsplit('-', 1)[0]
-            pattern = os.path.join(base_directory, f"{prefix}-*.wav")
-            matches = sorted(glob.glob(pattern))
-
-            if not matches:
-                print("No matching audio file found.")
+            uploads_ahead = uploads_ahead or instruction_id not in no_audio
+            when = requested_time(instruction_value)
+            if snippet_seconds > 0 and when is not None and time.time() < when + snippet_seconds + 1:
+                print("Requested window is still being recorded, retrying later.")
+                deferred = True
                 continue
-
-            local_file = matches[0]
-            real_filename = os.path.basename(local_file)
-            name, ext = os.path.splitext(real_filename)
-
-            remote_filename = f"{name}_audio{stationID}{ext}"
-            remote_file = os.path.join(audio_upload_directory, remote_filename)
-
-            print(f"Uploading {local_file} → {remote_file}")
-
-            if upload_file_via_sftp(local_file, remote_file):
-                mark_station_complete(instruction_id)
+            if len(in_flight) >= MAX_QUEUED_TRANSFERS:
+                # Upload queue full; picked up again once a worker frees up
+                deferred = True
+                continue
+            submit_transfer(instruction_id, instruction_value)
 
         # =========================
         # ERASE RECORDINGS
         # =========================
         elif instruction_type == 'erase_recordings':
+            if uploads_ahead:
+                # Never erase audio an earlier request is still waiting for
+                print("Waiting for earlier uploads before erasing recordings.")
+                deferred = True
+                continue
             delete_files_in_directory(base_directory)
-            mark_station_complete(instruction_id)
+            complete(instruction_id)
 
         # =========================
         # REBOOT
         # =========================
         elif instruction_type == 'reboot':
-            mark_station_complete(instruction_id)
+            complete(instruction_id, wait_s=ACK_WAIT_S)
             print("Rebooting Raspberry Pi in 1 second...")
             time.sleep(1)
             os.system('sudo reboot')
@@ -217,23 +484,54 @@ def process_instructions():
         # SHUTDOWN
         # =========================
         elif instruction_type == 'shutdown':
-            mark_station_complete(instruction_id)
+            complete(instruction_id, wait_s=ACK_WAIT_S)
             print("Shutting down Raspberry Pi in 1 second...")
             time.sleep(1)
             os.system('sudo shutdown -h now')
         else:
             print(f"Unknown instruction type: {instruction_type}")
 
+    return deferred
+
 
 # =========================
 # Main loop (never exits)
 # =========================
 
-while True:
-    try:
-        process_instructions()
-    except Exception as e:
-        # Absolute safety net — script never dies
-        print(f"Unexpected error: {e}")
+def start_workers():
+    """
+    Upload pool and ack thread, once per process: under station-agent.py a
+    restarted job calls main() again and must not stack another set.
+    """
+    global transfers
+    if transfers is not None:
+        return
+    transfers = ThreadPoolExecutor(max_workers=upload_workers)
+    # Completions journalled before a restart go out straight away
+    ack_wake.set()
+    threading.Thread(target=ack_journal, daemon=True).start()
+
+def main():
+    start_workers()
+    deferred = False
 
-    time.sleep(60)
+    while True:
+        try:
+            # A deferred sound request (still recording, or the upload queue
+            # is full) is re-checked shortly, without holding the poll open
+            deferred = process_instructions(0 if deferred else instruction_wait)
+        except Exception as e:
+            # Absolute safety net — script never dies
+            print(f"Unexpected error: {e}")
+            deferred = None
+
+        if deferred:
+            time.sleep(DEFERRED_RETRY_S)
+        elif deferred is None or not instruction_sync or instruction_wait <= 0 or not etag:
+            # Long-polls pace themselves; otherwise (including a server reply
+            # without an ETag, which cannot be long-polled) keep the
+            # one-minute cadence
+            time.sleep(POLL_INTERVAL)
+
+if __name__ == "__main__":
+    main()
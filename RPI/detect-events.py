@@ -0,0 +1,96 @@
+import os
+import time
+import json
+import glob
+import audio_events
+
+# Follows the recordings written by record-audio.py and indexes acoustic
+# events in each one as it grows (<name>.events.jsonl next to the WAV).
+# check-for-instructions.py uses the index to upload short snippets.
+
+config_path = '/home/bob325/config.json'
+
+with open(config_path, 'r') as f:
+    config = json.load(f)
+
+base_directory = config.get('base_directory')
+
+POLL_INTERVAL = 2        # seconds between looks at the growing file
+READ_FRAMES = 1 << 16    # frames read per step
+
+# path -> (detector, frames read, layout)
+tracked = {}
+
+def append_events(wav_path, entries):
+    with open(audio_events.events_path(wav_path), 'a') as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+
+def follow(wav_path, finished):
+    """
+    Feed the newly written part of wav_path to its detector. `finished`
+    means a newer recording exists, so this one will not grow any more.
+    """
+    state = tracked.get(wav_path)
+    if state is None:
+        try:
+            layout = audio_events.wav_layout(wav_path)
+        except (OSError, ValueError):
+            return  # header not written yet
+        # Restart from scratch: drop a partial index from a previous run
+        try:
+            os.remove(audio_events.events_path(wav_path))
+        except FileNotFoundError:
+            pass
+        state = [audio_events.OnsetDetector(layout[3]), 0, layout]
+        tracked[wav_path] = state
+
+    detector, done_frames, layout = state
+    start_time = audio_events.read_sidecar(wav_path).get("start_time")
+    rate = layout[3]
+
+    available = audio_events.available_frames(wav_path, layout)
+    while done_frames < available:
+        count = min(READ_FRAMES, available - done_frames)
+        samples = audio_events.read_frames(wav_path, layout, done_frames, count)
+        done_frames += len(samples)
+        events = detector.feed(samples)
+        for e in events:
+            if start_time is not None:
+                e["time"] = start_time + e["sample"] / rate
+            print(f"[EVENT] {os.path.basename(wav_path)} sample {e['sample']} ({e['energy_db']} dB)")
+        if events:
+            append_events(wav_path, events)
+    state[1] = done_frames
+
+    if finished:
+        append_events(wav_path, [{"done": True, "frames": done_frames}])
+        del tracked[wav_path]
+
+def scan():
+    recordings = sorted(glob.glob(os.path.join(base_directory, "*.wav")))
+    for i, path in enumerate(recordings):
+        finished = i < len(recordings) - 1
+        if path not in tracked:
+            _, indexed = audio_events.load_events(path)
+            if indexed:
+                continue
+        try:
+            follow(path, finished)
+        except Exception as e:
+            print(f"[ERROR] Event detection failed for {path}: {e}")
+            tracked.pop(path, None)
+
+    # Forget files erased under us
+    for path in list(tracked):
+        if not os.path.exists(path):
+            del tracked[path]
+
+def main():
+    print(f"[INFO] Indexing events in {base_directory}")
+    while True:
+        scan()
+        time.sleep(POLL_INTERVAL)
+
+if __name__ == "__main__":
+    main()
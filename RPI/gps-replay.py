@@ -0,0 +1,97 @@
+import os
+import tty
+import time
+import argparse
+from datetime import datetime, timezone
+
+# Replays a logged NMEA stream through a pseudo-terminal, so
+# set-system-time-with-GPS.py can be tested without a receiver:
+#
+#   python3 gps-replay.py gps.log --live &    # prints /dev/pts/N
+#   python3 set-system-time-with-GPS.py /dev/pts/N
+#
+# Sentences are sent in bursts, one per second named in the log. With
+# --live the times and dates are rewritten to the current second and each
+# burst goes out --delay after the real top of that second, like a receiver
+# on a correctly set clock would, so the daemon should settle on an offset
+# of about -delay (0 once gps_nmea_delay_s is set to it).
+
+def checksum(body):
+    c = 0
+    for ch in body:
+        c ^= ord(ch)
+    return f"{c:02X}"
+
+def sentence_second(line):
+    """hhmmss of RMC/GGA/ZDA sentences, else None."""
+    fields = line.split('*')[0].split(',')
+    if fields[0][-3:] in ('RMC', 'GGA', 'ZDA') and len(fields) > 1 and len(fields[1]) >= 6:
+        return fields[1][:6]
+    return None
+
+def retime(line, when):
+    """The sentence with its time (and date) fields set to datetime when."""
+    body = line.strip().lstrip('$').split('*')[0]
+    fields = body.split(',')
+    kind = fields[0][-3:]
+    frac = fields[1][6:] if len(fields[1]) > 6 else ''
+    if kind in ('RMC', 'GGA', 'ZDA'):
+        fields[1] = when.strftime('%H%M%S') + frac
+    if kind == 'RMC' and len(fields) > 9:
+        fields[9] = when.strftime('%d%m%y')
+    if kind == 'ZDA' and len(fields) > 4:
+        fields[2], fields[3], fields[4] = when.strftime('%d'), when.strftime('%m'), when.strftime('%Y')
+    body = ','.join(fields)
+    return f"${body}*{checksum(body)}"
+
+def bursts(lines):
+    """Group the log into per-second bursts of sentences."""
+    burst, second = [], None
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('$'):
+            continue
+        s = sentence_second(line)
+        if s is not None and second is not None and s != second and burst:
+            yield burst
+            burst = []
+        if s is not None:
+            second = s
+        burst.append(line)
+    if burst:
+        yield burst
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay an NMEA log through a pseudo-terminal.')
+    parser.add_argument('log', help='NMEA log, one sentence per line')
+    parser.add_argument('--live', action='store_true', help='rewrite times to now and pace on the real second')
+    parser.add_argument('--delay', type=float, default=0.1, help='burst delay after the second (live mode)')
+    parser.add_argument('--rate', type=float, default=1.0, help='replay speed (not live)')
+    parser.add_argument('--loop', action='store_true', help='start over at the end of the log')
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(os.ttyname(slave), flush=True)
+
+    with open(args.log, 'r', errors='replace') as f:
+        lines = f.readlines()
+
+    while True:
+        for burst in bursts(lines):
+            if args.live:
+                second = int(time.time()) + 1
+                time.sleep(max(0.0, second + args.delay - time.time()))
+                when = datetime.fromtimestamp(second, timezone.utc)
+                burst = [retime(line, when) if sentence_second(line) else line for line in burst]
+            else:
+                time.sleep(1.0 / args.rate)
+            os.write(master, ''.join(line + '\r\n' for line in burst).encode('ascii'))
+        if not args.loop:
+            break
+
+    # Keep the terminal open until the reader has drained it
+    time.sleep(2)
+
+if __name__ == '__main__':
+    main()
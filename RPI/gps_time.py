@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import calendar
+from collections import deque
+
+# GPS time model for the station clock.
+#
+# offset = GPS time - system time, tracked as a line (offset + drift) over a
+# sliding window. Two kinds of measurement feed it:
+#  - NMEA: a sentence stamped with GPS second S arrives some latency after
+#    S, so S - (system time on arrival) is at most the true offset. The
+#    least-delayed sentence of each bucket (the upper envelope) is used,
+#    corrected by the receiver's fixed sentence delay.
+#  - PPS: the kernel timestamps the pulse at the exact top of each GPS
+#    second (/sys/class/pps/ppsN/assert); NMEA only decides which second
+#    it was. Sub-millisecond when wired up.
+#
+# set-system-time-with-GPS.py keeps the model and writes it to a small
+# JSON state file; offset_at() reads that file (cached by mtime), so any
+# process can ask for the offset at a given system time cheaply.
+
+STATE_PATH = '/run/gps-time.json'
+
+WINDOW_S = 600               # measurements kept for the fit
+MIN_DRIFT_SPAN_S = 120       # shorter spans give an offset only (drift 0)
+NMEA_BUCKET_S = 16           # one envelope point per bucket of sentences
+NMEA_DELAY_UNCERTAINTY_S = 0.05   # what an uncalibrated sentence delay may be off by
+PPS_MAX_AGE_S = 10           # PPS is the source while pulses are this recent
+STALE_S = 120                # state older than this is not used
+DRIFT_UNCERTAINTY = 2e-6     # s/s of extra uncertainty when extrapolating
+
+
+# -------------------------------
+# NMEA
+# -------------------------------
+
+def nmea_checksum_ok(line):
+    """True for '$...*hh' sentences whose XOR checksum matches."""
+    line = line.strip()
+    if not line.startswith('$') or '*' not in line:
+        return False
+    body, _, given = line[1:].partition('*')
+    checksum = 0
+    for c in body:
+        checksum ^= ord(c)
+    try:
+        return checksum == int(given[:2], 16)
+    except ValueError:
+        return False
+
+def fix_time(msg):
+    """
+    (epoch seconds, lat, lon) from a parsed RMC with a valid fix or a ZDA,
+    else None. ZDA carries no position (lat, lon are None).
+    """
+    kind = msg.sentence_type
+    if kind == 'RMC':
+        if msg.status != 'A' or msg.datestamp is None or msg.timestamp is None:
+            return None
+        dt = msg.datetime
+        lat, lon = msg.latitude, msg.longitude
+    elif kind == 'ZDA':
+        if msg.timestamp is None or not msg.year:
+            return None
+        dt = msg.datetime
+        lat = lon = None
+    else:
+        return None
+    epoch = calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+    return epoch, lat, lon
+
+
+# -------------------------------
+# Clock model
+# -------------------------------
+
+def fit_line(points):
+    """
+    Least-squares offset + drift through (system time, offset) points, at
+    the last point's time. Returns (t_ref, offset, drift, rms residual).
+    Over less than MIN_DRIFT_SPAN_S the drift is too noisy to use and only
+    the mean offset is fitted.
+    """
+    t_ref = points[-1][0]
+    n = len(points)
+    ts = [t - t_ref for t, _ in points]
+    os_ = [o for _, o in points]
+    mt = sum(ts) / n
+    mo = sum(os_) / n
+    drift = 0.0
+    if -ts[0] >= MIN_DRIFT_SPAN_S:
+        stt = sum((t - mt) ** 2 for t in ts)
+        drift = sum((t - mt) * (o - mo) for t, o in zip(ts, os_)) / stt
+    offset = mo - drift * mt
+    rms = (sum((o - offset - drift * t) ** 2 for t, o in zip(ts, os_)) / n) ** 0.5
+    return t_ref, offset, drift, rms
+
+class ClockModel:
+    """
+    System clock offset/drift against GPS from NMEA arrivals and PPS
+    edges. nmea_delay is the receiver's sentence delay after the second it
+    names; it is learned from PPS whenever both are available.
+    """
+
+    def __init__(self, nmea_delay=0.0):
+        self.nmea_delay = nmea_delay
+        self.nmea_calibrated = False
+        self.nmea = deque()     # (arrival system time, GPS - arrival)
+        self.pps = deque()      # (edge system time, GPS - edge)
+
+    def reset(self):
+        """Forget all measurements (after the system clock is stepped)."""
+        self.nmea.clear()
+        self.pps.clear()
+
+    def _trim(self, now):
+        for q in (self.nmea, self.pps):
+            while q and now - q[0][0] > WINDOW_S:
+                q.popleft()
+
+    def add_nmea(self, gps_time, received):
+        self.nmea.append((received, gps_time - received))
+        self._trim(received)
+
+    def add_pps(self, edge):
+        """A PPS edge at system time edge; needs NMEA to name the second."""
+        coarse = self.nmea_estimate()
+        if coarse is None:
+            return False
+        t_ref, offset, drift, _ = coarse
+        second = round(edge + offset + drift * (edge - t_ref))
+        self.pps.append((edge, second - edge))
+        self._trim(edge)
+
+        # The envelope sits one sentence delay below the PPS offset
+        if len(self.pps) >= 10:
+            _, pps_offset, _, _ = fit_line(list(self.pps))
+            envelope = self.nmea_estimate(raw=True)
+            if envelope is not None:
+                self.nmea_delay = pps_offset - envelope[1]
+                self.nmea_calibrated = True
+        return True
+
+    def nmea_estimate(self, raw=False):
+        """Line through the least-delayed sentence of each bucket."""
+        best = {}
+        for t, o in self.nmea:
+            bucket = int(t // NMEA_BUCKET_S)
+            if bucket not in best or o > best[bucket][1]:
+                best[bucket] = (t, o)
+        if not best:
+            return None
+        t_ref, offset, drift, rms = fit_line(sorted(best.values()))
+        if not raw:
+            # The sentence left the receiver nmea_delay after its second
+            offset += self.nmea_delay
+        return t_ref, offset, drift, rms
+
+    def estimate(self, now):
+        """State dict for the state file, or None before the first fix."""
+        if self.pps and now - self.pps[-1][0] <= PPS_MAX_AGE_S:
+            t_ref, offset, drift, rms = fit_line(list(self.pps))
+            source, uncertainty, samples = 'pps', rms, len(self.pps)
+        else:
+            fitted = self.nmea_estimate()
+            if fitted is None:
+                return None
+            t_ref, offset, drift, rms = fitted
+            delay_error = 0.0 if self.nmea_calibrated else NMEA_DELAY_UNCERTAINTY_S
+            source = 'nmea'
+            uncertainty = (rms ** 2 + delay_error ** 2) ** 0.5
+            samples = len(self.nmea)
+        return {
+            "t_ref": t_ref,
+            "offset_s": offset,
+            "drift_ppm": drift * 1e6,
+            "uncertainty_s": uncertainty,
+            "source": source,
+            "samples": samples,
+            "nmea_delay_s": self.nmea_delay,
+            "updated": now,
+        }
+
+
+# -------------------------------
+# State file
+# -------------------------------
+
+def write_state(state, path=STATE_PATH):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+_cached = {"path": None, "mtime": None, "state": None}
+
+def read_state(path=STATE_PATH):
+    """The daemon's last state, re-read only when the file changes."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if _cached["path"] != path or _cached["mtime"] != mtime:
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _cached.update(path=path, mtime=mtime, state=state)
+    return _cached["state"]
+
+def offset_at(t=None, path=STATE_PATH):
+    """
+    GPS - system clock offset at system time t (default now) as
+    {"clock_offset_s", "clock_uncertainty_s", "clock_source"}, or None
+    when the GPS daemon has no recent estimate. GPS time is t + offset.
+    """
+    now = time.time()
+    t = now if t is None else t
+    state = read_state(path)
+    if state is None or now - state.get("updated", 0) > STALE_S:
+        return None
+    age = t - state["t_ref"]
+    return {
+        "clock_offset_s": state["offset_s"] + state["drift_ppm"] * 1e-6 * age,
+        "clock_uncertainty_s": state["uncertainty_s"] + DRIFT_UNCERTAINTY * abs(age),
+        "clock_source": state["source"],
+    }
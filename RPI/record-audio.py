@@ -1,72 +1,213 @@
 import os
 import time
+import wave
 import subprocess
+import threading
 import json
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
+import gps_time
 
-config_path = '/home/bob325/config.json'   
+config_path = '/home/bob325/config.json'
 
 with open(config_path, 'r') as f:
     config = json.load(f)
 
 base_directory = config.get('base_directory')
+gps_state_path = config.get('gps_state_path', gps_time.STATE_PATH)
 
-def rec(start_time):
-    try:
-        # Create a timestamp for the filename
-        timestamp = start_time.strftime("%Y-%m-%d-%H-%M-%S")
-        filename = os.path.join(base_directory, f"{timestamp}.wav")
-
-        # Provide feedback about when the next recording is scheduled
-        print(f"[INFO] Starting recording at {start_time.strftime('%H:%M:%S')}")
-
-        # Record the audio using arecord for 295 seconds (just under 5 minutes)
-        arecord_command = f'arecord -D plughw:1,0 -r 48000 -c 1 -f U8 -t wav -d 295 {filename}'
-        subprocess.run(arecord_command, shell=True, check=True)
-
-        # Provide feedback after recording completes
-        print(f"[INFO] Recording completed and saved as: {filename}")
-        
-    except Exception as e:
-        print(f"[ERROR] Error during recording: {e}")
-
-def get_next_available_time():
-    """Get the next available 5-minute interval from the current time."""
-    current_time = datetime.now()
-    # Round up the current time to the next 5-minute mark
-    minutes = current_time.minute
-    remainder = minutes % 5
-    
-    if remainder == 0:
-        # If the current minute is already a multiple of 5, use the current time
-        next_time = current_time
-    else:
-        # Round up to the next 5-minute mark
-        next_time = current_time + timedelta(minutes=(5 - remainder), seconds=-current_time.second)
-
-    return next_time
-
-def wait_until_next_interval(start_time):
-    """Wait until the next interval (HH:MM:00) provided."""
-    current_time = datetime.now()
-    
-    # Calculate how much time to wait until the next interval
-    wait_time = (start_time - current_time).total_seconds()
-    if wait_time > 0:
-        print(f"[INFO] Waiting for {wait_time} seconds until {start_time.strftime('%H:%M:%S')}")
-        time.sleep(wait_time)
+SAMPLE_RATE = 48000
+SEGMENT_SECONDS = 300     # one file per 5 minutes, cut on the wall-clock boundary
+RING_SECONDS = 60         # capture buffered in memory while the disk catches up
+READ_BYTES = 4800         # 100 ms of U8 mono per pipe read
+CLOCK_WINDOW_S = 30       # reads used to estimate the sample clock
+
+# One long-running capture: raw U8 mono samples on stdout
+ARECORD_COMMAND = ['arecord', '-D', 'plughw:1,0', '-r', str(SAMPLE_RATE), '-c', '1', '-f', 'U8', '-t', 'raw', '-q']
+
+def write_sidecar(wav_filename, start_time, **extra):
+    """Write <name>.json next to <name>.wav with the recording start time."""
+    sidecar = os.path.splitext(wav_filename)[0] + ".json"
+    with open(sidecar, 'w') as f:
+        json.dump({"start_time": start_time, "sample_rate": SAMPLE_RATE, **extra}, f)
+
+
+# -------------------------------
+# Ring buffer and sample clock
+# -------------------------------
+
+class RingBuffer:
+    """
+    Fixed-size byte ring between the capture thread and the writer.
+    Samples are addressed by their absolute index in the stream; if the
+    writer falls more than the ring behind, the oldest samples are lost
+    (and counted) rather than stalling the capture.
+    """
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.size = size
+        self.written = 0     # absolute index of the next sample to write
+        self.lost = 0
+        self.cond = threading.Condition()
+
+    def write(self, data):
+        with self.cond:
+            pos = self.written % self.size
+            first = min(len(data), self.size - pos)
+            self.buf[pos:pos + first] = data[:first]
+            self.buf[:len(data) - first] = data[first:]
+            self.written += len(data)
+            self.cond.notify_all()
+
+    def read(self, start, timeout=1.0):
+        """
+        Samples from absolute index start up to what has been written.
+        Returns (first index actually returned, bytes).
+        """
+        with self.cond:
+            if self.written <= start:
+                self.cond.wait(timeout)
+            oldest = max(0, self.written - self.size)
+            if start < oldest:
+                self.lost += oldest - start
+                start = oldest
+            end = self.written
+            # Copied under the lock: a span clamped to the oldest sample
+            # would otherwise be overwritten by the capture thread mid-copy
+            i = start % self.size
+            n = min(end - start, self.size - i)
+            out = bytes(self.buf[i:i + n]) + bytes(self.buf[:end - start - n])
+        return start, out
+
+class SampleClock:
+    """
+    Wall-clock time of stream sample n. Each pipe read gives an upper bound
+    on the stream's start time (read time minus samples so far); the
+    smallest bound over the recent window is the least delayed one, and
+    the window lets the estimate follow sound-card clock drift.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.reads = deque()
+        self.lock = threading.Lock()
+
+    def observe(self, total_samples, now):
+        with self.lock:
+            self.reads.append((now, now - total_samples / self.rate))
+            while self.reads and now - self.reads[0][0] > CLOCK_WINDOW_S:
+                self.reads.popleft()
+
+    def time_of(self, n):
+        with self.lock:
+            offset = min(start for _, start in self.reads)
+        return offset + n / self.rate
+
+    def sample_at(self, t):
+        with self.lock:
+            offset = min(start for _, start in self.reads)
+        return int(round((t - offset) * self.rate))
+
+
+# -------------------------------
+# Capture and segment writer
+# -------------------------------
+
+def capture(proc, ring, clock):
+    """Pipe arecord's stdout into the ring, timestamping every read."""
+    total = 0
+    while True:
+        data = proc.stdout.read(READ_BYTES)
+        if not data:
+            break
+        total += len(data)
+        clock.observe(total, time.time())
+        ring.write(data)
+
+def next_boundary(t):
+    """First SEGMENT_SECONDS wall-clock boundary strictly after t."""
+    return (int(t) // SEGMENT_SECONDS + 1) * SEGMENT_SECONDS
+
+def open_segment(first_sample, clock):
+    start_time = clock.time_of(first_sample)
+    # Named after the first sample's time, to the nearest second
+    timestamp = datetime.fromtimestamp(round(start_time)).strftime("%Y-%m-%d-%H-%M-%S")
+    filename = os.path.join(base_directory, f"{timestamp}.wav")
+    print(f"[INFO] Starting segment {filename}")
+
+    # Sidecar first: the first sample's wall-clock time, so the server can
+    # align stations at sample precision, plus the GPS daemon's clock
+    # offset at that time when it has one (GPS time = start_time + offset)
+    gps = gps_time.offset_at(start_time, gps_state_path) or {}
+    write_sidecar(filename, start_time, first_sample=first_sample, **gps)
+    w = wave.open(filename, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(1)
+    w.setframerate(SAMPLE_RATE)
+    return filename, w, start_time
+
+def write_segments(ring, clock, capturing):
+    """
+    Drain the ring into segment files, cutting each one at the exact sample
+    index of the next wall-clock boundary, so consecutive files are gapless.
+    """
+    while not clock.reads:
+        if not capturing.is_set():
+            return
+        time.sleep(0.05)
+
+    position = 0
+    filename, w, start_time = open_segment(position, clock)
+    # Boundaries advance by whole segments rather than being recomputed from
+    # a start time that may sit a hair before the boundary it was cut at
+    boundary = next_boundary(start_time)
+    boundary_sample = max(position + 1, clock.sample_at(boundary))
+
+    while capturing.is_set() or position < ring.written:
+        first, data = ring.read(position)
+        if first > position:
+            print(f"[WARN] Writer fell behind; {first - position} samples lost")
+        position = first
+        while data:
+            take = min(len(data), boundary_sample - position)
+            w.writeframes(data[:take])
+            data = data[take:]
+            position += take
+            if position == boundary_sample:
+                w.close()
+                print(f"[INFO] Segment completed: {filename}")
+                filename, w, start_time = open_segment(position, clock)
+                boundary += SEGMENT_SECONDS
+                boundary_sample = max(position + 1, clock.sample_at(boundary))
+
+    w.close()
+    print(f"[INFO] Capture ended; last segment: {filename}")
 
 def main():
-    # Infinite loop to keep the program running and recording
+    # Keep the capture running; a dead arecord starts a new stream
     while True:
-        # Get the next available 5-minute interval from the current time
-        next_time = get_next_available_time()
-        
-        # Wait until that exact time
-        wait_until_next_interval(next_time)
+        print(f"[INFO] Starting continuous capture: {' '.join(ARECORD_COMMAND)}")
+        proc = subprocess.Popen(ARECORD_COMMAND, stdout=subprocess.PIPE)
+        ring = RingBuffer(RING_SECONDS * SAMPLE_RATE)
+        clock = SampleClock(SAMPLE_RATE)
+        capturing = threading.Event()
+        capturing.set()
 
-        # Start recording at that time
-        rec(next_time)
+        writer = threading.Thread(target=write_segments, args=(ring, clock, capturing), daemon=True)
+        writer.start()
+        try:
+            capture(proc, ring, clock)
+        except Exception as e:
+            print(f"[ERROR] Capture failed: {e}")
+        finally:
+            capturing.clear()
+            proc.kill()
+            proc.wait()
+            writer.join()
+        print(f"[ERROR] arecord exited ({proc.returncode}); restarting in 5 s")
+        time.sleep(5)
 
 # Run the main function
-main()
+if __name__ == "__main__":
+    main()
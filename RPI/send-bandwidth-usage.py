@@ -1,9 +1,9 @@
 import os
 import json
 import psutil
-import requests
 import time
 from datetime import datetime
+from telemetry_queue import TelemetryQueue
 
 # Load config file
 config_path = '/home/bob325/config.json'   
@@ -16,6 +16,12 @@ stationID = config.get('stationID')
 base_directory = config.get('base_directory')
 bandwidth_api_url = config.get('bandwidth_api_url')
 
+# Readings are queued on disk and sent when the link allows (see telemetry_queue.py)
+queue_path = config.get(
+    'bandwidth_queue_path',
+    os.path.join(os.path.dirname(config_path), 'bandwidth-queue.sqlite3')
+)
+
 # Function to get the current network usage in bytes (for both upload and download)
 def get_bandwidth_usage():
     # Get network stats using psutil
@@ -27,6 +33,7 @@ def update_bandwidth_usage():
     # Track bandwidth usage for 10 minutes
     last_sent, last_received = get_bandwidth_usage()
     print(f"Initial usage - Sent: {last_sent} bytes, Received: {last_received} bytes")
+    queue = TelemetryQueue.shared(queue_path)
 
     while True:
         time.sleep(600)  # Wait for 10 minutes (600 seconds)
@@ -47,26 +54,14 @@ def update_bandwidth_usage():
             'daily_upload': upload_usage,  # Upload usage in MB
             'daily_download': download_usage,  # Download usage in MB
             'total_daily_bandwidth': upload_usage + download_usage,  # Total daily bandwidth (upload + download)
-            'date': datetime.now().strftime('%Y-%m-%d')  # Get today's date in 'YYYY-MM-DD' format
+            'date': datetime.now().strftime('%Y-%m-%d'),  # Get today's date in 'YYYY-MM-DD' format
+            'at': int(time.time() * 1000)  # Sample time (ms), kept if it is sent late
         }
 
-        # Add debug print to display the data being sent
-        print(f"Sending data to server: {data}")
-
-        try:
-            # Send the data to the server to update the database
-            response = requests.post(bandwidth_api_url, json=data)
-
-            # Debugging: Show response details
-            print(f"Response Status Code: {response.status_code}")
-            print(f"Response Body: {response.text}")
-
-            if response.status_code == 200:
-                print(f"Bandwidth updated successfully. Sent: {upload_usage:.2f} MB, Received: {download_usage:.2f} MB")
-            else:
-                print(f"Failed to update bandwidth: {response.status_code} - {response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error occurred while updating bandwidth: {e}")
+        # Add debug print to display the data being queued
+        print(f"Queueing data for server: {data}")
+        queue.put(bandwidth_api_url, data)
+        print(f"Bandwidth queued. Sent: {upload_usage:.2f} MB, Received: {download_usage:.2f} MB ({queue.pending()} pending)")
 
 # Start the bandwidth tracking
 if __name__ == '__main__':
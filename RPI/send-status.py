@@ -5,6 +5,7 @@ import socket
 import psutil
 import requests
 import subprocess
+from telemetry_queue import TelemetryQueue
 
 CONFIG_PATH = "/home/bob325/config.json"
 
@@ -20,9 +21,9 @@ def get_local_ip():
     finally:
         s.close()
 
-def get_public_ip(get_ip_url):
+def get_public_ip(get_ip_url, session=requests):
     try:
-        r = requests.get(get_ip_url, timeout=5)
+        r = session.get(get_ip_url, timeout=5)
         # your server returns { ip: "x.x.x.x" } in some versions
         if "application/json" in r.headers.get("content-type", ""):
             data = r.json()
@@ -69,18 +70,6 @@ def get_rssi_dbm(interface="wlan0"):
         return None
     return None
 
-def post_json(url, payload):
-    try:
-        r = requests.post(url, json=payload, timeout=10)
-        if not r.ok:
-            print(f"POST failed {r.status_code}: {r.text[:200]}")
-        else:
-            print(f"OK {r.status_code}")
-        return r.ok
-    except requests.exceptions.RequestException as e:
-        print(f"Error posting: {e}")
-        return False
-
 # ---- main ----
 def main():
     with open(CONFIG_PATH, "r") as f:
@@ -102,12 +91,20 @@ def main():
 
     interval_s = int(config.get("interval_seconds", 600))
 
+    # Samples are queued on disk and sent in gzip batches (see telemetry_queue.py)
+    node_batch_url = config.get("node_batch_url", node_update_url + "_batch")
+    queue_path = config.get(
+        "status_queue_path",
+        os.path.join(os.path.dirname(CONFIG_PATH), "status-queue.sqlite3")
+    )
+    queue = TelemetryQueue.shared(queue_path, batch_urls={node_update_url: node_batch_url})
+
     while True:
         uptime_s = get_uptime_seconds()
         free_space_bytes = get_free_space_bytes("/")
         file_count = get_file_count(base_directory)
         local_ip = get_local_ip()
-        public_ip = get_public_ip(get_ip_url) if get_ip_url else None
+        public_ip = get_public_ip(get_ip_url, queue.session) if get_ip_url else None
         rssi = get_rssi_dbm("wlan0")
 
         payload = {
@@ -115,6 +112,7 @@ def main():
             "kind": "rpi",
             "id": node_id,
             "name": node_name,
+            "at": int(time.time() * 1000),   # sample time, kept if it is sent late
             "meta": {
                 "uptime_s": uptime_s,
                 "local_ip": local_ip,
@@ -127,8 +125,8 @@ def main():
             }
         }
 
-        print("Sending:", payload)
-        post_json(node_update_url, payload)
+        print("Queueing:", payload)
+        queue.put(node_update_url, payload)
 
         time.sleep(interval_s)
 
@@ -1,66 +1,169 @@
-import io
-import pynmea2
-import serial
+import os
+import sys
+import json
 import time
-import pytz
 import logging
-import sys
-import os
-from timezonefinder import TimezoneFinder
+import pynmea2
+import serial
+import gps_time
+
+# Long-running GPS timing daemon. Parses NMEA from the receiver (and PPS
+# edges when a pps device is present), keeps the offset/drift model of the
+# system clock in gps_time.ClockModel and publishes it to the state file
+# that record-audio.py reads for each segment's sidecar.
+#
+# The clock is stepped once when it is more than STEP_THRESHOLD_S off
+# (as the old one-shot script did on every boot); smaller offsets are
+# only measured, not corrected.
+#
+#   python3 set-system-time-with-GPS.py [port]
+#
+# port overrides gps_port, e.g. the pseudo-terminal printed by
+# gps-replay.py when replaying a log.
 
 logger = logging.getLogger()
 logger.addHandler(logging.StreamHandler(sys.stdout))
-logger.setLevel(logging.DEBUG)
-
-ser = serial.Serial(
-    port = '/dev/ttyAMA0',
-    baudrate = 9600,
-    parity = serial.PARITY_NONE,
-    stopbits = serial.STOPBITS_ONE,
-    bytesize = serial.EIGHTBITS,
-    timeout = 1
-)
-sio = io.TextIOWrapper(io.BufferedRWPair(ser, ser))
-
-while True:
+logger.setLevel(logging.INFO)
+
+config_path = '/home/bob325/config.json'
+
+with open(config_path, 'r') as f:
+    config = json.load(f)
+
+port = sys.argv[1] if len(sys.argv) > 1 else config.get('gps_port', '/dev/ttyAMA0')
+baudrate = int(config.get('gps_baudrate', 9600))
+pps_path = config.get('gps_pps_path', '/sys/class/pps/pps0/assert')
+state_path = config.get('gps_state_path', gps_time.STATE_PATH)
+step_clock = bool(config.get('gps_step_clock', True))
+set_timezone = bool(config.get('gps_set_timezone', True))
+
+STEP_THRESHOLD_S = 0.5
+STATE_INTERVAL_S = 1.0   # state file rewritten at most this often
+LOG_INTERVAL_S = 60
+
+# -------------------------------
+# Timezone (once per run)
+# -------------------------------
+
+timezone_set = False
+
+def update_timezone(lat, lon):
+    """Set the timezone from the first fix; TimezoneFinder is loaded once."""
+    global timezone_set
+    if timezone_set or lat is None or lon is None:
+        return
+    timezone_set = True
+    from timezonefinder import TimezoneFinder  # large; only needed once
+
+    zone = TimezoneFinder().timezone_at(lng=lon, lat=lat)
+    if zone:
+        logger.info('Set timezone to %s', zone)
+        os.system(f"timedatectl set-timezone {zone}")
+
+# -------------------------------
+# PPS
+# -------------------------------
+
+last_pps_sequence = None
+
+def read_pps():
+    """System time of a new PPS assert edge since the last call, else None."""
+    global last_pps_sequence
     try:
-        line = sio.readline()
-        msg = pynmea2.parse(line)
+        with open(pps_path, 'r') as f:
+            stamp, _, sequence = f.read().strip().partition('#')
+    except OSError:
+        return None
+    if not sequence or sequence == last_pps_sequence:
+        return None
+    first = last_pps_sequence is None
+    last_pps_sequence = sequence
+    edge = float(stamp)
+    # The first read may be an old pulse; only fresh ones are measurements
+    if first or edge <= 0 or time.time() - edge > 1.0:
+        return None
+    return edge
 
-        if type(msg) == pynmea2.types.talker.RMC:
+# -------------------------------
+# Main loop
+# -------------------------------
 
-            status = msg.status
+def open_port():
+    return serial.Serial(
+        port = port,
+        baudrate = baudrate,
+        parity = serial.PARITY_NONE,
+        stopbits = serial.STOPBITS_ONE,
+        bytesize = serial.EIGHTBITS,
+        timeout = 0.2   # short, so PPS edges are polled several times a second
+    )
 
-            if status == 'A':
-                logger.debug('Got Fix')
+def step(model, offset):
+    logger.info('System clock is %.3f s off GPS, stepping it', offset)
+    time.clock_settime(time.CLOCK_REALTIME, time.time() + offset)
+    model.reset()
 
-                zeit = msg.datetime
+def run(ser, model):
+    last_state = 0.0
+    last_log = 0.0
+    stepped = not step_clock
 
-                latitude = msg.latitude
-                longitude = msg.longitude
+    while True:
+        raw = ser.readline()
+        # Arrival time of the sentence's last byte
+        received = time.time()
 
-                tf = TimezoneFinder()
-                zeitzone_string = tf.timezone_at(lng=longitude, lat=latitude)
+        edge = read_pps()
+        if edge is not None:
+            model.add_pps(edge)
 
-                logger.debug('Set timezone to %s', zeitzone_string)
-                os.system(f"timedatectl set-timezone {zeitzone_string}")
+        if raw:
+            line = raw.decode('ascii', errors='replace').strip()
+            if gps_time.nmea_checksum_ok(line):
+                try:
+                    fix = gps_time.fix_time(pynmea2.parse(line))
+                except pynmea2.ParseError as e:
+                    logger.error('Parse error: {}'.format(e))
+                    fix = None
+                if fix is not None:
+                    gps_epoch, lat, lon = fix
+                    model.add_nmea(gps_epoch, received)
+                    if set_timezone:
+                        update_timezone(lat, lon)
 
-                zeitzone = pytz.timezone(zeitzone_string)
-                zeit_mit_zeitzone = zeit.replace(tzinfo=pytz.utc).astimezone(zeitzone)
-                unix_zeit = time.mktime(zeit_mit_zeitzone.timetuple())
+        now = time.time()
+        if now - last_state < STATE_INTERVAL_S:
+            continue
+        state = model.estimate(now)
+        if state is None:
+            continue
 
-                logger.debug('Set time to %s', zeit_mit_zeitzone)
-                clk_id = time.CLOCK_REALTIME
-                time.clock_settime(clk_id, float(unix_zeit))
+        if not stepped and abs(state['offset_s']) > STEP_THRESHOLD_S:
+            step(model, state['offset_s'])
+            stepped = True
+            continue
+        stepped = True
 
-                break
+        gps_time.write_state(state, state_path)
+        last_state = now
+        if now - last_log >= LOG_INTERVAL_S:
+            logger.info(
+                'Clock offset %+.6f s ± %.6f s (%s, %d samples), drift %+.2f ppm',
+                state['offset_s'], state['uncertainty_s'], state['source'],
+                state['samples'], state['drift_ppm']
+            )
+            last_log = now
 
-    except serial.SerialException as e:
-        logger.error('Device error: {}'.format(e))
-        break
-    except pynmea2.ParseError as e:
+def main():
+    model = gps_time.ClockModel(nmea_delay=float(config.get('gps_nmea_delay_s', 0.0)))
+    logger.info('Reading GPS on %s, state in %s', port, state_path)
+    while True:
+        try:
+            with open_port() as ser:
+                run(ser, model)
+        except serial.SerialException as e:
+            logger.error('Device error: {}'.format(e))
+            time.sleep(5)
 
-        logger.error('Parse error: {}'.format(e))
-    except UnicodeDecodeError as e:
-        logger.error('UnicodeDecodeError error: {}'.format(e))
-    continue
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import time
+import shlex
+import hashlib
+import subprocess
+
+# Resumable SFTP uploads over one reused session, with optional lossless
+# FLAC compression of recordings.
+#
+# A file is written to <remote>.part, appending from whatever size the
+# partial file already has, so a dropped link resumes where it stopped
+# instead of at byte 0. The finished part is checked against the local
+# SHA-256 (sha256sum on the server) before it is renamed into place.
+
+CHUNK_SIZE = 256 * 1024
+KEEPALIVE_S = 30
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def compress_flac(wav_path, out_dir):
+    """
+    Losslessly compress wav_path with the flac CLI into out_dir.
+    Returns the .flac path, or None if flac is not installed or fails.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    flac_path = os.path.join(out_dir, os.path.splitext(os.path.basename(wav_path))[0] + '.flac')
+    try:
+        subprocess.run(
+            ['flac', '--silent', '--best', '--force', '-o', flac_path, wav_path],
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"FLAC compression unavailable, sending WAV: {e}")
+        return None
+    return flac_path
+
+
+class Uploader:
+    """One authenticated SFTP session, reconnected only when it drops."""
+
+    def __init__(self, hostname, port, username, password):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.transport = None
+        self.sftp = None
+
+    def _session(self):
+        if self.transport is None or not self.transport.is_active():
+            import paramiko  # heavy; loaded on the first upload, not at startup
+
+            self.close()
+            self.transport = paramiko.Transport((self.hostname, self.port))
+            self.transport.connect(username=self.username, password=self.password)
+            self.transport.set_keepalive(KEEPALIVE_S)
+            self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+            print(f"SFTP session opened to {self.hostname}")
+        return self.sftp
+
+    def close(self):
+        for conn in (self.sftp, self.transport):
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        self.sftp = None
+        self.transport = None
+
+    def _remote_sha256(self, remote_path):
+        """sha256sum of a remote file via exec, or None if the server won't run it."""
+        try:
+            channel = self.transport.open_session()
+            channel.settimeout(60)
+            channel.exec_command(f"sha256sum {shlex.quote(remote_path)}")
+            output = channel.makefile('r').read()
+            status = channel.recv_exit_status()
+            channel.close()
+        except Exception as e:
+            print(f"Remote checksum unavailable: {e}")
+            return None
+        if isinstance(output, bytes):
+            output = output.decode()
+        return output.split()[0] if status == 0 and output else None
+
+    def _send(self, local_path, remote_path, size, digest):
+        """One attempt; returns the number of bytes sent."""
+        sftp = self._session()
+        part = remote_path + '.part'
+
+        try:
+            offset = sftp.stat(part).st_size
+        except FileNotFoundError:
+            offset = 0
+        if offset > size:
+            sftp.remove(part)
+            offset = 0
+        if offset:
+            print(f"Resuming {os.path.basename(local_path)} at byte {offset} of {size}")
+
+        sent = 0
+        with open(local_path, 'rb') as src, sftp.open(part, 'ab') as dst:
+            dst.set_pipelined(True)
+            src.seek(offset)
+            for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+                dst.write(block)
+                sent += len(block)
+
+        remote_digest = self._remote_sha256(part)
+        if remote_digest is None:
+            # No shell on the server: fall back to the size
+            if sftp.stat(part).st_size != size:
+                sftp.remove(part)
+                raise IOError("size mismatch after upload, restarting")
+        elif remote_digest != digest:
+            sftp.remove(part)
+            raise IOError("checksum mismatch after upload, restarting")
+
+        # Explicit overwrite of an earlier upload
+        try:
+            sftp.remove(remote_path)
+        except FileNotFoundError:
+            pass
+        sftp.rename(part, remote_path)
+        return sent
+
+    def upload(self, local_path, remote_path, max_attempts=None):
+        """
+        Upload with retries (exponential backoff, max 5 minutes; forever
+        unless max_attempts is given), resuming partial transfers. Returns
+        True once verified in place, False when the attempts run out.
+        """
+        size = os.path.getsize(local_path)
+        digest = sha256_file(local_path)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                sent = self._send(local_path, remote_path, size, digest)
+                elapsed = max(time.monotonic() - started, 1e-6)
+                print(
+                    f"Uploaded {local_path} → {remote_path}: {size} bytes "
+                    f"({sent} sent, {sent / elapsed / 1024:.1f} KiB/s)"
+                )
+                return True
+            except Exception as e:
+                print(f"SFTP upload failed (attempt {attempt}): {e}")
+                self.close()
+                if max_attempts is not None and attempt >= max_attempts:
+                    return False
+                sleep_time = min(5 * (2 ** (attempt - 1)), 300)
+                print(f"Retrying SFTP in {sleep_time} seconds...")
+                time.sleep(sleep_time)
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# One process for all the station jobs, replacing the separate services
+# (record-audio, detect-events, check-for-instructions, send-status,
+# send-bandwidth-usage). Each job is the unchanged script's main loop,
+# imported only when its task starts and run in its own worker thread
+# under one asyncio loop, so the interpreter, requests, psutil and numpy
+# are loaded once instead of once per service. A job that exits or
+# crashes is restarted, like Restart=always did.
+#
+# Every REPORT_INTERVAL_S the agent prints, for each job that has loaded,
+# the CPU time of its own thread and the resident memory its import
+# added. CPU of helper threads (capture, telemetry flush, SSH transport)
+# is reported as one remainder line, since it cannot be told apart without
+# hooking thread creation.
+
+config_path = '/home/bob325/config.json'
+
+with open(config_path, 'r') as f:
+    config = json.load(f)
+
+# Script name -> entry point, in start order (the recorder first)
+JOBS = {
+    "record-audio": "main",
+    "detect-events": "main",
+    "check-for-instructions": "main",
+    "send-status": "main",
+    "send-bandwidth-usage": "update_bandwidth_usage",
+}
+
+START_STAGGER_S = 2       # spacing between job starts, so the recorder is up first
+RESTART_DELAY_S = 30
+REPORT_INTERVAL_S = 600
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+# -------------------------------
+# Per-job accounting
+# -------------------------------
+
+class Job:
+    def __init__(self, name, entry):
+        self.name = name
+        self.entry = entry
+        self.state = "waiting"
+        self.restarts = 0
+        self.load_rss_kb = None
+        self.cpu_done = 0.0      # CPU of finished runs of the job's own thread
+        self.run = None          # (worker thread id, its CPU at start) of the current run
+
+def rss_kb():
+    """Resident memory of the whole process."""
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def thread_cpu_s(native_id):
+    """User + system CPU seconds of one thread of this process."""
+    try:
+        with open(f'/proc/self/task/{native_id}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+def process_cpu_s():
+    t = os.times()
+    return t.user + t.system
+
+def job_cpu_s(job):
+    run = job.run
+    live = thread_cpu_s(run[0]) - run[1] if run is not None else 0.0
+    return job.cpu_done + live
+
+
+# -------------------------------
+# Jobs
+# -------------------------------
+
+def load(job):
+    """Import a hyphen-named script as a module (without running its main)."""
+    module_name = job.name.replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    before = rss_kb()
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, job.name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    job.load_rss_kb = rss_kb() - before
+    return module
+
+def run(job):
+    """Body of the job's worker thread: import, then run the script's loop."""
+    native_id = threading.current_thread().native_id
+    started_cpu = thread_cpu_s(native_id)
+    job.run = (native_id, started_cpu)
+    try:
+        job.state = "loading"
+        module = load(job)
+        job.state = "running"
+        getattr(module, job.entry)()
+    finally:
+        # Pool threads are reused; keep this run's CPU and let go of the thread
+        job.cpu_done += thread_cpu_s(native_id) - started_cpu
+        job.run = None
+
+async def supervise(job):
+    while True:
+        try:
+            await asyncio.to_thread(run, job)
+            print(f"[AGENT] {job.name} returned")
+        except Exception as e:
+            print(f"[AGENT] {job.name} failed: {e!r}")
+        job.state = "restarting"
+        job.restarts += 1
+        await asyncio.sleep(RESTART_DELAY_S)
+
+async def report(jobs, started):
+    announced = set()
+    last_report = time.monotonic()
+    while True:
+        await asyncio.sleep(1)
+        now = time.monotonic()
+
+        # Boot to ready, per job: one that never loads holds up nothing else
+        for j in jobs:
+            if j.load_rss_kb is not None and j.name not in announced:
+                announced.add(j.name)
+                print(f"[AGENT] {j.name} loaded {now - started:.1f} s after start")
+
+        if now - last_report < REPORT_INTERVAL_S:
+            continue
+        last_report = now
+
+        lines = [f"[AGENT] RSS {rss_kb() / 1024:.1f} MB"]
+        job_cpu = 0.0
+        for j in jobs:
+            if j.load_rss_kb is None:
+                continue  # not loaded (yet); nothing to attribute
+            cpu = job_cpu_s(j)
+            job_cpu += cpu
+            lines.append(
+                f"[AGENT]   {j.name:<24} {j.state:<10} cpu {cpu:8.1f} s"
+                f"  load rss {j.load_rss_kb / 1024:6.1f} MB  restarts {j.restarts}"
+            )
+        lines.append(f"[AGENT]   {'(helper threads, agent)':<35} cpu {process_cpu_s() - job_cpu:8.1f} s")
+        print("\n".join(lines))
+
+
+async def main():
+    started = time.monotonic()
+    names = config.get('agent_jobs', list(JOBS))
+    jobs = [Job(name, JOBS[name]) for name in names]
+
+    # One worker thread per job plus one spare; the default pool is too
+    # small on a single-core Pi for jobs that never return
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=len(jobs) + 1))
+
+    print(f"[AGENT] Starting {', '.join(names)}")
+    tasks = [asyncio.create_task(report(jobs, started))]
+    for job in jobs:
+        tasks.append(asyncio.create_task(supervise(job)))
+        await asyncio.sleep(START_STAGGER_S)
+    await asyncio.gather(*tasks)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import gzip
+import json
+import time
+import sqlite3
+import threading
+import requests
+
+# On-disk telemetry uplink shared by send-status.py and
+# send-bandwidth-usage.py.
+#
+# Samples are stored in a small SQLite queue the moment they are taken and
+# removed only once the server has accepted them, so an LTE outage delays
+# telemetry instead of losing it. A background thread drains the queue
+# oldest first over one keep-alive session. Runs of samples for a URL with
+# a batch endpoint go as a single gzip-compressed POST; other URLs get one
+# POST per sample. A rejected batch is retried sample by sample, so only
+# the bad ones are dropped, and a server without the batch endpoint gets
+# single samples. Failures back off exponentially.
+
+BATCH_MAX = 100          # samples per batch POST (well under the server's body limit)
+MAX_QUEUED = 50000       # oldest samples are dropped beyond this
+BACKOFF_MAX_S = 300
+
+
+class TelemetryQueue:
+    """
+    Persistent FIFO of (url, payload) samples. batch_urls maps a
+    single-sample URL to the endpoint taking {"samples": [...]} for it.
+    """
+
+    def __init__(self, db_path, batch_urls=None, timeout=15):
+        self.batch_urls = dict(batch_urls or {})   # endpoints found missing are removed
+        self.timeout = timeout
+        self.session = requests.Session()   # keep-alive across flushes
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " url TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " queued_at REAL NOT NULL)"
+            )
+
+    # -------------------------------
+    # Queue
+    # -------------------------------
+
+    def put(self, url, payload):
+        """Queue one sample; it is sent by the flusher thread."""
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO queue (url, payload, queued_at) VALUES (?, ?, ?)",
+                (url, json.dumps(payload), time.time())
+            )
+            self.db.execute(
+                "DELETE FROM queue WHERE seq <= (SELECT MAX(seq) FROM queue) - ?",
+                (MAX_QUEUED,)
+            )
+        self.wake.set()
+
+    def pending(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def _head(self):
+        """The oldest run of samples for one URL (at most BATCH_MAX)."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT seq, url, payload FROM queue ORDER BY seq LIMIT ?", (BATCH_MAX,)
+            ).fetchall()
+        if not rows:
+            return None, []
+        url = rows[0][1]
+        run = []
+        for seq, row_url, payload in rows:
+            if row_url != url:
+                break
+            run.append((seq, json.loads(payload)))
+        return url, run
+
+    def _remove(self, seqs):
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM queue WHERE seq = ?", [(s,) for s in seqs])
+
+    # -------------------------------
+    # Sending
+    # -------------------------------
+
+    def _post(self, url, payload, batch=False):
+        """
+        POST one sample, or with batch=True a list of them to the URL's
+        batch endpoint. True when accepted, False for a rejected body
+        (dropped so it cannot block the queue), None when the server has no
+        batch endpoint (404/405); raises to retry later.
+        """
+        if batch:
+            body = gzip.compress(json.dumps({"samples": payload}).encode())
+            r = self.session.post(
+                self.batch_urls[url], data=body, timeout=self.timeout,
+                headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+            )
+        else:
+            r = self.session.post(url, json=payload, timeout=self.timeout)
+
+        if r.ok:
+            return True
+        if batch and r.status_code in (404, 405):
+            return None
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            print(f"Telemetry rejected {r.status_code}: {r.text[:200]}")
+            return False
+        raise requests.exceptions.HTTPError(f"{r.status_code}: {r.text[:200]}")
+
+    def flush(self):
+        """Send everything queued; raises on the first failure."""
+        while True:
+            url, run = self._head()
+            if not run:
+                return
+            if url in self.batch_urls:
+                accepted = self._post(url, [payload for _, payload in run], batch=True)
+                if accepted:
+                    self._remove([seq for seq, _ in run])
+                    print(f"Telemetry sent {len(run)} sample(s) to {url}")
+                    continue
+                if accepted is None:
+                    # Server without the batch endpoint (not deployed yet)
+                    print(f"No batch endpoint for {url}, sending samples one at a time")
+                    del self.batch_urls[url]
+                else:
+                    # One bad sample must not cost the rest of the batch
+                    print(f"Telemetry batch of {len(run)} rejected, sending its samples one at a time")
+
+            for seq, payload in run:
+                accepted = self._post(url, payload)
+                self._remove([seq])
+                if accepted:
+                    print(f"Telemetry sent 1 sample to {url}")
+                else:
+                    print(f"Telemetry dropped 1 rejected sample for {url}")
+
+    def _run(self):
+        failures = 0
+        while True:
+            self.wake.clear()
+            try:
+                self.flush()
+                failures = 0
+                self.wake.wait()
+            except Exception as e:
+                failures += 1
+                delay = min(5 * (2 ** (failures - 1)), BACKOFF_MAX_S)
+                print(f"Telemetry upload failed ({self.pending()} queued), retrying in {delay} s: {e}")
+                # A new sample does not cut the backoff short
+                time.sleep(delay)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    @classmethod
+    def shared(cls, db_path, batch_urls=None, timeout=15):
+        """
+        The started queue for db_path, created on first use. Under
+        station-agent.py a restarted job calls its main() again; this keeps
+        it on one flusher thread and connection.
+        """
+        with _shared_lock:
+            if db_path not in _shared:
+                _shared[db_path] = cls(db_path, batch_urls, timeout).start()
+            return _shared[db_path]
+
+_shared = {}
+_shared_lock = threading.Lock()
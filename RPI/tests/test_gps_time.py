@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import gps_time
+
+RMC = "$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A"
+
+OFFSET = 0.35          # GPS - system at t0
+DRIFT = 20e-6          # s/s
+NMEA_DELAY = 0.12      # receiver's sentence delay after the second it names
+
+def true_offset(t, t0):
+    return OFFSET + DRIFT * (t - t0)
+
+def feed(model, t0, seconds, pps=False, seed=0):
+    """One NMEA sentence per GPS second with jittered latency, and optionally PPS edges."""
+    rng = np.random.default_rng(seed)
+    for k in range(seconds):
+        gps_second = t0 + k
+        # System time when GPS time is g: solve g = t + offset(t)
+        edge = (gps_second - OFFSET + DRIFT * t0) / (1.0 + DRIFT)
+        if pps:
+            model.add_pps(edge + rng.normal(0.0, 2e-6))
+        model.add_nmea(gps_second, edge + NMEA_DELAY + rng.exponential(0.03))
+
+def test_nmea_checksum():
+    assert gps_time.nmea_checksum_ok(RMC)
+    assert not gps_time.nmea_checksum_ok(RMC.replace("*6A", "*6B"))
+    assert not gps_time.nmea_checksum_ok(RMC.replace("4807", "4808"))
+    assert not gps_time.nmea_checksum_ok("GPRMC,no dollar*00")
+
+def test_fix_time_from_rmc():
+    pynmea2 = pytest.importorskip("pynmea2")
+    epoch, lat, lon = gps_time.fix_time(pynmea2.parse(RMC))
+    assert epoch == 764426119.0   # 1994-03-23 12:35:19 UTC
+    assert lat == pytest.approx(48.1173)
+    assert lon == pytest.approx(11.516667, abs=1e-6)
+
+def test_fit_line_recovers_offset_and_drift():
+    ts = np.arange(0.0, 600.0, 5.0)
+    points = [(1000.0 + t, 0.2 + 30e-6 * t) for t in ts]
+    t_ref, offset, drift, rms = gps_time.fit_line(points)
+    assert t_ref == 1000.0 + ts[-1]
+    assert offset == pytest.approx(0.2 + 30e-6 * ts[-1], abs=1e-12)
+    assert drift == pytest.approx(30e-6, rel=1e-9)
+    assert rms < 1e-12
+
+def test_fit_line_ignores_drift_over_short_spans():
+    points = [(t, 0.5 + 1e-3 * t) for t in np.arange(0.0, gps_time.MIN_DRIFT_SPAN_S - 10, 1.0)]
+    _, offset, drift, _ = gps_time.fit_line(points)
+    assert drift == 0.0
+    assert offset == pytest.approx(np.mean([o for _, o in points]))
+
+def test_nmea_estimate_with_known_delay():
+    t0 = 1.7e9
+    model = gps_time.ClockModel(nmea_delay=NMEA_DELAY)
+    feed(model, t0, 600)
+    state = model.estimate(t0 + 600)
+    assert state["source"] == "nmea"
+    assert state["offset_s"] == pytest.approx(true_offset(state["t_ref"], t0), abs=0.01)
+    assert state["drift_ppm"] == pytest.approx(DRIFT * 1e6, abs=10)
+    # Uncalibrated delay: the uncertainty includes NMEA_DELAY_UNCERTAINTY_S
+    assert state["uncertainty_s"] >= gps_time.NMEA_DELAY_UNCERTAINTY_S
+
+def test_pps_gives_the_offset_and_calibrates_the_nmea_delay():
+    t0 = 1.7e9
+    model = gps_time.ClockModel()
+    feed(model, t0, 300, pps=True)
+    state = model.estimate(t0 + 300)
+    assert state["source"] == "pps"
+    assert state["offset_s"] == pytest.approx(true_offset(state["t_ref"], t0), abs=1e-5)
+    assert state["drift_ppm"] == pytest.approx(DRIFT * 1e6, abs=0.5)
+    assert model.nmea_calibrated
+    assert model.nmea_delay == pytest.approx(NMEA_DELAY, abs=0.01)
+
+def test_pps_without_nmea_is_not_used():
+    model = gps_time.ClockModel()
+    assert not model.add_pps(100.0)
+    assert model.estimate(100.0) is None
+
+def test_offset_at_extrapolates_and_goes_stale(tmp_path):
+    now = time.time()
+    state = {
+        "t_ref": now - 100.0, "offset_s": 0.25, "drift_ppm": 10.0, "uncertainty_s": 1e-4,
+        "source": "pps", "samples": 300, "nmea_delay_s": 0.1, "updated": now,
+    }
+    path = str(tmp_path / "fresh.json")
+    gps_time.write_state(state, path)
+    clock = gps_time.offset_at(now, path)
+    assert clock["clock_offset_s"] == pytest.approx(0.25 + 10e-6 * 100.0)
+    assert clock["clock_uncertainty_s"] == pytest.approx(1e-4 + gps_time.DRIFT_UNCERTAINTY * 100.0)
+    assert clock["clock_source"] == "pps"
+
+    state["updated"] = now - gps_time.STALE_S - 1
+    path = str(tmp_path / "stale.json")
+    gps_time.write_state(state, path)
+    assert gps_time.offset_at(now, path) is None
+    assert gps_time.offset_at(now, str(tmp_path / "missing.json")) is None
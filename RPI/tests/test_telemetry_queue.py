@@ -0,0 +1,144 @@
+import os
+import sys
+import gzip
+import json
+import threading
+import pytest
+
+pytest.importorskip("requests")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import telemetry_queue
+from telemetry_queue import TelemetryQueue
+
+STATUS_URL = "http://server/node/update"
+BATCH_URL = "http://server/node/update_batch"
+BANDWIDTH_URL = "http://server/bandwidth"
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = ""
+
+class Session:
+    """Records POSTs and answers with the queued status codes (200 when none are left)."""
+
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        if "data" in kwargs:
+            assert kwargs["headers"]["Content-Encoding"] == "gzip"
+            body = json.loads(gzip.decompress(kwargs["data"]))
+        else:
+            body = kwargs["json"]
+        self.posts.append((url, body))
+        return Response(self.codes.pop(0) if self.codes else 200)
+
+def make_queue(tmp_path, *codes):
+    q = TelemetryQueue(str(tmp_path / "telemetry.db"), batch_urls={STATUS_URL: BATCH_URL})
+    q.session = Session(*codes)
+    return q
+
+def test_samples_survive_a_restart(tmp_path):
+    q = make_queue(tmp_path)
+    q.put(STATUS_URL, {"at": 1})
+    q.put(STATUS_URL, {"at": 2})
+    q.db.close()
+    assert make_queue(tmp_path).pending() == 2
+
+def test_runs_for_a_batch_url_go_as_one_gzip_post(tmp_path):
+    q = make_queue(tmp_path)
+    for at in range(5):
+        q.put(STATUS_URL, {"at": at})
+    q.put(BANDWIDTH_URL, {"bytes": 10})
+    q.put(BANDWIDTH_URL, {"bytes": 20})
+    q.flush()
+    assert q.session.posts == [
+        (BATCH_URL, {"samples": [{"at": at} for at in range(5)]}),
+        (BANDWIDTH_URL, {"bytes": 10}),
+        (BANDWIDTH_URL, {"bytes": 20}),
+    ]
+    assert q.pending() == 0
+
+def test_batches_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry_queue, "BATCH_MAX", 3)
+    q = make_queue(tmp_path)
+    for at in range(7):
+        q.put(STATUS_URL, {"at": at})
+    q.flush()
+    assert [len(body["samples"]) for _, body in q.session.posts] == [3, 3, 1]
+
+def test_server_error_keeps_the_samples(tmp_path):
+    q = make_queue(tmp_path, 503)
+    q.put(STATUS_URL, {"at": 1})
+    with pytest.raises(Exception):
+        q.flush()
+    assert q.pending() == 1
+    q.flush()
+    assert q.pending() == 0
+
+def test_rate_limit_is_retried_not_dropped(tmp_path):
+    q = make_queue(tmp_path, 429)
+    q.put(BANDWIDTH_URL, {"bytes": 1})
+    with pytest.raises(Exception):
+        q.flush()
+    assert q.pending() == 1
+
+def test_rejected_sample_is_dropped(tmp_path):
+    q = make_queue(tmp_path, 400)
+    q.put(BANDWIDTH_URL, {"bytes": 1})
+    q.put(BANDWIDTH_URL, {"bytes": 2})
+    q.flush()
+    assert q.pending() == 0
+    assert len(q.session.posts) == 2
+
+def test_rejected_batch_is_retried_one_at_a_time(tmp_path):
+    # The batch is refused over one bad sample; only that one is dropped
+    q = make_queue(tmp_path, 400, 200, 400, 200)
+    for at in range(3):
+        q.put(STATUS_URL, {"at": at})
+    q.flush()
+    assert q.session.posts == [
+        (BATCH_URL, {"samples": [{"at": 0}, {"at": 1}, {"at": 2}]}),
+        (STATUS_URL, {"at": 0}),
+        (STATUS_URL, {"at": 1}),
+        (STATUS_URL, {"at": 2}),
+    ]
+    assert q.pending() == 0
+    # Batching is kept for later runs
+    q.put(STATUS_URL, {"at": 3})
+    q.flush()
+    assert q.session.posts[-1] == (BATCH_URL, {"samples": [{"at": 3}]})
+
+@pytest.mark.parametrize("code", [404, 405])
+def test_missing_batch_endpoint_falls_back_to_single_samples(tmp_path, code):
+    q = make_queue(tmp_path, code)
+    q.put(STATUS_URL, {"at": 1})
+    q.put(STATUS_URL, {"at": 2})
+    q.flush()
+    assert q.session.posts == [
+        (BATCH_URL, {"samples": [{"at": 1}, {"at": 2}]}),
+        (STATUS_URL, {"at": 1}),
+        (STATUS_URL, {"at": 2}),
+    ]
+    q.put(STATUS_URL, {"at": 3})
+    q.flush()
+    assert q.session.posts[-1] == (STATUS_URL, {"at": 3})
+
+def test_oldest_samples_are_dropped_beyond_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry_queue, "MAX_QUEUED", 3)
+    q = make_queue(tmp_path)
+    for at in range(5):
+        q.put(STATUS_URL, {"at": at})
+    assert q.pending() == 3
+    q.flush()
+    assert q.session.posts == [(BATCH_URL, {"samples": [{"at": 2}, {"at": 3}, {"at": 4}]})]
+
+def test_shared_queue_is_created_once(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = TelemetryQueue.shared(path)
+    threads = threading.active_count()
+    assert TelemetryQueue.shared(path) is first
+    assert threading.active_count() == threads
@@ -1,5 +1,16 @@
 const mongoose = require('mongoose');
 
+// Number of listening stations; each gets a stationN_complete flag
+const STATION_COUNT = Number(process.env.STATION_COUNT || 4);
+
+const stationFlags = {};
+for (let n = 1; n <= STATION_COUNT; n++) {
+  stationFlags[`station${n}_complete`] = {
+    type: Boolean,
+    default: false,
+  };
+}
+
 const InstructionsSchema = new mongoose.Schema(
   {
     timestamp: {
@@ -9,22 +20,7 @@ const InstructionsSchema = new mongoose.Schema(
     instruction_type: String,
     instruction_target: String,
     instruction_value: String,
-    station1_complete: {
-      type: Boolean,
-      default: false, 
-    },
-    station2_complete: {
-      type: Boolean,
-      default: false, 
-    },
-    station3_complete: {
-      type: Boolean,
-      default: false, 
-    },
-    station4_complete: {
-      type: Boolean,
-      default: false,
-    },
+    ...stationFlags,
     all_complete: {
       type: Boolean,
       default: false, 
@@ -33,4 +29,5 @@ const InstructionsSchema = new mongoose.Schema(
 );
 
 const Instructions = mongoose.model('Instructions', InstructionsSchema);
+Instructions.STATION_COUNT = STATION_COUNT;
 module.exports = Instructions;
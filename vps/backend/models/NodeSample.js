@@ -12,5 +12,7 @@ const NodeSampleSchema = new mongoose.Schema({
 
 // Optional: index for querying by time
 NodeSampleSchema.index({ key: 1, at: -1 });
+// Recent samples across all nodes (weather lookups)
+NodeSampleSchema.index({ at: -1 });
 
 module.exports = mongoose.model("NodeSample", NodeSampleSchema);
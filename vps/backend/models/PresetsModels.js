@@ -11,17 +11,17 @@ const PresetSchema = new mongoose.Schema({
     type: [StationSchema], 
     required: true, 
     validate: {
-      validator: v => v.length === 4,
-      message: 'Exactly 4 coordinates are required'
+      validator: v => v.length >= 3,
+      message: 'At least 3 coordinates are required'
     }
   },
-  // NEW: store 4 TDOA values (tA–tD)
+  // NEW: store one TDOA value per station (tA, tB, ...)
   times: {
     type: [Number],
     required: true,
     validate: {
-      validator: v => v.length === 4,
-      message: 'Exactly 4 time offsets are required'
+      validator: v => v.length >= 3,
+      message: 'At least 3 time offsets are required'
     }
   }
 }, { timestamps: true });
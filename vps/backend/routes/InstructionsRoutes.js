@@ -1,8 +1,42 @@
 const express = require('express');
+const { EventEmitter } = require('events');
 const Instructions = require('../models/InstructionsModels'); // Path to the Instructions model
 
 const router = express.Router();
 
+// ----------------------------
+// Change tracking for station polling
+// ----------------------------
+// Every add/update/delete bumps the version. The version (prefixed with the
+// boot time, so ETags from before a restart never match) is the ETag of the
+// /pending lists, and long-polling stations wait on the emitter.
+const MAX_WAIT_S = 55;  // below common proxy read timeouts
+const bootId = Date.now().toString(36);
+let version = 0;
+const changes = new EventEmitter();
+changes.setMaxListeners(0);
+
+function currentEtag() {
+  return `W/"${bootId}-${version}"`;
+}
+
+function instructionsChanged() {
+  version += 1;
+  changes.emit('change');
+}
+
+function waitForChange(seconds) {
+  return new Promise((resolve) => {
+    const done = () => {
+      clearTimeout(timer);
+      changes.removeListener('change', done);
+      resolve();
+    };
+    const timer = setTimeout(done, seconds * 1000);
+    changes.once('change', done);
+  });
+}
+
 // ----------------------------
 // Create a new instruction
 // ----------------------------
@@ -12,25 +46,24 @@ router.post('/add_instructions', async (req, res) => {
       instruction_type,
       instruction_target,
       instruction_value,
-      station1_complete,
-      station2_complete,
-      station3_complete,
-      station4_complete,
       all_complete
     } = req.body;
 
+    const stationFlags = {};
+    for (let n = 1; n <= Instructions.STATION_COUNT; n++) {
+      stationFlags[`station${n}_complete`] = req.body[`station${n}_complete`] || false;
+    }
+
     const newInstruction = new Instructions({
       instruction_type,
       instruction_target,
       instruction_value,
-      station1_complete: station1_complete || false,
-      station2_complete: station2_complete || false,
-      station3_complete: station3_complete || false,
-      station4_complete: station4_complete || false,
+      ...stationFlags,
       all_complete: all_complete || false
     });
 
     await newInstruction.save();
+    instructionsChanged();
     res.status(201).json({ message: 'Instruction added successfully', instruction: newInstruction });
   } catch (error) {
     console.error(error);
@@ -52,6 +85,7 @@ router.put('/update_instructions/:id', async (req, res) => {
     if (!updatedInstruction) {
       return res.status(404).json({ message: 'Instruction not found' });
     }
+    instructionsChanged();
 
     res.status(200).json({ message: 'Instruction updated successfully', instruction: updatedInstruction });
   } catch (error) {
@@ -72,6 +106,7 @@ router.delete('/delete_instructions/:id', async (req, res) => {
     if (!deletedInstruction) {
       return res.status(404).json({ message: 'Instruction not found' });
     }
+    instructionsChanged();
 
     res.status(200).json({ message: 'Instruction deleted successfully', instruction: deletedInstruction });
   } catch (error) {
@@ -93,6 +128,48 @@ router.get('/get_instructions', async (req, res) => {
   }
 });
 
+// ----------------------------
+// Pending instructions for one station
+// ----------------------------
+// GET /pending?station=N[&wait=S] returns only the instructions station N
+// still has to run. Send the previous ETag as If-None-Match to get a 304
+// when nothing changed; with wait, an unchanged list is held open for up to
+// S seconds and answered as soon as something changes.
+router.get('/pending', async (req, res) => {
+  const station = Number(req.query.station);
+  if (!Number.isInteger(station) || station < 1 || station > Instructions.STATION_COUNT) {
+    return res.status(400).json({ message: `station must be 1-${Instructions.STATION_COUNT}` });
+  }
+  const wait = Math.min(Math.max(Number(req.query.wait) || 0, 0), MAX_WAIT_S);
+
+  try {
+    if (wait > 0 && req.get('If-None-Match') === currentEtag()) {
+      await waitForChange(wait);
+    }
+
+    const etag = currentEtag();
+    res.set('ETag', etag);
+    res.set('Cache-Control', 'no-cache');
+    if (req.get('If-None-Match') === etag) {
+      return res.status(304).end();
+    }
+
+    const instructions = await Instructions.find(
+      {
+        all_complete: { $ne: true },
+        [`station${station}_complete`]: { $ne: true },
+        instruction_target: { $in: [String(station), 'ALL'] }
+      },
+      { instruction_type: 1, instruction_target: 1, instruction_value: 1, timestamp: 1 }
+    ).sort({ timestamp: 1 }).lean();
+
+    res.status(200).json(instructions);
+  } catch (error) {
+    console.error(error);
+    res.status(500).json({ message: 'Error fetching instructions' });
+  }
+});
+
 // ----------------------------
 // Get a single instruction by ID
 // ----------------------------
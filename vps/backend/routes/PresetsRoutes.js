@@ -34,9 +34,9 @@ router.post('/', async (req, res) => {
   console.log('PRESET BODY:', req.body);
   const { name, coords, times } = req.body;
 
-  if (!name || !coords || coords.length !== 4 || !times || times.length !== 4) {
+  if (!name || !coords || coords.length < 3 || !times || times.length !== coords.length) {
     return res.status(400).json({
-      error: 'Invalid data. Must include name, 4 coords, and 4 times.'
+      error: 'Invalid data. Must include name, at least 3 coords, and one time per coord.'
     });
   }
 
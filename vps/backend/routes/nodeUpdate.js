@@ -7,4 +7,22 @@ router.post("/update", async (req, res) => {
   res.send({ ok: true })
 })
 
+// Queued samples from a station, oldest first, each with its own `at` (ms).
+// Bodies may be gzip-compressed (Content-Encoding: gzip).
+router.post("/update_batch", async (req, res) => {
+  const samples = req.body?.samples
+  if (!Array.isArray(samples)) {
+    return res.status(400).send({ ok: false, error: "samples must be an array" })
+  }
+  try {
+    for (const sample of samples) {
+      await handleNodeUpdate(sample)
+    }
+    res.send({ ok: true, count: samples.length })
+  } catch (err) {
+    console.error("node batch error", err)
+    res.status(500).send({ ok: false, error: "batch_failed" })
+  }
+})
+
 module.exports = router
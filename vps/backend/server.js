@@ -4,6 +4,8 @@ const cors = require('cors');
 const { exec, spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
+const solver = require('./services/solverWorker');
+const weather = require('./services/weather');
 require('dotenv').config();
 
 // ===== Express app FIRST =====
@@ -77,62 +79,90 @@ app.get("/get-ip", (req, res) => {
 
 // ====== Generate Plot =====
 
-app.get("/generate_plot_json", (req, res) => {
+app.get("/generate_plot_json", async (req, res) => {
   const q = req.query;
 
-  // Validate that all parameters exist
-  const required = [
-    "lat1","lon1","lat2","lon2","lat3","lon3","lat4","lon4",
-    "tA","tB","tC","tD"
-  ];
-
-  for (const r of required) {
-    if (!(r in q)) {
-      return res.status(400).json({ error: `Missing parameter ${r}` });
+  // Stations are lat1/lon1 ... latN/lonN (N >= 3); times are tA, tB, ...
+  // (or t1 ... tN for larger arrays)
+  const lats = [];
+  const lons = [];
+  const times = [];
+  for (let n = 1; `lat${n}` in q || `lon${n}` in q; n++) {
+    const letter = `t${String.fromCharCode(64 + n)}`;
+    const values = {
+      [`lat${n}`]: q[`lat${n}`],
+      [`lon${n}`]: q[`lon${n}`],
+      [letter]: letter in q ? q[letter] : q[`t${n}`]
+    };
+
+    for (const [name, value] of Object.entries(values)) {
+      if (value === undefined) {
+        return res.status(400).json({ error: `Missing parameter ${name}` });
+      }
     }
-  }
-
-  // Build argument list for python script
-  const args = [
-    "services/generate_plot.py",
-    q.lat1, q.lon1,
-    q.lat2, q.lon2,
-    q.lat3, q.lon3,
-    q.lat4, q.lon4,
-    q.tA, q.tB, q.tC, q.tD
-  ];
-
-  const python = spawn("python3", args);
 
-  let output = "";
-  let errorOutput = "";
-
-  python.stdout.on("data", (data) => {
-    output += data.toString();
-  });
+    lats.push(values[`lat${n}`]);
+    lons.push(values[`lon${n}`]);
+    times.push(values[letter]);
+  }
 
-  python.stderr.on("data", (data) => {
-    errorOutput += data.toString();
-  });
+  if (lats.length < 3) {
+    return res.status(400).json({ error: "At least 3 stations (lat1/lon1 ... lat3/lon3) are required" });
+  }
 
-  python.on("close", (code) => {
-    if (code !== 0) {
-      return res.status(500).json({
-        error: "Python script failed",
-        details: errorOutput
-      });
+  // Parameters for the warm solver process (see services/solverWorker.js)
+  const params = {
+    lats,
+    lons,
+    times,
+    temp_c: q.tempC !== undefined && q.tempC !== "" ? q.tempC : null,
+    fast: q.fast === "1" || q.fast === "true"
+  };
+  if (q.omit !== undefined) params.omit = Number(q.omit);
+  if (q.pairs !== undefined) params.pairs = q.pairs;
+  // Uncertainty: sigmaT (s) / sigmaPos (m) noise, mc samples, gdop map
+  if (q.sigmaT !== undefined) params.sigma_t = Number(q.sigmaT);
+  if (q.sigmaPos !== undefined) params.sigma_pos = Number(q.sigmaPos);
+  if (q.mc !== undefined) params.monte_carlo = Number(q.mc);
+  if (q.gdop !== undefined) params.gdop = q.gdop === "1" || q.gdop === "true";
+  // Outlier rejection: robust=1, robustThreshold in meters
+  if (q.robust !== undefined) params.robust = q.robust === "1" || q.robust === "true";
+  if (q.robustThreshold !== undefined) params.robust_threshold = Number(q.robustThreshold);
+  // Hyperbola encoding: format=json|polyline|binary, precision (decimals),
+  // tolerance (meters of Douglas-Peucker simplification)
+  if (q.format !== undefined) params.encoding = q.format;
+  if (q.precision !== undefined) params.precision = Number(q.precision);
+  if (q.tolerance !== undefined) params.tolerance_m = Number(q.tolerance);
+
+  try {
+    // Per-path sound speed from the stations' latest weather readings;
+    // stations=1,2,... maps solver stations to node station ids
+    if (q.weather === "1" || q.weather === "true") {
+      const ids = q.stations ? String(q.stations).split(",") : lats.map((_, i) => String(i + 1));
+      const readings = await weather.stationWeather(ids);
+      if (readings.some(Boolean)) params.weather = readings;
     }
+  } catch (err) {
+    console.error("weather lookup failed:", err.message);
+  }
 
-    try {
-      const json = JSON.parse(output);
-      res.json(json);
-    } catch (err) {
-      res.status(500).json({
-        error: "Invalid JSON from Python",
-        raw: output
-      });
-    }
-  });
+  try {
+    const json = await solver.solve(params);
+    res.json(json);
+  } catch (err) {
+    res.status(500).json({
+      error: "Python script failed",
+      details: err.message
+    });
+  }
+});
+
+app.get("/generate_plot_cache_stats", async (req, res) => {
+  try {
+    res.json(await solver.cacheStats());
+  } catch (err) {
+    res.status(500).json({ error: err.message });
+  }
 });
 
 // ===== Audio =====
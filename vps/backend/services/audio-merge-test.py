@@ -1,47 +1,47 @@
 import os
-from pydub import AudioSegment
+import wav_merge
 import sys
 
 # -------- CONFIG --------
 AUDIO_FOLDER = "/home/mshaffer/www/sound-multilateration/vps/backend/services/audio_files"  
 MERGED_FOLDER = "/home/mshaffer/www/sound-multilateration/vps/backend/services/merged_audio" 
+STATION_COUNT = 4
 # ------------------------
 
 os.makedirs(MERGED_FOLDER, exist_ok=True)
 
-def merge_audio_files(file_prefix):
+def merge_audio_files(file_prefix, station_count=STATION_COUNT):
     """
-    Merge audio1..audio4 into a single file.
+    Merge audio1..audioN into a single file.
     """
     files = []
-    for i in range(1, 5):
+    for i in range(1, station_count + 1):
         filename = f"{file_prefix}_audio{i}.wav"
         filepath = os.path.join(AUDIO_FOLDER, filename)
-        if not os.path.exists(filepath):
-            print(f"Missing file: {filepath}")
+        # Uploaded as WAV or FLAC
+        filepath = wav_merge.station_wav(filepath)
+        if filepath is None:
+            print(f"Missing file: {os.path.join(AUDIO_FOLDER, filename)}")
             return False
-        files.append(AudioSegment.from_file(filepath))
+        files.append(filepath)
 
-    # Trim all files to the length of the shortest one
-    min_len = min(len(a) for a in files)
-    files = [a[:min_len] for a in files]
-
-    # Merge into a single stereo or multi-channel audio (combined)
-    combined = AudioSegment.from_mono_audiosegments(*files)
-    
     # Output file path
     output_file = os.path.join(MERGED_FOLDER, f"{file_prefix}_combined.wav")
-    combined.export(output_file, format="wav")
+
+    # Stream into a single multi-channel file, aligned on the recording
+    # start times and trimmed to the shortest input
+    wav_merge.merge_aligned(files, output_file)
     print(f"Merged audio saved to {output_file}")
     return True
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python merge_audio.py <file_prefix>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python merge_audio.py <file_prefix> [station_count]")
         sys.exit(1)
 
     file_prefix = sys.argv[1]  # Get the filename prefix from the command-line argument
-    success = merge_audio_files(file_prefix)
+    station_count = int(sys.argv[2]) if len(sys.argv) == 3 else STATION_COUNT
+    success = merge_audio_files(file_prefix, station_count)
     
     if not success:
         print("Failed to merge the files.")
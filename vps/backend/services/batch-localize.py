@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import os
+import sys
+import io
+import json
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+import tdoa
+from generate_plot import v, speed_of_sound_from_temp, gps_to_xy
+import geodesy
+
+# Batch localization: solve many TDOA events against one station layout and
+# stream one JSON line per event (omit-one solutions + global solution).
+#
+# Input (file or stdin):
+#   json: {"stations": [[lat, lon], ...], "delays": [[tA, tB, tC, tD], ...], "temp_c": 20}
+#   npy:  (N, 4) delay matrix, stations from --stations
+#   csv:  one event per row, stations from --stations
+#
+# Example:
+#   python3 batch-localize.py --input events.csv --stations "38.83,-77.38;38.84,-77.38;..."
+
+CHUNK_SIZE = 1000  # events per worker task
+
+def parse_stations(text):
+    """'lat,lon;lat,lon;...' or a JSON list of [lat, lon] / {"lat", "lon"}."""
+    text = text.strip()
+    if text.startswith("["):
+        items = json.loads(text)
+        return [
+            (float(s["lat"]), float(s["lon"])) if isinstance(s, dict) else (float(s[0]), float(s[1]))
+            for s in items
+        ]
+    return [tuple(float(x) for x in pair.split(",")) for pair in text.split(";") if pair]
+
+def load_events(path, fmt, stations_arg):
+    """Return (stations [(lat, lon)], delays (N, M) array, temp_c or None)."""
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower().lstrip(".")
+        fmt = ext if ext in ("json", "npy", "csv") else "json"
+
+    stations, temp_c = None, None
+    if fmt == "npy":
+        # np.load needs a seekable file, so buffer stdin first
+        delays = np.load(io.BytesIO(sys.stdin.buffer.read()) if path == "-" else path)
+    elif fmt == "csv":
+        source = sys.stdin if path == "-" else path
+        delays = np.loadtxt(source, delimiter=",", ndmin=2)
+    else:
+        if path == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(path, "r") as f:
+                data = json.load(f)
+        delays = np.asarray(data["delays"], dtype=float)
+        if "stations" in data:
+            stations = parse_stations(json.dumps(data["stations"]))
+        temp_c = data.get("temp_c")
+
+    if stations_arg:
+        stations = parse_stations(stations_arg)
+    if stations is None:
+        raise ValueError("Station coordinates required (in the JSON input or --stations)")
+
+    delays = np.atleast_2d(np.asarray(delays, dtype=float))
+    if delays.shape[1] != len(stations):
+        raise ValueError(
+            f"Delay matrix has {delays.shape[1]} columns but {len(stations)} stations were given"
+        )
+    return stations, delays, temp_c
+
+def solve_chunk(task):
+    """Solve one chunk of events; returns the NDJSON lines for it."""
+    start, delays, stations_xy, lat_ref, lon_ref, speed, refine = task
+    K, M = delays.shape
+
+    # Omit-one subsets only while they still have 3 stations (as in
+    # generate_plot.solve); with 2 the position is underdetermined
+    omit = []
+    if M - 1 >= 3:
+        for m in range(M):
+            keep = [i for i in range(M) if i != m]
+            pos, _ = tdoa.solve_batch(stations_xy[keep], delays[:, keep], speed, reference=0, refine=refine)
+            omit.append(pos)
+    global_xy, cost = tdoa.solve_batch(stations_xy, delays, speed, refine=refine)
+
+    # Whole chunk to GPS at once: (len(omit) + 1, K) latitudes and longitudes
+    lat, lon = geodesy.to_latlon(lat_ref, lon_ref, np.stack(omit + [global_xy]))
+    lat, lon = lat.tolist(), lon.tolist()
+    n_omit = len(omit)
+
+    lines = []
+    for k in range(K):
+        lines.append(json.dumps({
+            "event": start + k,
+            "omit_solutions": [{"lat": lat[m][k], "lon": lon[m][k]} for m in range(n_omit)],
+            "global_solution": {"lat": lat[n_omit][k], "lon": lon[n_omit][k]},
+            "cost": float(cost[k]),
+        }))
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve many TDOA events in one call.")
+    parser.add_argument("--input", default="-", help="events file (default: stdin)")
+    parser.add_argument("--format", choices=["json", "npy", "csv"], help="input format (default: from extension, else json)")
+    parser.add_argument("--stations", help="'lat,lon;lat,lon;...' or JSON list; overrides stations in the input")
+    parser.add_argument("--temp-c", type=float, help="air temperature for the speed of sound")
+    parser.add_argument("--fast", action="store_true", help="closed-form solutions only (no refinement)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="events per worker task")
+    args = parser.parse_args()
+
+    try:
+        stations, delays, temp_c = load_events(args.input, args.format, args.stations)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args.temp_c is not None:
+        temp_c = args.temp_c
+    speed = v if temp_c is None else speed_of_sound_from_temp(float(temp_c))
+
+    lat_ref, lon_ref = stations[0]
+    stations_xy = gps_to_xy(lat_ref, lon_ref, [s[0] for s in stations], [s[1] for s in stations])
+
+    tasks = (
+        (start, delays[start:start + args.chunk], stations_xy, lat_ref, lon_ref, speed, not args.fast)
+        for start in range(0, len(delays), args.chunk)
+    )
+
+    # Chunks are solved in parallel; imap keeps the output in event order
+    with Pool(processes=args.workers) as pool:
+        for block in pool.imap(solve_chunk, tasks):
+            sys.stdout.write(block)
+            sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import wave
+import argparse
+import numpy as np
+
+import gcc_phat
+import wav_merge
+from generate_plot import v, speed_of_sound_from_temp, gps_to_xy, solve
+
+# Estimate arrival-time differences straight from the uploaded recordings
+# with GCC-PHAT and feed them to the solver.
+#
+# Examples:
+#   python3 estimate-delays.py --prefix 2024-05-01-10-30-00 --stations "lat,lon;lat,lon;..."
+#   python3 estimate-delays.py --merged merged_audio/x_combined.wav --stations "..." --start 120 --duration 10
+
+AUDIO_FOLDER = "/home/mshaffer/www/sound-multilateration/vps/backend/services/audio_files"
+LAG_MARGIN = 0.005  # seconds added to each baseline/v bound
+
+def parse_stations(text):
+    return [tuple(float(x) for x in pair.split(",")) for pair in text.split(";") if pair]
+
+def input_sources(args, n_stations):
+    """(path, start seconds, channel) per input, for gcc_phat.wav_gcc_phat."""
+    if args.merged:
+        return [(args.merged, args.start, slice(0, n_stations))]
+
+    files = args.files or [
+        os.path.join(AUDIO_FOLDER, f"{args.prefix}_audio{i}.wav") for i in range(1, n_stations + 1)
+    ]
+    if len(files) != n_stations:
+        raise ValueError(f"Got {len(files)} audio files for {n_stations} stations")
+
+    paths = []
+    for path in files:
+        # Stations may have uploaded FLAC
+        found = wav_merge.station_wav(path)
+        if found is None:
+            raise FileNotFoundError(f"Missing file: {path}")
+        paths.append(found)
+    with wave.open(paths[0], "rb") as w:
+        rate = w.getframerate()
+
+    # Line the stations up on their sidecar start times, as merge_aligned
+    # does: --start counts from the latest first sample, and earlier
+    # recordings skip ahead by their lead. read_start_time applies each
+    # sidecar's GPS clock_offset_s, so both paths share one time base.
+    # Without sidecars the files are taken to start together.
+    start_times = [wav_merge.read_start_time(p) for p in paths]
+    if wav_merge.mixed_clocks(paths):
+        print("Warning: only some stations recorded a GPS clock offset", file=sys.stderr)
+    if all(t is not None for t in start_times):
+        offsets, _ = wav_merge.alignment_offsets(start_times, rate, mode="crop")
+    else:
+        offsets = [0] * len(paths)
+
+    return [(path, args.start + offset / rate, 0) for path, offset in zip(paths, offsets)]
+
+def main():
+    parser = argparse.ArgumentParser(description="GCC-PHAT delays from station audio, then solve.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--prefix", help="recording prefix in AUDIO_FOLDER (<prefix>_audioN.wav)")
+    source.add_argument("--files", nargs="+", help="per-station WAV files, in station order")
+    source.add_argument("--merged", help="merged multi-channel WAV (one channel per station)")
+    parser.add_argument("--stations", required=True, help="'lat,lon;lat,lon;...' in channel order")
+    parser.add_argument("--start", type=float, default=0.0, help="window start (s)")
+    parser.add_argument("--duration", type=float, help="window length (s, default: to end of file)")
+    parser.add_argument("--temp-c", type=float, help="air temperature for the speed of sound")
+    args = parser.parse_args()
+
+    try:
+        stations = parse_stations(args.stations)
+        speed = v if args.temp_c is None else speed_of_sound_from_temp(args.temp_c)
+
+        # Physical lag bound per pair: baseline / speed of sound
+        lat_ref, lon_ref = stations[0]
+        xy = gps_to_xy(lat_ref, lon_ref, [s[0] for s in stations], [s[1] for s in stations])
+        baselines = np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=2)
+        max_lags = baselines / speed + LAG_MARGIN
+
+        sources = input_sources(args, len(stations))
+        pairs, delays, peaks = gcc_phat.wav_gcc_phat(sources, max_lags, args.duration)
+        times = gcc_phat.station_delays(pairs, delays, peaks, len(stations))
+
+        result = solve(
+            [s[0] for s in stations], [s[1] for s in stations], times.tolist(), temp_c=args.temp_c
+        )
+        result["delays"] = {
+            "times": times.tolist(),
+            "pairs": [
+                {"pair": [i, j], "delay": float(d), "peak": float(p)}
+                for (i, j), d, p in zip(pairs, delays, peaks)
+            ],
+        }
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import wave
+import numpy as np
+
+# FFT-based generalized cross-correlation with phase transform (GCC-PHAT).
+# Cross-power spectra are accumulated block by block over the analysis
+# window. wav_gcc_phat reads those blocks straight from the WAV files, so
+# memory depends on the FFT size (set by the maximum lag), not on the
+# length of the window.
+
+def decode(raw, width, nch):
+    """PCM frames as a float32 (frames, nch) array."""
+    if width == 1:
+        # 8-bit WAV is unsigned, centered on 128
+        data = np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32)
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported sample width {width}")
+    return data.reshape(-1, nch)
+
+def parabolic_peak(cc, k):
+    """Sub-sample offset of the peak at index k from a parabola through k-1, k, k+1."""
+    if k <= 0 or k >= len(cc) - 1:
+        return 0.0
+    a, b, c = cc[k - 1], cc[k], cc[k + 1]
+    denom = a - 2.0 * b + c
+    if denom == 0.0:
+        return 0.0
+    return 0.5 * (a - c) / denom
+
+def fft_sizes(max_lags, rate, n, block=None):
+    """(max_lag in samples, block, nfft) for an n-sample window."""
+    max_lag = int(np.ceil(np.max(max_lags) * rate))
+    if block is None:
+        block = max(4 * max_lag, 1 << 14)
+    block = max(min(block, n), 1)
+    nfft = 1 << int(np.ceil(np.log2(block + max_lag + 1)))
+    return max_lag, block, nfft
+
+def gcc_phat_blocks(blocks, n_channels, rate, max_lags, max_lag, block, nfft):
+    """
+    GCC-PHAT delays from an iterable of (block, n_channels) windows,
+    averaging their cross-power spectra. See pairwise_gcc_phat.
+    """
+    pairs = [(i, j) for i in range(n_channels) for j in range(i + 1, n_channels)]
+    I = np.array([p[0] for p in pairs])
+    J = np.array([p[1] for p in pairs])
+    R = np.zeros((len(pairs), nfft // 2 + 1), dtype=np.complex128)
+
+    window = np.hanning(block).astype(np.float32)
+    for seg in blocks:
+        seg = seg - seg.mean(axis=0)
+        X = np.fft.rfft(seg * window[:, None], n=nfft, axis=0).T
+        R += X[I] * np.conj(X[J])
+
+    R /= np.maximum(np.abs(R), 1e-12)
+    cc = np.fft.irfft(R, n=nfft, axis=1)
+    # Lags -max_lag..+max_lag, centered
+    cc = np.concatenate([cc[:, -max_lag:], cc[:, :max_lag + 1]], axis=1)
+
+    delays = np.empty(len(pairs))
+    peaks = np.empty(len(pairs))
+    for k, (i, j) in enumerate(pairs):
+        bound = int(np.ceil(max_lags[i, j] * rate))
+        lo, hi = max_lag - bound, max_lag + bound + 1
+        k_peak = lo + int(np.argmax(cc[k, lo:hi]))
+        offset = parabolic_peak(cc[k], k_peak)
+        delays[k] = (k_peak - max_lag + offset) / rate
+        peaks[k] = cc[k, k_peak]
+    return pairs, delays, peaks
+
+def pairwise_gcc_phat(channels, rate, max_lags, block=None):
+    """
+    GCC-PHAT delay for every channel pair of samples already in memory.
+
+    channels: (n, N) samples, one column per station
+    max_lags: (N, N) maximum |delay| in seconds per pair (e.g. baseline / v)
+    Returns (pairs, delays, peaks): pairs is a list of (i, j), delays[k] is
+    t_i - t_j in seconds (positive: sound reached i later) and peaks[k] the
+    normalized correlation peak, usable as a confidence weight.
+    """
+    n, N = channels.shape
+    max_lag, block, nfft = fft_sizes(max_lags, rate, n, block)
+    # Half-overlapping blocks
+    hop = max(block // 2, 1)
+    blocks = (channels[s:s + block] for s in range(0, max(n - block, 0) + 1, hop))
+    return gcc_phat_blocks(blocks, N, rate, max_lags, max_lag, block, nfft)
+
+def wav_gcc_phat(sources, max_lags, duration=None, block=None):
+    """
+    pairwise_gcc_phat over WAV files, read one hop at a time.
+
+    sources: (path, start seconds, channel) per input, where channel is an
+    int or a slice of the file's channels; their columns, in order, are the
+    stations of max_lags. The window runs from each input's start for
+    duration seconds, or until the shortest input ends.
+    """
+    readers = [wave.open(path, "rb") for path, _, _ in sources]
+    try:
+        rates = {r.getframerate() for r in readers}
+        if len(rates) != 1:
+            raise ValueError(f"Sample rates differ between inputs: {sorted(rates)}")
+        rate = rates.pop()
+
+        n = None
+        for r, (_, start, _) in zip(readers, sources):
+            first = min(int(round(start * rate)), r.getnframes())
+            r.setpos(first)
+            left = r.getnframes() - first
+            n = left if n is None else min(n, left)
+        if duration is not None:
+            n = min(n, int(round(duration * rate)))
+
+        # Column indices each input contributes
+        columns = [
+            np.arange(r.getnchannels())[channel].reshape(-1)
+            for r, (_, _, channel) in zip(readers, sources)
+        ]
+        N = sum(len(c) for c in columns)
+        if N != len(max_lags):
+            raise ValueError(f"Inputs have {N} channels for {len(max_lags)} stations")
+        if n == 0:
+            raise ValueError("No audio in the requested window")
+
+        max_lag, block, nfft = fft_sizes(max_lags, rate, n, block)
+        hop = max(block // 2, 1)
+
+        def read(count):
+            return np.concatenate([
+                decode(r.readframes(count), r.getsampwidth(), r.getnchannels())[:, c]
+                for r, c in zip(readers, columns)
+            ], axis=1)
+
+        def blocks():
+            # Only the current block and the next hop are held in memory
+            buf = read(block)
+            used = block
+            yield buf
+            while used + hop <= n:
+                buf = np.concatenate([buf[hop:], read(hop)])
+                used += hop
+                yield buf
+
+        return gcc_phat_blocks(blocks(), N, rate, max_lags, max_lag, block, nfft)
+    finally:
+        for r in readers:
+            r.close()
+
+def station_delays(pairs, delays, peaks, n_stations):
+    """
+    Arrival times relative to station 0 from all pairwise delays, as the
+    peak-weighted least-squares solution of t_i - t_j = delay_ij.
+    """
+    A = np.zeros((len(pairs), n_stations - 1))
+    for k, (i, j) in enumerate(pairs):
+        if i > 0:
+            A[k, i - 1] += 1.0
+        if j > 0:
+            A[k, j - 1] -= 1.0
+    w = np.sqrt(np.clip(peaks, 1e-6, None))
+    t, *_ = np.linalg.lstsq(A * w[:, None], delays * w, rcond=None)
+    return np.concatenate([[0.0], t])
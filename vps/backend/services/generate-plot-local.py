@@ -1,80 +1,58 @@
+import os
 import sys
 import numpy as np
-from scipy.optimize import least_squares
+import matplotlib
+matplotlib.use("Agg")  # headless; no GUI backend lookup
 import matplotlib.pyplot as plt
 import math
 import base64
+import hashlib
+from collections import OrderedDict
 from io import BytesIO
 import json
+import tdoa
+import geodesy
 
 # This version of program creates the plot without using any external mapping service
 # It works very well but doesn't have a map background. It can serve as a good backup if the map service isn't available.
+#
+# Usage:
+#   python3 generate-plot-local.py lat1 lon1 ... lat4 lon4 tA tB tC tD [--preview]
+#   python3 generate-plot-local.py --serve     (one JSON request per line on stdin)
 
 v = 343.0  # speed of sound m/s
 
 GRID_CENTER_X = 1500
 GRID_CENTER_Y = 1500
 
-def gps_to_xy(lat_ref, lon_ref, lat, lon):
-    meters_per_deg_lat = 111320
-    meters_per_deg_lon = 111320 * math.cos(math.radians(lat_ref))
-    x = (lon - lon_ref) * meters_per_deg_lon
-    y = (lat - lat_ref) * meters_per_deg_lat
-    return np.array([x, y])
-
-# Require 12 args: lat1 lon1 ... lat4 lon4 tA tB tC tD
-if len(sys.argv) != 13:
-    sys.exit(1)
-
-# Extract GPS coordinates
-lats = [float(sys.argv[i]) for i in [1,3,5,7]]
-lons = [float(sys.argv[i]) for i in [2,4,6,8]]
-
-# Convert GPS to XY
-stations_xy = [gps_to_xy(lats[0], lons[0], lats[i], lons[i]) for i in range(4)]
-
-# Extract delays
-delays = np.array([float(sys.argv[i]) for i in range(9,13)])
-delays = delays - delays[0]
-
-def tdoa_residuals(pos, stations, delays):
-    d = [np.linalg.norm(pos - s) for s in stations]
-    d0 = d[0]
-    return [(d[i] - d0) - v * delays[i] for i in range(3)]
-
-def tdoa_residuals_global(pos, stations, delays):
-    res = []
-    for i in range(len(stations)):
-        for j in range(i+1, len(stations)):
-            Di = np.linalg.norm(pos - stations[i])
-            Dj = np.linalg.norm(pos - stations[j])
-            res.append((Di - Dj) - v * (delays[i] - delays[j]))
-    return res
-
-cases = [(1,2,3),(0,2,3),(0,1,3),(0,1,2)]
-def solve_3station_tdoa(station_ids, delays):
-    st = [stations_xy[i] for i in station_ids]
-    dl = [delays[i] for i in station_ids]
-    guess = np.mean(st, axis=0)
-    sol = least_squares(tdoa_residuals, guess, args=(st, dl))
-    return sol.x
-
-omit_one_solutions = [solve_3station_tdoa(case, delays) for case in cases]
-
-guess_global = np.mean(stations_xy, axis=0)
-global_solution = least_squares(
-    tdoa_residuals_global,
-    guess_global,
-    args=(stations_xy, delays)
-).x
-
-def plot_hyperbolas(delays, solutions, global_solution):
-    S = stations_xy
-    dd = {}
-    for i in range(4):
-        for j in range(i+1,4):
-            dd[(i,j)] = v * (delays[i] - delays[j])
-
+# Raster settings: full quality and fast preview
+GRID_N = 800
+GRID_N_PREVIEW = 250
+DPI = 150
+DPI_PREVIEW = 60
+
+# Bounds are snapped outward to this step (meters) so nearby events reuse
+# the same cached distance fields
+GRID_SNAP = 100.0
+
+# Distance-field cache: in memory (for --serve) and on disk (across runs).
+# A full-resolution entry is M x 800 x 800 float32, about 2.5 MB per station.
+FIELD_CACHE_SIZE = int(os.environ.get("PLOT_FIELD_CACHE_SIZE", 8))            # entries in memory
+FIELD_CACHE_DISK_BYTES = int(os.environ.get("PLOT_FIELD_CACHE_BYTES", 200 << 20))  # disk cap
+FIELD_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plot_cache")
+
+_field_cache = OrderedDict()
+_figure = None
+
+def solve_event(stations_xy, delays):
+    """Omit-one solutions and the global solution for one event."""
+    n = len(stations_xy)
+    cases = [[i for i in range(n) if i != k] for k in range(n)]
+    omit_one_solutions = [tdoa.solve(stations_xy[c], delays[c], v, reference=0) for c in cases]
+    global_solution = tdoa.solve(stations_xy, delays, v)
+    return omit_one_solutions, global_solution
+
+def plot_bounds(S, solutions, global_solution):
     # Collect all relevant points (stations + solutions)
     all_x = [s[0] for s in S] + [sol[0] for sol in solutions] + [global_solution[0]]
     all_y = [s[1] for s in S] + [sol[1] for sol in solutions] + [global_solution[1]]
@@ -103,23 +81,97 @@ def plot_hyperbolas(delays, solutions, global_solution):
     if dy < 50:
         ymin, ymax = min_y - 100, max_y + 100
 
-    # Generate grid using dynamic bounds
-    N = 800
-    xs = np.linspace(xmin, xmax, N)
-    ys = np.linspace(ymin, ymax, N)
-    X, Y = np.meshgrid(xs, ys)
+    # Snap outward so the cache key is stable between similar events
+    return (
+        math.floor(xmin / GRID_SNAP) * GRID_SNAP,
+        math.ceil(xmax / GRID_SNAP) * GRID_SNAP,
+        math.floor(ymin / GRID_SNAP) * GRID_SNAP,
+        math.ceil(ymax / GRID_SNAP) * GRID_SNAP,
+    )
+
+def prune_disk_cache(limit=FIELD_CACHE_DISK_BYTES):
+    """Delete the least recently used .npy fields until the cache fits in limit bytes."""
+    entries = []
+    for name in os.listdir(FIELD_CACHE_DIR):
+        if name.endswith(".npy"):
+            st = os.stat(os.path.join(FIELD_CACHE_DIR, name))
+            entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(os.path.join(FIELD_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            pass
+
+def distance_fields(S, bounds, N):
+    """
+    float32 distance from every grid cell to every station, shape (M, N, N),
+    plus the grid axes. Cached by station geometry, bounds and resolution.
+    """
+    xmin, xmax, ymin, ymax = bounds
+    xs = np.linspace(xmin, xmax, N, dtype=np.float32)
+    ys = np.linspace(ymin, ymax, N, dtype=np.float32)
+
+    key_src = json.dumps([np.round(S, 2).tolist(), list(bounds), N])
+    key = hashlib.sha1(key_src.encode()).hexdigest()
+
+    if key in _field_cache:
+        _field_cache.move_to_end(key)
+        return xs, ys, _field_cache[key]
+
+    path = os.path.join(FIELD_CACHE_DIR, f"{key}.npy")
+    try:
+        fields = np.load(path)
+        os.utime(path)  # mtime is the recency used by prune_disk_cache
+    except (OSError, ValueError):
+        S32 = np.asarray(S, dtype=np.float32)
+        dx = xs[None, None, :] - S32[:, 0, None, None]
+        dy = ys[None, :, None] - S32[:, 1, None, None]
+        fields = np.sqrt(dx * dx + dy * dy)
+        try:
+            os.makedirs(FIELD_CACHE_DIR, exist_ok=True)
+            np.save(path, fields)
+            prune_disk_cache()
+        except OSError:
+            pass  # cache is best effort
+
+    _field_cache[key] = fields
+    if len(_field_cache) > FIELD_CACHE_SIZE:
+        _field_cache.popitem(last=False)
+    return xs, ys, fields
+
+def get_axes():
+    """One Agg figure, created once and cleared between plots."""
+    global _figure
+    if _figure is None:
+        _figure = plt.figure(figsize=(9, 9))
+        _figure.add_subplot(111)
+    ax = _figure.axes[0]
+    ax.clear()
+    return _figure, ax
+
+def plot_hyperbolas(S, delays, solutions, global_solution, preview=False):
+    n = len(S)
+    dd = {}
+    for i in range(n):
+        for j in range(i+1, n):
+            dd[(i,j)] = v * (delays[i] - delays[j])
 
+    # Each station's distance field is computed once and shared by its pairs
+    N = GRID_N_PREVIEW if preview else GRID_N
+    bounds = plot_bounds(S, solutions, global_solution)
+    xs, ys, D = distance_fields(S, bounds, N)
 
-    fig, ax = plt.subplots(figsize=(9,9))
+    fig, ax = get_axes()
     colors = ['red','blue','green','orange','purple','brown']
 
     # Draw hyperbolas
     for idx, ((i,j), dd_ij) in enumerate(dd.items()):
-        Si, Sj = S[i], S[j]
-        Di = np.sqrt((X - Si[0])**2 + (Y - Si[1])**2)
-        Dj = np.sqrt((X - Sj[0])**2 + (Y - Sj[1])**2)
-        H = (Di - Dj) - dd_ij
-        ax.contour(X, Y, H, levels=[0], colors=colors[idx % len(colors)], linewidths=1.1)
+        H = D[i] - D[j] - np.float32(dd_ij)
+        ax.contour(xs, ys, H, levels=[0], colors=colors[idx % len(colors)], linewidths=1.1)
 
     # Stations
     for i, s in enumerate(S):
@@ -139,18 +191,65 @@ def plot_hyperbolas(delays, solutions, global_solution):
 
     # Convert to base64
     buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-    buf.seek(0)
-    encoded = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    return encoded
-
-# Generate base64 plot
-img_b64 = plot_hyperbolas(delays, omit_one_solutions, global_solution)
-
-# Output ONLY JSON
-print(json.dumps({
-    "image": img_b64,
-    "solutions": [s.tolist() for s in omit_one_solutions],
-    "global_solution": global_solution.tolist()
-}))
+    fig.savefig(buf, format='png', dpi=DPI_PREVIEW if preview else DPI, bbox_inches='tight')
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def render(lats, lons, times, preview=False):
+    lats = [float(x) for x in lats]
+    lons = [float(x) for x in lons]
+
+    # Convert GPS to XY
+    stations_xy = geodesy.to_xy(lats[0], lons[0], lats, lons)
+
+    # Extract delays
+    delays = np.array([float(t) for t in times])
+    delays = delays - delays[0]
+
+    omit_one_solutions, global_solution = solve_event(stations_xy, delays)
+
+    # Generate base64 plot
+    img_b64 = plot_hyperbolas(stations_xy, delays, omit_one_solutions, global_solution, preview)
+
+    return {
+        "image": img_b64,
+        "solutions": [s.tolist() for s in omit_one_solutions],
+        "global_solution": global_solution.tolist()
+    }
+
+def serve():
+    """Render one JSON request per stdin line, reusing the figure and field cache."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        req_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            req_id = request.get("id")
+            result = render(**request["params"])
+        except Exception as e:
+            result = {"error": str(e)}
+        sys.stdout.write(json.dumps({"id": req_id, "result": result}) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args == ["--serve"]:
+        serve()
+        sys.exit(0)
+
+    preview = "--preview" in args
+    args = [a for a in args if a != "--preview"]
+
+    # Require 12 args: lat1 lon1 ... lat4 lon4 tA tB tC tD
+    if len(args) != 12:
+        sys.exit(1)
+
+    # Output ONLY JSON
+    print(json.dumps(render(
+        lats=[args[i] for i in [0, 2, 4, 6]],
+        lons=[args[i] for i in [1, 3, 5, 7]],
+        times=args[8:12],
+        preview=preview,
+    )))
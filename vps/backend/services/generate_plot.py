@@ -1,13 +1,39 @@
 #!/usr/bin/env python3
 import sys
 import numpy as np
-from scipy.optimize import least_squares, brentq
 import math
 import json
+import inspect
+import tdoa
+import geodesy
+import polyline
+import propagation
+import uncertainty
+import solution_cache
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 # Default speed of sound (used if no temperature is provided)
 v = 343.0  # m/s
 
+# Worker processes used by --serve mode
+SERVE_WORKERS = 2
+
+# Cap on omit-k subsets solved per request (sampled beyond this)
+MAX_SUBSETS = 64
+
+# Robust mode: stations whose implied emission time disagrees by more than
+# this (meters of range) with the consensus are rejected
+ROBUST_THRESHOLD_M = 5.0
+
+# Hyperbola encodings: plain JSON [lat, lon] lists, Google encoded
+# polylines or base64 packed int32 deltas (see polyline.py)
+ENCODINGS = ("json", "polyline", "binary")
+DEFAULT_PRECISION = 6  # decimal places of a degree for the encoded formats (~0.1 m)
+
+# Monte Carlo points returned to the client (the statistics use all samples)
+MC_POINTS_OUT = 500
+
 def speed_of_sound_from_temp(temp_c):
     """
     Approximate speed of sound in dry air at sea level as a function of temperature.
@@ -16,91 +42,192 @@ def speed_of_sound_from_temp(temp_c):
     return 331.3 + 0.606 * temp_c   # <<< NEW
 
 def gps_to_xy(lat_ref, lon_ref, lat, lon):
-    meters_per_deg_lat = 111320
-    meters_per_deg_lon = 111320 * math.cos(math.radians(lat_ref))
-    x = (lon - lon_ref) * meters_per_deg_lon
-    y = (lat - lat_ref) * meters_per_deg_lat
-    return np.array([x, y])
+    """East/north meters from the reference point; lat/lon may be arrays (see geodesy)."""
+    return geodesy.to_xy(lat_ref, lon_ref, lat, lon)
 
 def xy_to_gps(lat_ref, lon_ref, x, y):
-    meters_per_deg_lat = 111320
-    meters_per_deg_lon = 111320 * math.cos(math.radians(lat_ref))
-    lat = lat_ref + y / meters_per_deg_lat
-    lon = lon_ref + x / meters_per_deg_lon
+    lat, lon = geodesy.to_latlon(lat_ref, lon_ref, (x, y))
     return float(lat), float(lon)
 
-# Residuals for 3-station solve
-def tdoa_residuals(pos, stations, delays):
-    d = [np.linalg.norm(pos - s) for s in stations]
-    d0 = d[0]
-    return [(d[i] - d0) - v * delays[i] for i in range(len(stations))]
-
-# Residuals for global 4-station solve
-def tdoa_residuals_global(pos, stations, delays):
-    res = []
-    for i in range(len(stations)):
-        for j in range(i+1, len(stations)):
-            Di = np.linalg.norm(pos - stations[i])
-            Dj = np.linalg.norm(pos - stations[j])
-            res.append((Di - Dj) - v * (delays[i] - delays[j]))
-    return res
-
-# Hyperbola computation using root-finding
-def hyperbola_points(Si, Sj, dd, x_range, y_min, y_max):
-    points = []
-    for x in x_range:
-        def f(y):
-            return math.dist((x, y), Si) - math.dist((x, y), Sj) - dd
-        try:
-            y = brentq(f, y_min, y_max)
-            points.append((x, y))
-        except ValueError:
-            # No root in this y-interval for this x
-            continue
-    return points
-
-try:
-    # Now allow: 
-    #  - 12 arguments (no temperature): keep v = 343
-    #  - 13 arguments: last one is temp_C used to compute v
-    if len(sys.argv) not in (13, 14):  # <<< CHANGED
+def xy_to_gps_points(lat_ref, lon_ref, xy):
+    """(N, 2) XY -> [[lat, lon], ...] in one array conversion."""
+    lat, lon = geodesy.to_latlon(lat_ref, lon_ref, np.reshape(xy, (-1, 2)))
+    return np.stack([lat, lon], axis=-1).tolist()
+
+# Points sampled along each hyperbola branch
+HYPERBOLA_POINTS = 400
+
+def hyperbola_segments(Si, Sj, dd, xmin, xmax, ymin, ymax, n=HYPERBOLA_POINTS):
+    """
+    Closed-form TDOA hyperbola |P-Si| - |P-Sj| = dd, clipped to the box.
+
+    The branch is parameterized in the pair's rotated frame as
+    u = ±a*cosh(t), w = b*sinh(t) (u along Si->Sj, origin at the midpoint),
+    so both arms come out in one ordered sweep. Uniform steps in t put the
+    points densest at the vertex and sparse along the asymptotes.
+    Returns a list of (k, 2) XY arrays, one per run inside the box.
+    """
+    Si = np.asarray(Si, dtype=float)
+    Sj = np.asarray(Sj, dtype=float)
+    center = (Si + Sj) / 2.0
+    axis = Sj - Si
+    f = np.linalg.norm(axis) / 2.0  # focal half-distance
+    a = abs(dd) / 2.0
+    if f == 0.0 or a >= f:
+        # Range difference longer than the baseline: no real hyperbola
+        return []
+    e_u = axis / (2.0 * f)
+    e_w = np.array([-e_u[1], e_u[0]])
+    b = math.sqrt(f * f - a * a)
+
+    # Sweep far enough that both arms leave the box
+    corners = np.array([[xmin, ymin], [xmin, ymax], [xmax, ymin], [xmax, ymax]])
+    R = np.max(np.linalg.norm(corners - center, axis=1))
+
+    if a == 0.0:
+        # Equal delays: the perpendicular bisector
+        u = np.zeros(n)
+        w = np.linspace(-R, R, n)
+    else:
+        T = math.asinh(math.sqrt(max(R * R - a * a, 0.0)) / f)
+        t = np.linspace(-T, T, n)
+        # Positive dd means closer to Sj, i.e. the branch on the +u side
+        u = math.copysign(a, dd) * np.cosh(t)
+        w = b * np.sinh(t)
+
+    pts = center + np.outer(u, e_u) + np.outer(w, e_w)
+    inside = (
+        (pts[:, 0] >= xmin) & (pts[:, 0] <= xmax) &
+        (pts[:, 1] >= ymin) & (pts[:, 1] <= ymax)
+    )
+
+    # Split into contiguous runs inside the box
+    edges = np.flatnonzero(np.diff(inside.astype(np.int8))) + 1
+    runs = np.split(np.arange(n), edges)
+    return [pts[r] for r in runs if inside[r[0]] and len(r) > 1]
+
+def parse_argv(argv):
+    """
+    Turn the positional CLI arguments into solve() parameters.
+
+    Allows:
+     - 12 arguments (no temperature): keep v = 343
+     - 13 arguments: last one is temp_C used to compute v
+    """
+    if len(argv) not in (12, 13):  # <<< CHANGED
         raise ValueError(
             "Expected 12 arguments (no temp) or 13 arguments (with temp_C)"
         )
 
+    return {
+        "lats": [float(argv[i]) for i in [0, 2, 4, 6]],
+        "lons": [float(argv[i]) for i in [1, 3, 5, 7]],
+        "times": [float(argv[i]) for i in range(8, 12)],
+        "temp_c": float(argv[12]) if len(argv) == 13 else None,
+    }
+
+def solve(lats, lons, times, temp_c=None, fast=False, omit=1, max_subsets=MAX_SUBSETS, pairs="all",
+          sigma_t=None, sigma_pos=0.0, monte_carlo=0, confidence=0.95, gdop=False,
+          robust=False, robust_threshold=ROBUST_THRESHOLD_M,
+          encoding="json", precision=None, tolerance_m=0.0, weather=None):
+    """
+    Locate the source for one event and return the JSON-ready result
+    (stations, omit-k solutions, global solution and hyperbolas).
+
+    Any number of stations (>= 3) is accepted. omit=k solves every subset
+    that leaves out k stations (sampled down to max_subsets). pairs="all"
+    uses every station pair in the global solve (O(N^2) residuals),
+    pairs="reference" only pairs against station 1 (O(N)).
+    fast=True skips the least-squares refinement and uses the closed-form
+    estimates directly.
+
+    Uncertainty mode (sigma_t in seconds and/or sigma_pos in meters) adds
+    the covariance and confidence ellipse of the global solution, plus a
+    cloud of monte_carlo perturbed re-solves when monte_carlo > 0.
+    gdop=True adds a GDOP map of the station layout.
+
+    robust=True picks the global solution by consensus across the omit-one
+    subsets, drops stations that disagree by more than robust_threshold
+    meters and refits with a soft-L1 loss; the rejected stations and every
+    pair residual are reported under "robust".
+
+    encoding selects how hyperbola segments are sent: "json" lists of
+    [lat, lon] (rounded to precision decimals when given), "polyline"
+    encoded strings or "binary" base64 int32 deltas, both quantized to
+    precision decimals (default DEFAULT_PRECISION). tolerance_m > 0
+    simplifies the curves (Douglas-Peucker) before encoding.
+
+    weather is an optional per-station list of {"temp_c", "humidity_pct",
+    "wind_mps": [east, north]} (None for stations without readings). The
+    solves then use a per-path sound speed from that weather (see
+    propagation.py), with temp_c as the fallback temperature.
+    """
     # If temperature provided, compute v from it
-    if len(sys.argv) == 14:  # <<< NEW
-        temp_c = float(sys.argv[13])
-        v = speed_of_sound_from_temp(temp_c)
+    speed = v if temp_c is None else speed_of_sound_from_temp(float(temp_c))
 
     # Parse GPS
-    lats = [float(sys.argv[i]) for i in [1, 3, 5, 7]]
-    lons = [float(sys.argv[i]) for i in [2, 4, 6, 8]]
+    lats = [float(lat) for lat in lats]
+    lons = [float(lon) for lon in lons]
+    n = len(lats)
+    if n < 3 or len(lons) != n or len(times) != n:
+        raise ValueError("Need matching lats, lons and times for at least 3 stations")
+    if pairs not in ("all", "reference"):
+        raise ValueError('pairs must be "all" or "reference"')
+    if encoding not in ENCODINGS:
+        raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+    reference = 0 if pairs == "reference" else None
+
     lat_ref, lon_ref = lats[0], lons[0]
-    stations_xy = [gps_to_xy(lat_ref, lon_ref, lats[i], lons[i]) for i in range(4)]
+    stations_xy = gps_to_xy(lat_ref, lon_ref, np.array(lats), np.array(lons))
 
     # Parse times
-    delays = np.array([float(sys.argv[i]) for i in range(9, 13)])
+    delays = np.array([float(t) for t in times])
     delays = delays - delays[0]  # make relative to first station
 
-    # Solve omit-one 3-station cases with proper delay referencing
-    cases = [(1, 2, 3), (0, 2, 3), (0, 1, 3), (0, 1, 2)]
+    # Solve the omit-k subsets together in one batched solve; each subset
+    # is referenced to its own first station
+    # Weather-aware mode swaps in the per-path speed solvers; the speed
+    # field is cached per weather snapshot
+    fld = None
+    if weather and any(weather):
+        fld = propagation.field(propagation.snapshot(stations_xy, weather, temp_c))
 
-    def solve_3station(st_ids):
-        st = [stations_xy[i] for i in st_ids]
-        # Make delays relative to first station in subset
-        dl_subset = np.array([delays[i] - delays[st_ids[0]] for i in st_ids])
-        guess = np.mean(st, axis=0)
-        sol = least_squares(tdoa_residuals, guess, args=(st, dl_subset))
-        return sol.x
+    omit = int(omit)
+    cases = tdoa.omit_subsets(n, omit, max_subsets) if n - omit >= 3 else []
+    if cases and fld is not None:
+        omit_solutions_xy, _ = propagation.solve_batch(
+            fld, stations_xy[cases], delays[cases], speed, reference=0, refine=not fast
+        )
+    elif cases:
+        omit_solutions_xy, _ = tdoa.solve_batch(
+            stations_xy[cases], delays[cases], speed, reference=0, refine=not fast
+        )
+    else:
+        omit_solutions_xy = np.empty((0, 2))
 
-    omit_solutions_xy = [solve_3station(case) for case in cases]
+    # Solve global N-station least-squares
+    if robust:
+        global_solution_xy, inliers = tdoa.robust_solve(
+            stations_xy, delays, speed, float(robust_threshold), reference=reference,
+            candidates=omit_solutions_xy if omit == 1 and cases else None, refine=not fast
+        )
+        if fld is not None:
+            global_solution_xy, _ = propagation.solve(
+                fld, stations_xy[inliers], delays[inliers], speed,
+                reference=tdoa.subset_reference(inliers, reference), guess=global_solution_xy,
+                refine=not fast
+            )
+    elif fld is not None:
+        global_solution_xy, _ = propagation.solve(
+            fld, stations_xy, delays, speed, reference=reference, refine=not fast
+        )
+    else:
+        global_solution_xy = tdoa.solve(stations_xy, delays, speed, reference=reference, refine=not fast)
 
-    # Solve global 4-station least-squares
-    guess_global = np.mean(stations_xy, axis=0)
-    global_solution_xy = least_squares(
-        tdoa_residuals_global, guess_global, args=(stations_xy, delays)
-    ).x
+    # Speed along each station's path from the solution
+    path_speed = np.full(n, speed)
+    if fld is not None:
+        path_speed = propagation.path_speeds(fld, global_solution_xy, stations_xy)[0]
 
     # -------------------------------
     # Dynamic bounding box (key fix)
@@ -135,47 +262,218 @@ try:
     ymin = max(ymin, -MAX_EXTENT)
     ymax = min(ymax,  MAX_EXTENT)
 
-    # Use this dynamic box for hyperbola search
-    x_range = np.linspace(xmin, xmax, 400)
-    y_min, y_max = ymin, ymax
+    # Hyperbolas (one per pair used by the global solve); with per-path
+    # speeds each is drawn at the mean speed of its two paths
+    pair_list = [(int(i), int(j)) for i, j in zip(*tdoa.pair_indices(n, reference))]
+    segments_xy = [
+        hyperbola_segments(
+            stations_xy[i], stations_xy[j], 0.5 * (path_speed[i] + path_speed[j]) * (delays[i] - delays[j]),
+            xmin, xmax, ymin, ymax
+        )
+        for i, j in pair_list
+    ]
+    if tolerance_m and float(tolerance_m) > 0.0:
+        segments_xy = [[polyline.simplify(seg, float(tolerance_m)) for seg in segs] for segs in segments_xy]
+
+    # Convert every hyperbola point to GPS in one go, then split it back
+    # into segments
+    runs = [seg for segs in segments_xy for seg in segs]
+    flat_gps = np.empty((0, 2))
+    if runs:
+        flat_lat, flat_lon = geodesy.to_latlon(lat_ref, lon_ref, np.concatenate(runs))
+        flat_gps = np.stack([flat_lat, flat_lon], axis=-1)
+    if encoding != "json" and precision is None:
+        precision = DEFAULT_PRECISION
+    if encoding == "json":
+        if precision is not None:
+            flat_gps = np.round(flat_gps, int(precision))
+        flat_gps = flat_gps.tolist()
 
-    # Hyperbolas
     hyperbolas = []
-    for i in range(4):
-        for j in range(i + 1, 4):
-            Si = stations_xy[i]
-            Sj = stations_xy[j]
-            dd = v * (delays[i] - delays[j])
-            points_xy = hyperbola_points(Si, Sj, dd, x_range, y_min, y_max)
-            # Convert to GPS
-            points_gps = [xy_to_gps(lat_ref, lon_ref, x, y) for x, y in points_xy]
-            hyperbolas.append({"pair": [i, j], "points": points_gps})
+    pos = 0
+    for (i, j), segs in zip(pair_list, segments_xy):
+        segments_gps = []
+        for seg in segs:
+            seg_gps = flat_gps[pos:pos + len(seg)]
+            pos += len(seg)
+            if encoding == "polyline":
+                seg_gps = polyline.encode(seg_gps, int(precision))
+            elif encoding == "binary":
+                seg_gps = polyline.pack(seg_gps, int(precision))
+            segments_gps.append(seg_gps)
+        hyperbola = {"pair": [i, j], "segments": segments_gps}
+        if encoding == "json":
+            hyperbola["points"] = [p for seg in segments_gps for p in seg]
+        hyperbolas.append(hyperbola)
 
     # Convert stations & solutions to GPS
-    stations_gps = [{"lat": lats[i], "lon": lons[i]} for i in range(4)]
+    stations_gps = [{"lat": lats[i], "lon": lons[i]} for i in range(n)]
     omit_gps = [
-        {
-            "lat": xy_to_gps(lat_ref, lon_ref, p[0], p[1])[0],
-            "lon": xy_to_gps(lat_ref, lon_ref, p[0], p[1])[1],
-        }
-        for p in omit_solutions_xy
+        {"lat": lat, "lon": lon, "omitted": [i for i in range(n) if i not in case]}
+        for case, (lat, lon) in zip(cases, xy_to_gps_points(lat_ref, lon_ref, omit_solutions_xy))
     ]
-    global_gps = {
-        "lat": xy_to_gps(lat_ref, lon_ref, global_solution_xy[0], global_solution_xy[1])[0],
-        "lon": xy_to_gps(lat_ref, lon_ref, global_solution_xy[0], global_solution_xy[1])[1],
-    }
+    lat, lon = xy_to_gps(lat_ref, lon_ref, global_solution_xy[0], global_solution_xy[1])
+    global_gps = {"lat": lat, "lon": lon}
 
     # Output JSON (you could also include temp_c and v here if you want)
-    print(
-        json.dumps(
-            {
-                "stations": stations_gps,
-                "omit_solutions": omit_gps,
-                "global_solution": global_gps,
-                "hyperbolas": hyperbolas,
+    result = {
+        "stations": stations_gps,
+        "omit_solutions": omit_gps,
+        "global_solution": global_gps,
+        "hyperbolas": hyperbolas,
+    }
+    if encoding != "json":
+        result["encoding"] = {"format": encoding, "precision": int(precision)}
+
+    if fld is not None:
+        _, temps, humidity, wind = propagation.snapshot(stations_xy, weather, temp_c)
+        result["propagation"] = {
+            "reference_speed": speed,
+            "path_speeds": path_speed.tolist(),
+            "temps_c": list(temps),
+            "humidity_pct": list(humidity),
+            "wind_mps": list(wind),
+        }
+
+    if robust:
+        I, J = tdoa.pair_indices(n, reference)
+        res = tdoa.residuals(global_solution_xy, stations_xy, delays, speed, (I, J), scale=speed / path_speed)
+        result["robust"] = {
+            "threshold_m": float(robust_threshold),
+            "rejected": [int(i) for i in np.flatnonzero(~inliers)],
+            "pair_residuals": [
+                {"pair": [int(i), int(j)], "residual_m": float(r)} for i, j, r in zip(I, J, res)
+            ],
+        }
+
+    if sigma_t is not None or sigma_pos:
+        sigma_t = float(sigma_t or 0.0)
+        sigma_pos = float(sigma_pos or 0.0)
+        cov = uncertainty.covariance(global_solution_xy, stations_xy, speed, sigma_t, sigma_pos, reference)
+        ell = uncertainty.ellipse(cov, float(confidence))
+        outline = ell.pop("outline_xy") + global_solution_xy
+        ell["points"] = xy_to_gps_points(lat_ref, lon_ref, outline)
+        result["uncertainty"] = {
+            "sigma_t": sigma_t,
+            "sigma_pos": sigma_pos,
+            "covariance_m2": cov.tolist(),
+            "ellipse": ell,
+        }
+
+        if int(monte_carlo) > 0:
+            cloud = uncertainty.monte_carlo(
+                global_solution_xy, stations_xy, delays, speed, sigma_t, sigma_pos,
+                int(monte_carlo), reference
+            )
+            result["uncertainty"]["monte_carlo"] = {
+                "samples": len(cloud),
+                "covariance_m2": np.cov(cloud.T).tolist(),
+                "points": xy_to_gps_points(lat_ref, lon_ref, cloud[:MC_POINTS_OUT]),
             }
-        )
+
+    if gdop:
+        (gx0, gx1, gy0, gy1), grid = uncertainty.gdop_map(stations_xy, reference=reference)
+        result["gdop"] = {
+            "south_west": xy_to_gps(lat_ref, lon_ref, gx0, gy0),
+            "north_east": xy_to_gps(lat_ref, lon_ref, gx1, gy1),
+            "shape": list(grid.shape),
+            # Row-major from the south-west corner; null where undefined
+            "values": [
+                [round(float(g), 3) if np.isfinite(g) else None for g in row]
+                for row in grid
+            ],
+        }
+
+    return result
+
+def cached_solve(params):
+    """solve(**params) through the on-disk solution cache."""
+    defaults = {
+        name: p.default
+        for name, p in inspect.signature(solve).parameters.items()
+        if p.default is not inspect.Parameter.empty
+    }
+    options = {**defaults, **params}
+    temp_c = options.pop("temp_c")
+    speed = v if temp_c is None else speed_of_sound_from_temp(float(temp_c))
+    key = solution_cache.make_key(
+        options.pop("lats"), options.pop("lons"), options.pop("times"), speed, **options
     )
 
-except Exception as e:
-    print(json.dumps({"error": str(e)}))
+    result = solution_cache.get(key)
+    if result is None:
+        result = solve(**params)
+        solution_cache.put(key, result)
+    return result
+
+def handle_request(request):
+    """
+    Solve one --serve request. Accepts either {"params": {...}} with
+    solve() keyword arguments or {"args": [...]} with the CLI arguments;
+    {"op": "cache_stats"} returns the solution cache counters.
+    """
+    try:
+        if request.get("op") == "cache_stats":
+            return solution_cache.stats()
+        if "args" in request:
+            params = parse_argv([str(a) for a in request["args"]])
+        else:
+            params = request["params"]
+        return cached_solve(params)
+    except Exception as e:
+        return {"error": str(e)}
+
+def serve(workers=SERVE_WORKERS):
+    """
+    Long-lived solver: read one JSON request per line on stdin and write one
+    JSON response per line on stdout, tagged with the request "id".
+    NumPy/SciPy are imported once and the worker processes are forked warm,
+    so requests only pay for the math.
+    """
+    write_lock = threading.Lock()
+
+    def reply(request_id, result):
+        with write_lock:
+            sys.stdout.write(json.dumps({"id": request_id, "result": result}) + "\n")
+            sys.stdout.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                reply(None, {"error": f"Invalid JSON request: {e}"})
+                continue
+            if not isinstance(request, dict):
+                reply(None, {"error": "Request must be a JSON object"})
+                continue
+
+            request_id = request.get("id")
+            future = pool.submit(handle_request, request)
+            future.add_done_callback(
+                lambda f, rid=request_id: reply(
+                    rid, f.result() if f.exception() is None else {"error": str(f.exception())}
+                )
+            )
+
+def main(argv):
+    if argv and argv[0] == "--serve":
+        workers = int(argv[1]) if len(argv) > 1 else SERVE_WORKERS
+        serve(workers)
+        return
+
+    try:
+        if argv and argv[0] == "--json":
+            # solve() keyword arguments as a JSON object, from argv or stdin
+            params = json.loads(argv[1] if len(argv) > 1 else sys.stdin.read())
+        else:
+            params = parse_argv(argv)
+        print(json.dumps(cached_solve(params)))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+import math
+from functools import lru_cache
+import numpy as np
+
+# Local east/north projection on the WGS84 ellipsoid.
+# Points go through Earth-centred (ECEF) coordinates and are rotated into
+# the east/north/up frame of a reference point (station 1). The inverse
+# puts the XY point back on the ellipsoid surface. Everything works on
+# whole arrays; the frame of each reference point is computed once.
+
+# WGS84
+A = 6378137.0
+F = 1.0 / 298.257223563
+E2 = F * (2.0 - F)
+B = A * (1.0 - F)
+EP2 = E2 / (1.0 - E2)
+
+def geodetic_to_ecef(lat, lon, h=0.0):
+    """Degrees (and meters above the ellipsoid) -> ECEF meters, shape (..., 3)."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    sin_lat = np.sin(lat)
+    N = A / np.sqrt(1.0 - E2 * sin_lat * sin_lat)
+    x = (N + h) * np.cos(lat) * np.cos(lon)
+    y = (N + h) * np.cos(lat) * np.sin(lon)
+    z = (N * (1.0 - E2) + h) * sin_lat
+    return np.stack([x, y, z], axis=-1)
+
+def ecef_to_geodetic(xyz):
+    """ECEF meters (..., 3) -> (lat, lon, h) in degrees and meters (Bowring)."""
+    xyz = np.asarray(xyz, dtype=float)
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * A, p * B)
+    st, ct = np.sin(theta), np.cos(theta)
+    lat = np.arctan2(z + EP2 * B * st ** 3, p - E2 * A * ct ** 3)
+    lon = np.arctan2(y, x)
+    sin_lat = np.sin(lat)
+    N = A / np.sqrt(1.0 - E2 * sin_lat * sin_lat)
+    h = p / np.cos(lat) - N
+    return np.degrees(lat), np.degrees(lon), h
+
+@lru_cache(maxsize=64)
+def _frame(lat_ref, lon_ref):
+    """ECEF origin and rotation (rows: east, north, up) of a reference point."""
+    origin = geodetic_to_ecef(lat_ref, lon_ref)
+    sl, cl = math.sin(math.radians(lat_ref)), math.cos(math.radians(lat_ref))
+    so, co = math.sin(math.radians(lon_ref)), math.cos(math.radians(lon_ref))
+    R = np.array([
+        [-so, co, 0.0],
+        [-sl * co, -sl * so, cl],
+        [cl * co, cl * so, sl],
+    ])
+    return origin, R
+
+def to_xy(lat_ref, lon_ref, lat, lon):
+    """
+    East/north meters of (lat, lon) relative to the reference point.
+    Scalars give shape (2,), arrays of N points give (N, 2).
+    """
+    origin, R = _frame(float(lat_ref), float(lon_ref))
+    enu = (geodetic_to_ecef(lat, lon) - origin) @ R.T
+    return enu[..., :2]
+
+def to_latlon(lat_ref, lon_ref, xy):
+    """
+    Inverse of to_xy: (..., 2) east/north meters -> (lat, lon) arrays of
+    the matching points on the ellipsoid surface.
+    """
+    origin, R = _frame(float(lat_ref), float(lon_ref))
+    xy = np.asarray(xy, dtype=float)
+    e, n = xy[..., 0], xy[..., 1]
+    # Drop below the tangent plane until the point sits on the surface;
+    # the spherical estimate is already within centimetres at 10 km
+    up = -(e * e + n * n) / (2.0 * A)
+    for _ in range(2):
+        lat, lon, h = ecef_to_geodetic(origin + np.stack([e, n, up], axis=-1) @ R)
+        up = up - h
+    lat, lon, _ = ecef_to_geodetic(origin + np.stack([e, n, up], axis=-1) @ R)
+    return lat, lon
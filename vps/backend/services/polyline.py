@@ -0,0 +1,84 @@
+import base64
+import numpy as np
+
+# Compact encodings for the hyperbola polylines sent to the dashboard.
+#   simplify: Douglas-Peucker in XY meters, before conversion to lat/lon
+#   encode/decode: Google encoded polyline (quantized, delta, base64-ish text)
+#   pack/unpack: delta-encoded little-endian int32 pairs, base64
+
+def simplify(xy, tolerance):
+    """
+    Douglas-Peucker: keep the fewest points of an (N, 2) XY run such that
+    no dropped point is more than tolerance meters from the result.
+    """
+    xy = np.asarray(xy, dtype=float)
+    if tolerance <= 0.0 or len(xy) < 3:
+        return xy
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        if hi - lo < 2:
+            continue
+        a, b = xy[lo], xy[hi]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        rel = xy[lo + 1:hi] - a
+        if length == 0.0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(rel[:, 0] * ab[1] - rel[:, 1] * ab[0]) / length
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            mid = lo + 1 + k
+            keep[mid] = True
+            stack.append((lo, mid))
+            stack.append((mid, hi))
+    return xy[keep]
+
+MAX_PRECISION = 7  # 180 * 10^7 still fits int32 (pack); more decimals are sub-centimeter anyway
+
+def _quantized_deltas(latlon, precision):
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be 0-{MAX_PRECISION}, got {precision}")
+    q = np.round(np.asarray(latlon, dtype=float).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    return np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+
+def encode(latlon, precision=5):
+    """Google encoded polyline of (N, 2) [lat, lon] points."""
+    d = _quantized_deltas(latlon, precision)
+    if d.size == 0:
+        return ""
+    # Zigzag, then 5-bit chunks low to high, 0x20 marking "more follows"
+    z = np.where(d < 0, ~(d << 1), d << 1).astype(np.uint64)
+    shifted = z[:, None] >> (5 * np.arange(13, dtype=np.uint64))[None, :]
+    count = 1 + (shifted[:, 1:] > 0).sum(axis=1)
+    k = np.arange(13)[None, :]
+    chars = (shifted & np.uint64(31)) + np.where(k < count[:, None] - 1, 0x20 + 63, 63).astype(np.uint64)
+    return chars[k < count[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+def decode(text, precision=5):
+    """Inverse of encode: (N, 2) array of [lat, lon]."""
+    values, shift, acc = [], 0, 0
+    for c in text.encode("ascii"):
+        c -= 63
+        acc |= (c & 0x1F) << shift
+        shift += 5
+        if c < 0x20:
+            values.append(~(acc >> 1) if acc & 1 else acc >> 1)
+            shift, acc = 0, 0
+    return np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+
+def pack(latlon, precision=6):
+    """Base64 of int32 [lat0, lon0, dlat1, dlon1, ...] in units of 10^-precision degrees."""
+    d = _quantized_deltas(latlon, precision)
+    # A jump of more than ~214 degrees (across the antimeridian) at 7 decimals
+    if d.size and np.abs(d).max() > np.iinfo(np.int32).max:
+        raise ValueError(f"Coordinate step too large to pack at precision {precision}")
+    return base64.b64encode(d.astype("<i4").tobytes()).decode("ascii")
+
+def unpack(text, precision=6):
+    """Inverse of pack: (N, 2) array of [lat, lon]."""
+    d = np.frombuffer(base64.b64decode(text), dtype="<i4").astype(np.int64)
+    return np.cumsum(d.reshape(-1, 2), axis=0) / 10 ** precision
@@ -0,0 +1,132 @@
+from functools import lru_cache
+import numpy as np
+
+import tdoa
+from uncertainty import layout_bounds
+
+# Weather-aware propagation: an effective sound speed per source-station
+# path instead of one global v.
+#
+# Station temperature/humidity readings are spread over a coarse grid by
+# inverse-distance weighting, giving a slowness (1 / c) field. A path's
+# speed is its length over the travel time integrated along the straight
+# line, plus the wind component along the path. The field is cached per
+# weather snapshot, so repeated solves only pay for the path lookups.
+#
+# weather: one entry per station, None when the station has no reading:
+#   {"temp_c": 18.5, "humidity_pct": 60.0, "wind_mps": [east, north]}
+
+GRID_N = 32          # field resolution over the layout box
+PATH_SAMPLES = 16    # points per path for the slowness integral
+ITERATIONS = 3       # path-speed / position fixed-point rounds
+DEFAULT_TEMP_C = 20.0
+
+def speed_of_sound(temp_c, humidity_pct=None):
+    """
+    Speed of sound in air (m/s): the linear temperature model used by
+    generate_plot plus a small humidity term (about +0.0124 m/s per %RH).
+    """
+    c = 331.3 + 0.606 * np.asarray(temp_c, dtype=float)
+    if humidity_pct is not None:
+        c = c + 0.0124 * np.asarray(humidity_pct, dtype=float)
+    return c
+
+def idw(points, values, targets, power=2.0):
+    """Inverse-distance-weighted interpolation of values at points onto targets."""
+    d = np.linalg.norm(targets[:, None, :] - points[None, :, :], axis=2)
+    w = 1.0 / np.maximum(d, 1e-6) ** power
+    return (w @ values) / w.sum(axis=1)
+
+def snapshot(stations, weather, default_temp_c=None):
+    """
+    Hashable (layout, temps, humidity, wind) key for one weather snapshot.
+    Stations without a temperature get the mean of the others (or the
+    default); readings are rounded so tiny jitter reuses the same field.
+    """
+    default = DEFAULT_TEMP_C if default_temp_c is None else float(default_temp_c)
+    weather = list(weather) + [None] * (len(stations) - len(weather))
+    reports = [w for w in weather if w and w.get("temp_c") is not None]
+    fill = np.mean([float(w["temp_c"]) for w in reports]) if reports else default
+
+    temps, humidity, winds = [], [], []
+    for w in weather:
+        w = w or {}
+        temps.append(round(float(w["temp_c"] if w.get("temp_c") is not None else fill), 1))
+        humidity.append(None if w.get("humidity_pct") is None else round(float(w["humidity_pct"])))
+        if w.get("wind_mps") is not None:
+            winds.append([float(x) for x in w["wind_mps"]])
+
+    # Stations without a humidity reading take the mean of the others
+    known = [h for h in humidity if h is not None]
+    humidity = [h if h is not None else (round(float(np.mean(known))) if known else None) for h in humidity]
+    wind = tuple(round(float(x), 1) for x in np.mean(winds, axis=0)) if winds else (0.0, 0.0)
+
+    layout = tuple(tuple(round(float(c), 1) for c in s) for s in stations)
+    return layout, tuple(temps), tuple(humidity), wind
+
+@lru_cache(maxsize=32)
+def field(snap):
+    """(bounds, slowness grid (GRID_N, GRID_N) rows along y, wind (2,)) for a snapshot."""
+    layout, temps, humidity, wind = snap
+    stations = np.array(layout)
+    bounds = layout_bounds(stations)
+    xmin, xmax, ymin, ymax = bounds
+    xs = np.linspace(xmin, xmax, GRID_N)
+    ys = np.linspace(ymin, ymax, GRID_N)
+    cells = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    t = idw(stations, np.array(temps), cells)
+    h = None if humidity[0] is None else idw(stations, np.array(humidity, dtype=float), cells)
+    slowness = 1.0 / speed_of_sound(t, h)
+    return bounds, slowness.reshape(GRID_N, GRID_N), np.array(wind)
+
+def _bilinear(grid, bounds, pts):
+    """Bilinear lookup in a grid spanning bounds; points outside are clamped."""
+    xmin, xmax, ymin, ymax = bounds
+    n = grid.shape[0]
+    fx = np.clip((pts[..., 0] - xmin) / (xmax - xmin) * (n - 1), 0.0, n - 1.000001)
+    fy = np.clip((pts[..., 1] - ymin) / (ymax - ymin) * (n - 1), 0.0, n - 1.000001)
+    ix, iy = fx.astype(int), fy.astype(int)
+    tx, ty = fx - ix, fy - iy
+    return (
+        grid[iy, ix] * (1 - tx) * (1 - ty) + grid[iy, ix + 1] * tx * (1 - ty) +
+        grid[iy + 1, ix] * (1 - tx) * ty + grid[iy + 1, ix + 1] * tx * ty
+    )
+
+def path_speeds(fld, pos, stations):
+    """
+    Effective speed (m/s) of every path from pos (K, 2) to stations, shared
+    (M, 2) or per source (K, M, 2): returns (K, M).
+    """
+    bounds, slowness, wind = fld
+    pos = np.atleast_2d(np.asarray(pos, dtype=float))
+    stations = np.asarray(stations, dtype=float)
+    diff = stations - pos[:, None, :]                               # source -> station
+    t = (np.arange(PATH_SAMPLES) + 0.5) / PATH_SAMPLES              # midpoint rule
+    pts = pos[:, None, None, :] + t[None, None, :, None] * diff[:, :, None, :]
+    mean_slowness = _bilinear(slowness, bounds, pts).mean(axis=2)
+    D = np.linalg.norm(diff, axis=2)
+    along = np.einsum("kmi,i->km", diff, wind) / np.maximum(D, 1e-9)
+    return 1.0 / mean_slowness + along
+
+def solve(fld, stations, delays, v, reference=None, guess=None, refine=True):
+    """
+    tdoa.solve with per-path speeds: alternate between evaluating the path
+    speeds at the current estimate and re-solving with them fixed.
+    Returns (position, path speeds (M,)).
+    """
+    stations = np.asarray(stations, dtype=float)
+    pos = tdoa.solve(stations, delays, v, reference=reference, guess=guess, refine=refine)
+    for _ in range(ITERATIONS):
+        c = path_speeds(fld, pos, stations)[0]
+        pos = tdoa.solve(stations, delays, v, reference=reference, guess=pos, refine=refine, scale=v / c)
+    return pos, path_speeds(fld, pos, stations)[0]
+
+def solve_batch(fld, stations, delays, v, reference=None, guess=None, refine=True):
+    """Batched counterpart of solve for (K, M, 2) stations; returns (pos, cost)."""
+    S = np.asarray(stations, dtype=float)
+    pos, cost = tdoa.solve_batch(S, delays, v, reference=reference, guess=guess, refine=refine)
+    for _ in range(ITERATIONS):
+        c = path_speeds(fld, pos, S)
+        pos, cost = tdoa.solve_batch(S, delays, v, reference=reference, guess=pos, refine=refine, scale=v / c)
+    return pos, cost
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+
+# Content-addressed cache of solver results in SQLite.
+# Keys hash the quantized request (coordinates, delays, speed of sound and
+# solver options), so re-plotting the same event skips every solve.
+# Entries are evicted least-recently-used once the count or byte budget
+# is exceeded; hit/miss counters live in the same file.
+
+CACHE_PATH = os.environ.get(
+    "SOLUTION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "solution_cache.sqlite3"),
+)
+MAX_ENTRIES = 2000
+MAX_BYTES = 200 * 1024 * 1024
+
+# Part of every key; bump when the solver output changes so old entries
+# stop matching
+KEY_VERSION = 2
+
+# Quantization steps for the key
+COORD_DECIMALS = 7   # degrees, ~1 cm
+TIME_DECIMALS = 6    # seconds, 1 us
+SPEED_DECIMALS = 2   # m/s
+
+_conn = None
+_conn_pid = None
+
+def _connect():
+    """One connection per process (the --serve pool forks workers)."""
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        _conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        _conn_pid = os.getpid()
+    return _conn
+
+def make_key(lats, lons, times, speed, **options):
+    """Hash of the quantized event plus any solver options that change the result."""
+    times = [float(t) for t in times]
+    payload = {
+        "version": KEY_VERSION,
+        "lats": [round(float(x), COORD_DECIMALS) for x in lats],
+        "lons": [round(float(x), COORD_DECIMALS) for x in lons],
+        # Only differences matter to the solver
+        "times": [round(t - times[0], TIME_DECIMALS) for t in times],
+        "speed": round(float(speed), SPEED_DECIMALS),
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _count(conn, name):
+    conn.execute(
+        "INSERT INTO stats (name, value) VALUES (?, 1)"
+        " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,),
+    )
+
+def get(key):
+    """Cached result for key, or None. Updates LRU order and counters."""
+    try:
+        conn = _connect()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _count(conn, "misses")
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        _count(conn, "hits")
+        return json.loads(row[0])
+    except sqlite3.Error as e:
+        print(f"solution cache unavailable: {e}", file=sys.stderr)
+        return None
+
+def put(key, result):
+    """Store result and evict least-recently-used entries over budget."""
+    try:
+        conn = _connect()
+        value = json.dumps(result)
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time()),
+        )
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while count > MAX_ENTRIES or total > MAX_BYTES:
+            oldest = conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if oldest is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (oldest[0],))
+            _count(conn, "evictions")
+            count, total = count - 1, total - oldest[1]
+    except sqlite3.Error as e:
+        print(f"solution cache unavailable: {e}", file=sys.stderr)
+
+def stats():
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    return {
+        "hits": counters.get("hits", 0),
+        "misses": counters.get("misses", 0),
+        "evictions": counters.get("evictions", 0),
+        "entries": count,
+        "bytes": total,
+    }
@@ -0,0 +1,91 @@
+// backend/services/solverWorker.js
+// Keeps one warm `generate_plot.py --serve` process and multiplexes
+// requests to it over stdin/stdout JSON lines.
+const { spawn } = require("child_process")
+const path = require("path")
+const readline = require("readline")
+
+const SCRIPT = path.join(__dirname, "generate_plot.py")
+const WORKERS = process.env.SOLVER_WORKERS || "2"
+const TIMEOUT_MS = 30 * 1000
+
+let child = null
+let nextId = 1
+const pending = new Map()
+
+function failAll(message) {
+  for (const { reject, timer } of pending.values()) {
+    clearTimeout(timer)
+    reject(new Error(message))
+  }
+  pending.clear()
+}
+
+function start() {
+  const proc = spawn("python3", [SCRIPT, "--serve", WORKERS], {
+    stdio: ["pipe", "pipe", "pipe"]
+  })
+
+  readline.createInterface({ input: proc.stdout }).on("line", (line) => {
+    let msg
+    try {
+      msg = JSON.parse(line)
+    } catch (err) {
+      console.error("solver: invalid JSON from Python:", line)
+      return
+    }
+
+    const entry = pending.get(msg.id)
+    if (!entry) return
+    pending.delete(msg.id)
+    clearTimeout(entry.timer)
+    entry.resolve(msg.result)
+  })
+
+  proc.stderr.on("data", (data) => {
+    console.error("solver:", data.toString())
+  })
+
+  proc.stdin.on("error", (err) => {
+    console.error("solver: stdin error:", err.message)
+  })
+
+  proc.on("error", (err) => {
+    console.error("solver: failed to start:", err)
+  })
+
+  proc.on("exit", (code, signal) => {
+    console.error(`solver exited (code=${code}, signal=${signal})`)
+    if (child === proc) child = null
+    failAll("Python solver exited")
+  })
+
+  return proc
+}
+
+// Send one request; resolves with the script's JSON result.
+function send(message) {
+  if (!child) child = start()
+
+  const id = nextId++
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      pending.delete(id)
+      reject(new Error("Python solver timed out"))
+    }, TIMEOUT_MS)
+
+    pending.set(id, { resolve, reject, timer })
+    child.stdin.write(JSON.stringify({ id, ...message }) + "\n")
+  })
+}
+
+function solve(params) {
+  return send({ params })
+}
+
+// Hit/miss counters of the solver's result cache
+function cacheStats() {
+  return send({ op: "cache_stats" })
+}
+
+module.exports = { solve, cacheStats }
@@ -0,0 +1,291 @@
+import math
+import itertools
+import numpy as np
+from scipy.optimize import least_squares
+
+# Shared TDOA math for generate_plot.py and generate-plot-local.py.
+# Residuals are range-difference errors in meters:
+#   r_k = (|P - S_i| - |P - S_j|) - v * (t_i - t_j)   for each pair k = (i, j)
+# With per-path sound speeds c_i, ranges are scaled by s_i = v / c_i so the
+# residual stays in meters at the reference speed v (see propagation.py).
+
+def pair_indices(n, reference=None):
+    """
+    Station pairs as two index arrays (I, J).
+    reference=None -> every pair i < j (n*(n-1)/2 residuals)
+    reference=k    -> (i, k) for every i != k (n-1 residuals)
+    """
+    if reference is None:
+        I, J = np.triu_indices(n, k=1)
+        return I, J
+    I = np.array([i for i in range(n) if i != reference])
+    return I, np.full(len(I), reference)
+
+def omit_subsets(n, omit=1, max_subsets=None, seed=0):
+    """
+    Station index subsets that each leave out `omit` stations, ordered by
+    the omitted stations (omit station 1 first, ...). When there are more
+    than max_subsets of them, a reproducible random sample of that many
+    distinct subsets is used instead of enumerating all C(n, omit).
+    """
+    total = math.comb(n, omit)
+    if max_subsets is None or total <= max_subsets:
+        dropped = list(itertools.combinations(range(n), omit))
+    else:
+        rng = np.random.default_rng(seed)
+        chosen = set()
+        while len(chosen) < max_subsets:
+            chosen.add(tuple(sorted(rng.choice(n, size=omit, replace=False).tolist())))
+        dropped = sorted(chosen)
+    return [[i for i in range(n) if i not in d] for d in dropped]
+
+def station_ranges(pos, stations):
+    """Distance from pos to every station, plus the unit vectors S -> pos."""
+    diff = np.asarray(pos, dtype=float) - stations
+    D = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    U = diff / np.maximum(D, 1e-9)[:, None]
+    return D, U
+
+def residuals(pos, stations, delays, v, pairs, scale=None):
+    I, J = pairs
+    D, _ = station_ranges(pos, stations)
+    if scale is not None:
+        D = D * scale
+    return (D[I] - D[J]) - v * (delays[I] - delays[J])
+
+def jacobian(pos, stations, delays, v, pairs, scale=None):
+    """Analytic d(residual)/d(pos): unit vector to S_i minus unit vector to S_j."""
+    I, J = pairs
+    _, U = station_ranges(pos, stations)
+    if scale is not None:
+        U = U * scale[:, None]
+    return U[I] - U[J]
+
+def initial_guess_batch(stations, delays, v):
+    """
+    Closed-form (spherical-intersection) source estimates for K events.
+
+    With station 0 moved to the origin and d0 the unknown range to it, each
+    other station gives a linear equation 2 S_i.x = |S_i|^2 - r_i^2 - 2 r_i d0
+    (r_i = v * (t_i - t_0)). Solving for x = p + q*d0 in the least-squares
+    sense and imposing |x| = d0 leaves a quadratic in d0. Of its non-negative
+    roots the one with the smallest TDOA residual is kept.
+
+    stations: (M, 2) or (K, M, 2); delays: (K, M). Returns (K, 2).
+    """
+    delays = np.atleast_2d(np.asarray(delays, dtype=float))
+    K, M = delays.shape
+    S = np.broadcast_to(np.asarray(stations, dtype=float), (K, M, 2))
+    ref = S[:, 0, :]
+    Sp = S[:, 1:, :] - ref[:, None, :]
+    r = v * (delays[:, 1:] - delays[:, :1])
+
+    P = np.linalg.pinv(2.0 * Sp)                        # (K, 2, M-1)
+    b = np.einsum("kmi,kmi->km", Sp, Sp) - r * r
+    p = np.einsum("kim,km->ki", P, b)
+    q = np.einsum("kim,km->ki", P, -2.0 * r)
+
+    alpha = np.einsum("ki,ki->k", q, q) - 1.0
+    beta = 2.0 * np.einsum("ki,ki->k", p, q)
+    gamma = np.einsum("ki,ki->k", p, p)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Noise can push the discriminant below zero; use the double root then
+        disc = np.sqrt(np.maximum(beta * beta - 4.0 * alpha * gamma, 0.0))
+        roots = np.stack([(-beta - disc) / (2.0 * alpha), (-beta + disc) / (2.0 * alpha)], axis=1)
+        linear = np.abs(alpha) < 1e-12
+        roots[linear] = (-gamma[linear] / beta[linear])[:, None]
+    roots = np.where(np.isfinite(roots), np.maximum(roots, 0.0), 0.0)
+
+    cand = ref[:, None, :] + p[:, None, :] + q[:, None, :] * roots[..., None]   # (K, 2, 2)
+    I, J = pair_indices(M)
+    target = v * (delays[:, I] - delays[:, J])
+    cost = np.empty((K, 2))
+    for c in range(2):
+        D = np.linalg.norm(cand[:, c, None, :] - S, axis=2)
+        res = (D[:, I] - D[:, J]) - target
+        cost[:, c] = np.einsum("kp,kp->k", res, res)
+    # Ties (e.g. exactly three stations) go to the root nearer the array
+    spread = np.linalg.norm(cand - S.mean(axis=1)[:, None, :], axis=2)
+    pick = np.where(np.isclose(cost[:, 0], cost[:, 1]), np.argmin(spread, axis=1), np.argmin(cost, axis=1))
+    return cand[np.arange(K), pick]
+
+def initial_guess(stations, delays, v):
+    """Closed-form starting point for one event (see initial_guess_batch)."""
+    return initial_guess_batch(stations, np.asarray(delays, dtype=float)[None, :], v)[0]
+
+def solve(stations, delays, v, reference=None, guess=None, refine=True, loss="linear", f_scale=1.0,
+          scale=None):
+    """
+    Least-squares source position (XY meters) for one set of stations.
+    Delays may be absolute or relative; only differences are used.
+    Starts from the closed-form estimate; refine=False returns that
+    estimate directly ("fast" mode). loss/f_scale select a robust loss
+    ("huber", "soft_l1", ...) as in scipy's least_squares. scale holds
+    optional per-station range factors v / c_i.
+    """
+    stations = np.asarray(stations, dtype=float)
+    delays = np.asarray(delays, dtype=float)
+    pairs = pair_indices(len(stations), reference)
+    if scale is not None:
+        scale = np.asarray(scale, dtype=float)
+    if guess is None:
+        guess = initial_guess(stations, delays, v)
+    if not refine:
+        return guess
+    sol = least_squares(
+        residuals, guess, jac=jacobian, args=(stations, delays, v, pairs, scale),
+        loss=loss, f_scale=f_scale
+    )
+    return sol.x
+
+def solve_batch(stations, delays, v, reference=None, guess=None, refine=True, max_iter=100, tol=1e-10,
+                scale=None):
+    """
+    Vectorized Levenberg-Marquardt over many events at once.
+
+    stations: (M, 2) shared layout or (K, M, 2) per event
+    delays:   (K, M) arrival times per event
+    guess:    (K, 2) starting points (default: closed-form estimate)
+    refine:   False returns the starting points without iterating
+    scale:    optional (M,) or (K, M) per-station range factors v / c_i
+    Returns (K, 2) positions and (K,) final costs (sum of squared residuals).
+
+    With only two unknowns per event the normal equations are 2x2, so each
+    iteration is a handful of array ops for the whole batch instead of one
+    least_squares call per event.
+    """
+    delays = np.atleast_2d(np.asarray(delays, dtype=float))
+    K, M = delays.shape
+    S = np.broadcast_to(np.asarray(stations, dtype=float), (K, M, 2))
+    I, J = pair_indices(M, reference)
+    target = v * (delays[:, I] - delays[:, J])
+    sc = np.ones((K, M)) if scale is None else np.broadcast_to(np.asarray(scale, dtype=float), (K, M))
+
+    if guess is None:
+        pos = initial_guess_batch(S, delays, v)
+    else:
+        pos = np.array(np.broadcast_to(guess, (K, 2)), dtype=float)
+
+    def evaluate(p, idx):
+        diff = p[:, None, :] - S[idx]
+        D = np.sqrt(np.einsum("kmi,kmi->km", diff, diff))
+        Ds = D * sc[idx]
+        r = (Ds[:, I] - Ds[:, J]) - target[idx]
+        return diff, D, r
+
+    diff, D, r = evaluate(pos, np.arange(K))
+    cost = np.einsum("kp,kp->k", r, r)
+    lam = np.full(K, 1e-3)
+    active = np.arange(K) if refine else np.arange(0)
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        U = diff[active] * (sc[active] / np.maximum(D[active], 1e-9))[..., None]
+        Jm = U[:, I] - U[:, J]
+        A = np.einsum("kpi,kpj->kij", Jm, Jm)
+        g = np.einsum("kpi,kp->ki", Jm, r[active])
+
+        # Marquardt-scaled damping, solved in closed form for 2x2 systems
+        a00 = A[:, 0, 0] * (1.0 + lam[active]) + 1e-12
+        a11 = A[:, 1, 1] * (1.0 + lam[active]) + 1e-12
+        a01 = A[:, 0, 1]
+        det = a00 * a11 - a01 * a01
+        step = np.empty_like(g)
+        step[:, 0] = -(a11 * g[:, 0] - a01 * g[:, 1]) / det
+        step[:, 1] = -(a00 * g[:, 1] - a01 * g[:, 0]) / det
+
+        trial = pos[active] + step
+        t_diff, t_D, t_r = evaluate(trial, active)
+        t_cost = np.einsum("kp,kp->k", t_r, t_r)
+
+        better = t_cost < cost[active]
+        acc = active[better]
+        gain = cost[acc] - t_cost[better]
+        pos[acc] = trial[better]
+        diff[acc] = t_diff[better]
+        D[acc] = t_D[better]
+        r[acc] = t_r[better]
+        cost[acc] = t_cost[better]
+        lam[acc] *= 0.3
+        lam[active[~better]] *= 10.0
+
+        step_len = np.linalg.norm(step, axis=1)
+        done = np.zeros(active.size, dtype=bool)
+        done[better] = gain <= tol * (1.0 + cost[acc])
+        done |= step_len < 1e-9
+        done |= lam[active] > 1e12
+        active = active[~done]
+
+    return pos, cost
+
+def emission_offsets(pos, stations, delays, v):
+    """
+    Implied emission time of the sound at each station, t_i - |P - S_i| / v,
+    for K candidate positions: pos (K, 2) -> (K, M). A consistent station
+    agrees with the others; a mis-triggered one stands out.
+    """
+    pos = np.atleast_2d(np.asarray(pos, dtype=float))
+    D = np.linalg.norm(pos[:, None, :] - np.asarray(stations, dtype=float)[None, :, :], axis=2)
+    return np.asarray(delays, dtype=float)[None, :] - D / v
+
+def consensus(candidates, stations, delays, v, threshold):
+    """
+    Score candidate positions by how many stations agree with them.
+
+    A station is an inlier of a candidate when its implied emission time is
+    within threshold (meters, i.e. threshold / v seconds) of the median over
+    all stations. Candidates are ranked by the sum of squared deviations
+    capped at the threshold (MSAC), so an outlier costs the same however
+    far off it is. Returns (best index, (K, M) inlier mask).
+    """
+    e = emission_offsets(candidates, stations, delays, v) * v
+    dev = np.abs(e - np.median(e, axis=1, keepdims=True))
+    score = np.minimum(dev, threshold) ** 2
+    return int(np.argmin(score.sum(axis=1))), dev <= threshold
+
+def subset_reference(keep, reference):
+    """Index of the pair reference within stations[keep] (first kept one if it was dropped)."""
+    if reference is None:
+        return None
+    return int(np.sum(keep[:reference])) if keep[reference] else 0
+
+def robust_solve(stations, delays, v, threshold=5.0, reference=None, candidates=None,
+                 refine=True, loss="soft_l1"):
+    """
+    Outlier-rejecting solve: consensus over omit-one subset solutions, then
+    a robust-loss least-squares fit over the stations that agree. With
+    three stations there is nothing to cross-check and every station is
+    kept.
+
+    candidates: (K, 2) subset solutions already computed by the caller;
+    by default every omit-one subset is solved here in one batch.
+    Returns (position, inlier mask (M,)). All stations are kept when fewer
+    than 3 would remain.
+    """
+    stations = np.asarray(stations, dtype=float)
+    delays = np.asarray(delays, dtype=float)
+    n = len(stations)
+
+    if candidates is None:
+        cases = omit_subsets(n, 1) if n >= 4 else []
+        if cases:
+            candidates, _ = solve_batch(stations[cases], delays[cases], v, reference=0, refine=refine)
+        else:
+            candidates = np.empty((0, 2))
+    candidates = np.reshape(candidates, (-1, 2))
+    if len(candidates) == 0:
+        full = solve(stations, delays, v, reference=reference, refine=refine, loss=loss, f_scale=threshold)
+        return full, np.ones(n, dtype=bool)
+
+    best, inliers = consensus(candidates, stations, delays, v, threshold)
+    keep = inliers[best]
+    if keep.sum() < 3:
+        full = solve(stations, delays, v, reference=reference, refine=refine, loss=loss, f_scale=threshold)
+        return full, np.ones(n, dtype=bool)
+
+    # Re-fit on the agreeing stations
+    pos = solve(stations[keep], delays[keep], v, reference=subset_reference(keep, reference), guess=candidates[best],
+                refine=refine, loss=loss, f_scale=threshold)
+    return pos, keep
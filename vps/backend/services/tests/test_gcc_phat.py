@@ -0,0 +1,76 @@
+import os
+import sys
+import wave
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import gcc_phat
+
+RATE = 16000
+DELAYS = [0.0, 0.0123, -0.0071, 0.0302]   # seconds each station hears the source after station 0
+
+def synthetic_channels(seconds=3.0, noise=0.05, seed=0):
+    """Broadband source delayed per station (fractional delays via FFT), plus noise."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    source = rng.standard_normal(n)
+    f = np.fft.rfftfreq(n, 1.0 / RATE)
+    S = np.fft.rfft(source)
+    cols = [np.fft.irfft(S * np.exp(-2j * np.pi * f * d), n=n) for d in DELAYS]
+    return np.column_stack(cols) + noise * rng.standard_normal((n, len(DELAYS)))
+
+def max_lags(bound=0.05):
+    return np.full((len(DELAYS), len(DELAYS)), bound)
+
+def test_pairwise_delays_recovered():
+    pairs, delays, peaks = gcc_phat.pairwise_gcc_phat(synthetic_channels(), RATE, max_lags())
+    for (i, j), d in zip(pairs, delays):
+        assert abs(d - (DELAYS[i] - DELAYS[j])) < 1e-5   # well under a sample
+    assert np.all(peaks > 0.3)
+
+def test_station_delays_relative_to_station_0():
+    pairs, delays, peaks = gcc_phat.pairwise_gcc_phat(synthetic_channels(), RATE, max_lags())
+    times = gcc_phat.station_delays(pairs, delays, peaks, len(DELAYS))
+    assert np.allclose(times, DELAYS, atol=1e-5)
+
+def test_lag_bound_excludes_peaks_outside_it():
+    bounds = max_lags()
+    bounds[0, 3] = bounds[3, 0] = 0.01   # the true 30 ms is out of reach
+    pairs, delays, _ = gcc_phat.pairwise_gcc_phat(synthetic_channels(), RATE, bounds)
+    k = pairs.index((0, 3))
+    assert abs(delays[k]) <= 0.01 + 1.0 / RATE
+
+def test_streamed_wav_matches_in_memory(tmp_path):
+    channels = synthetic_channels()
+    pcm = np.clip(channels * 3000, -32768, 32767).astype("<i2")
+    path = str(tmp_path / "merged.wav")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(pcm.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(pcm.tobytes())
+
+    start, duration = 0.5, 2.0
+    window = pcm[int(start * RATE):int((start + duration) * RATE)].astype(np.float32)
+    expected = gcc_phat.pairwise_gcc_phat(window, RATE, max_lags(), block=4096)
+    streamed = gcc_phat.wav_gcc_phat([(path, start, slice(0, 4))], max_lags(), duration, block=4096)
+    assert streamed[0] == expected[0]
+    assert np.allclose(streamed[1], expected[1])
+    assert np.allclose(streamed[2], expected[2])
+
+def test_streamed_per_station_files(tmp_path):
+    # One mono file per station, with station k's file starting k * 0.1 s later
+    channels = synthetic_channels()
+    sources = []
+    for k in range(len(DELAYS)):
+        skip = int(k * 0.1 * RATE)
+        path = str(tmp_path / f"s{k}.wav")
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(RATE)
+            w.writeframes(np.clip(channels[skip:, k] * 3000, -32768, 32767).astype("<i2").tobytes())
+        sources.append((path, 0.3 - k * 0.1, 0))
+    pairs, delays, peaks = gcc_phat.wav_gcc_phat(sources, max_lags(), 2.0)
+    times = gcc_phat.station_delays(pairs, delays, peaks, len(DELAYS))
+    assert np.allclose(times, DELAYS, atol=2e-5)
@@ -0,0 +1,39 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import geodesy
+
+def test_ecef_round_trip():
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-89.0, 89.0, 200)
+    lon = rng.uniform(-180.0, 180.0, 200)
+    h = rng.uniform(-100.0, 5000.0, 200)
+    back_lat, back_lon, back_h = geodesy.ecef_to_geodetic(geodesy.geodetic_to_ecef(lat, lon, h))
+    assert np.allclose(back_lat, lat, atol=1e-9)
+    assert np.allclose(back_lon, lon, atol=1e-9)
+    assert np.allclose(back_h, h, atol=1e-3)
+
+def test_xy_round_trip():
+    lat_ref, lon_ref = 40.0, -75.0
+    rng = np.random.default_rng(1)
+    lat = lat_ref + rng.uniform(-0.1, 0.1, 100)
+    lon = lon_ref + rng.uniform(-0.1, 0.1, 100)
+    xy = geodesy.to_xy(lat_ref, lon_ref, lat, lon)
+    assert xy.shape == (100, 2)
+    back_lat, back_lon = geodesy.to_latlon(lat_ref, lon_ref, xy)
+    # 1e-8 degrees is about a millimetre
+    assert np.allclose(back_lat, lat, atol=1e-8)
+    assert np.allclose(back_lon, lon, atol=1e-8)
+
+def test_scalar_point_and_reference_origin():
+    assert np.allclose(geodesy.to_xy(40.0, -75.0, 40.0, -75.0), [0.0, 0.0])
+    assert geodesy.to_xy(40.0, -75.0, 40.01, -75.0).shape == (2,)
+
+def test_north_distance_uses_the_meridian_radius():
+    # 0.01 degrees along the meridian at 45 N, from the WGS84 meridian
+    # radius of curvature (6367381.8 m there)
+    east, north = geodesy.to_xy(45.0, 10.0, 45.01, 10.0)
+    assert abs(east) < 1e-6
+    assert abs(north - 1111.35) < 0.05
@@ -0,0 +1,50 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import polyline
+
+# The worked example from Google's encoded polyline format documentation
+GOOGLE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+GOOGLE_TEXT = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+def test_encode_google_example():
+    assert polyline.encode(GOOGLE_POINTS) == GOOGLE_TEXT
+
+def test_decode_google_example():
+    assert np.allclose(polyline.decode(GOOGLE_TEXT), GOOGLE_POINTS)
+
+def test_encode_round_trip_at_other_precisions():
+    rng = np.random.default_rng(0)
+    points = np.column_stack([rng.uniform(-89.0, 89.0, 50), rng.uniform(-180.0, 180.0, 50)])
+    for precision in (0, 5, 6, 7):
+        back = polyline.decode(polyline.encode(points, precision), precision)
+        assert np.allclose(back, points, atol=0.5 / 10 ** precision + 1e-12)
+
+def test_pack_round_trip():
+    rng = np.random.default_rng(1)
+    points = 40.0 + np.cumsum(rng.normal(0.0, 1e-3, (100, 2)), axis=0)
+    back = polyline.unpack(polyline.pack(points, 6), 6)
+    assert np.allclose(back, points, atol=0.5e-6)
+
+def test_empty_input():
+    assert polyline.encode([]) == ""
+    assert polyline.decode("").shape == (0, 2)
+
+@pytest.mark.parametrize("precision", [-1, 8])
+def test_precision_out_of_range_is_rejected(precision):
+    with pytest.raises(ValueError):
+        polyline.encode(GOOGLE_POINTS, precision)
+    with pytest.raises(ValueError):
+        polyline.pack(GOOGLE_POINTS, precision)
+
+def test_pack_rejects_steps_that_overflow_int32():
+    with pytest.raises(ValueError):
+        polyline.pack([[0.0, -179.0], [0.0, 179.0]], 7)
+
+def test_simplify_keeps_corners_and_drops_collinear_points():
+    xy = [[0.0, 0.0], [1.0, 0.01], [2.0, 0.0], [2.0, 5.0]]
+    assert np.array_equal(polyline.simplify(xy, 0.1), [[0.0, 0.0], [2.0, 0.0], [2.0, 5.0]])
+    assert len(polyline.simplify(xy, 0.0)) == 4
@@ -0,0 +1,67 @@
+import os
+import sys
+import numpy as np
+from scipy.optimize import least_squares
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import tdoa
+
+V = 343.0
+STATIONS = np.array([[0.0, 0.0], [900.0, 50.0], [400.0, 800.0], [-300.0, 600.0], [650.0, -400.0]])
+
+def arrival_times(source, stations=STATIONS, noise=0.0, seed=0):
+    t = np.linalg.norm(stations - source, axis=1) / V
+    return t + np.random.default_rng(seed).normal(0.0, noise, len(t))
+
+def scipy_fit(stations, delays, guess):
+    """Reference solve: scipy's least_squares with a numerical Jacobian."""
+    I, J = np.triu_indices(len(stations), k=1)
+    def res(p):
+        D = np.linalg.norm(stations - p, axis=1)
+        return (D[I] - D[J]) - V * (delays[I] - delays[J])
+    return least_squares(res, guess).x
+
+def test_jacobian_matches_finite_differences():
+    pairs = tdoa.pair_indices(len(STATIONS))
+    delays = arrival_times(np.array([250.0, 300.0]))
+    pos = np.array([100.0, 500.0])
+    analytic = tdoa.jacobian(pos, STATIONS, delays, V, pairs)
+    h = 1e-4
+    numeric = np.stack([
+        (tdoa.residuals(pos + h * e, STATIONS, delays, V, pairs)
+         - tdoa.residuals(pos - h * e, STATIONS, delays, V, pairs)) / (2 * h)
+        for e in np.eye(2)
+    ], axis=1)
+    assert np.allclose(analytic, numeric, atol=1e-6)
+
+def test_closed_form_is_exact_without_noise():
+    source = np.array([250.0, 300.0])
+    guess = tdoa.initial_guess(STATIONS, arrival_times(source), V)
+    assert np.allclose(guess, source, atol=1e-6)
+
+def test_solve_matches_scipy_on_noisy_delays():
+    rng = np.random.default_rng(1)
+    for seed in range(10):
+        source = rng.uniform(-200.0, 900.0, 2)
+        delays = arrival_times(source, noise=1e-4, seed=seed)
+        ours = tdoa.solve(STATIONS, delays, V)
+        ref = scipy_fit(STATIONS, delays, STATIONS.mean(axis=0))
+        assert np.linalg.norm(ours - ref) < 1e-3
+        assert np.linalg.norm(ours - source) < 1.0
+
+def test_solve_batch_matches_per_event_solve():
+    rng = np.random.default_rng(2)
+    sources = rng.uniform(-200.0, 900.0, (20, 2))
+    delays = np.stack([arrival_times(s, noise=1e-4, seed=k) for k, s in enumerate(sources)])
+    batch, cost = tdoa.solve_batch(STATIONS, delays, V)
+    single = np.stack([tdoa.solve(STATIONS, d, V) for d in delays])
+    assert np.allclose(batch, single, atol=1e-3)
+    assert cost.shape == (20,)
+
+def test_robust_solve_drops_a_mistriggered_station():
+    source = np.array([250.0, 300.0])
+    delays = arrival_times(source)
+    delays[3] += 0.2   # ~69 m late
+    pos, keep = tdoa.robust_solve(STATIONS, delays, V)
+    assert keep.tolist() == [True, True, True, False, True]
+    assert np.linalg.norm(pos - source) < 1e-3
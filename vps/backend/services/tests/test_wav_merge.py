@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import wave
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import wav_merge
+
+RATE = 8000
+
+def write_station(path, samples, start_time=None, clock_offset_s=None):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+    if start_time is not None:
+        meta = {"start_time": start_time}
+        if clock_offset_s is not None:
+            meta["clock_offset_s"] = clock_offset_s
+        with open(wav_merge.sidecar_path(str(path)), "w") as f:
+            json.dump(meta, f)
+    return str(path)
+
+def read_merged(path):
+    with wave.open(str(path), "rb") as w:
+        n = w.getnchannels()
+        return np.frombuffer(w.readframes(w.getnframes()), dtype="<i2").reshape(-1, n)
+
+def test_alignment_offsets_crop_and_pad():
+    starts = [100.0, 100.5, 99.75]
+    offsets, common = wav_merge.alignment_offsets(starts, RATE, "crop")
+    assert common == 100.5
+    assert offsets == [4000, 0, 6000]
+    offsets, common = wav_merge.alignment_offsets(starts, RATE, "pad")
+    assert common == 99.75
+    assert offsets == [-2000, -6000, 0]
+
+def test_alignment_offsets_round_to_the_nearest_frame():
+    offsets, _ = wav_merge.alignment_offsets([0.0, 0.00019], RATE)
+    assert offsets == [2, 0]   # 1.52 frames
+
+def test_read_start_time_applies_the_clock_offset(tmp_path):
+    path = write_station(tmp_path / "a.wav", [0], start_time=100.0, clock_offset_s=-0.25)
+    assert wav_merge.read_start_time(path) == 99.75
+    assert wav_merge.read_clock_offset(path) == -0.25
+    assert wav_merge.read_start_time(write_station(tmp_path / "b.wav", [0])) is None
+
+def test_merge_wavs_offsets(tmp_path):
+    a = write_station(tmp_path / "a.wav", np.arange(10))
+    b = write_station(tmp_path / "b.wav", 100 + np.arange(10))
+    out = tmp_path / "out.wav"
+    # Skip 3 frames of a, prepend 2 frames of silence to b
+    frames = wav_merge.merge_wavs([a, b], str(out), offsets=[3, -2], block_frames=4)
+    merged = read_merged(out)
+    assert frames == 7 == len(merged)
+    assert merged[:, 0].tolist() == [3, 4, 5, 6, 7, 8, 9]
+    assert merged[:, 1].tolist() == [0, 0, 100, 101, 102, 103, 104]
+
+def test_failed_merge_leaves_no_partial_output(tmp_path, monkeypatch):
+    a = write_station(tmp_path / "a.wav", np.arange(100))
+    b = write_station(tmp_path / "b.wav", np.arange(100))
+    out = tmp_path / "out.wav"
+    out.write_bytes(b"previous merge")
+    writes = []
+
+    def writeframes(self, data):
+        writes.append(len(data))
+        if len(writes) == 3:
+            raise OSError("disk full")
+        self.writeframesraw(data)
+
+    monkeypatch.setattr(wave.Wave_write, "writeframes", writeframes)
+    with pytest.raises(OSError):
+        wav_merge.merge_wavs([a, b], str(out), block_frames=10)
+    assert out.read_bytes() == b"previous merge"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.wav", "b.wav", "out.wav"]
+
+def test_merge_aligned_lines_up_an_event(tmp_path):
+    # The same click, recorded by stations that started at different times
+    paths = []
+    for k, start in enumerate([10.0, 10.25, 9.9]):
+        x = np.zeros(RATE, dtype=np.int16)
+        x[int(round((10.5 - start) * RATE))] = 1000
+        paths.append(write_station(tmp_path / f"s{k}.wav", x, start_time=start))
+    out = tmp_path / "merged.wav"
+    info = wav_merge.merge_aligned(paths, str(out))
+    assert info["aligned"] and info["start_time"] == 10.25
+    assert [c["offset_samples"] for c in info["channels"]] == [2000, 0, 2800]
+    merged = read_merged(out)
+    assert np.argmax(merged, axis=0).tolist() == [2000, 2000, 2000]
+    with open(wav_merge.sidecar_path(str(out))) as f:
+        assert json.load(f)["frames"] == len(merged)
@@ -0,0 +1,134 @@
+import math
+from functools import lru_cache
+import numpy as np
+
+import tdoa
+
+# Position uncertainty for TDOA fixes: linearized covariance at the
+# solution, a batched Monte Carlo cloud and GDOP maps.
+#
+# Noise model: every station's arrival time has independent error sigma_t
+# (seconds) and every station position independent error sigma_pos (meters
+# per axis). Pair residuals share stations, so their covariance is full.
+
+def pair_matrix(n, pairs):
+    """B with B[k, i] = 1, B[k, j] = -1 for pair k = (i, j)."""
+    I, J = pairs
+    B = np.zeros((len(I), n))
+    B[np.arange(len(I)), I] = 1.0
+    B[np.arange(len(I)), J] = -1.0
+    return B
+
+def covariance(pos, stations, v, sigma_t, sigma_pos=0.0, reference=None):
+    """
+    2x2 covariance (m^2) of the least-squares fix at pos. Linearized, so it
+    assumes near-consistent delays; compare with monte_carlo when the fit
+    residual is large.
+    """
+    stations = np.asarray(stations, dtype=float)
+    n = len(stations)
+    pairs = tdoa.pair_indices(n, reference)
+    I, J = pairs
+    B = pair_matrix(n, pairs)
+    _, U = tdoa.station_ranges(pos, stations)
+    H = U[I] - U[J]
+
+    # Residual covariance from timing errors (v * dt) ...
+    R = (v * sigma_t) ** 2 * (B @ B.T)
+    # ... and from station position errors (dD_k/dS_k = -u_k)
+    if sigma_pos > 0.0:
+        G = np.zeros((len(I), 2 * n))
+        for k, (i, j) in enumerate(zip(I, J)):
+            G[k, 2 * i:2 * i + 2] = -U[i]
+            G[k, 2 * j:2 * j + 2] = U[j]
+        R += sigma_pos ** 2 * (G @ G.T)
+
+    # All-pairs residuals are linearly dependent, hence the pseudo-inverse
+    info = H.T @ np.linalg.pinv(R) @ H
+    return np.linalg.pinv(info)
+
+def ellipse(cov, confidence=0.95, points=64):
+    """
+    Confidence ellipse of a 2D Gaussian: semi-axes (m), orientation of the
+    major axis (degrees counterclockwise from east) and an outline in XY.
+    """
+    vals, vecs = np.linalg.eigh(cov)
+    vals = np.clip(vals, 0.0, None)
+    scale = math.sqrt(-2.0 * math.log(1.0 - confidence))  # chi-square, 2 dof
+    a, b = scale * np.sqrt(vals[::-1])
+    major = vecs[:, 1]
+    theta = np.linspace(0.0, 2.0 * np.pi, points)
+    outline = (
+        np.outer(a * np.cos(theta), major) +
+        np.outer(b * np.sin(theta), np.array([-major[1], major[0]]))
+    )
+    return {
+        "semi_major_m": float(a),
+        "semi_minor_m": float(b),
+        "angle_deg": float(math.degrees(math.atan2(major[1], major[0]))),
+        "confidence": confidence,
+        "outline_xy": outline,
+    }
+
+def monte_carlo(pos, stations, delays, v, sigma_t, sigma_pos=0.0, samples=2000,
+                reference=None, seed=0):
+    """
+    Re-solve the event under `samples` random perturbations of the delays
+    and station positions, all at once with tdoa.solve_batch.
+    Returns the (samples, 2) cloud of solutions.
+    """
+    stations = np.asarray(stations, dtype=float)
+    delays = np.asarray(delays, dtype=float)
+    rng = np.random.default_rng(seed)
+    d = delays + rng.normal(0.0, sigma_t, (samples, len(delays)))
+    s = stations + rng.normal(0.0, sigma_pos, (samples,) + stations.shape)
+    cloud, _ = tdoa.solve_batch(s, d, v, reference=reference, guess=pos)
+    return cloud
+
+def gdop_grid(stations, bounds, n=60, reference=None):
+    """
+    Geometric dilution of precision over an n x n grid: position error (m)
+    per meter of range-difference error, for unit iid timing noise.
+    Returns (xs, ys, gdop) with gdop shaped (n, n), rows along y.
+    """
+    stations = np.asarray(stations, dtype=float)
+    xmin, xmax, ymin, ymax = bounds
+    xs = np.linspace(xmin, xmax, n)
+    ys = np.linspace(ymin, ymax, n)
+    P = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    pairs = tdoa.pair_indices(len(stations), reference)
+    I, J = pairs
+    B = pair_matrix(len(stations), pairs)
+    W = np.linalg.pinv(B @ B.T)
+
+    diff = P[:, None, :] - stations[None, :, :]
+    U = diff / np.maximum(np.linalg.norm(diff, axis=2), 1e-9)[..., None]
+    H = U[:, I] - U[:, J]                                # (G, P, 2)
+    A = np.einsum("gpi,pq,gqj->gij", H, W, H)            # (G, 2, 2)
+    det = A[:, 0, 0] * A[:, 1, 1] - A[:, 0, 1] * A[:, 1, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trace_inv = (A[:, 0, 0] + A[:, 1, 1]) / det
+        gdop = np.sqrt(np.where(det > 1e-12, trace_inv, np.inf))
+    return xs, ys, gdop.reshape(n, n)
+
+def layout_bounds(stations, margin=1.0):
+    """Square box around the stations, padded by margin x their spread."""
+    stations = np.asarray(stations, dtype=float)
+    lo, hi = stations.min(axis=0), stations.max(axis=0)
+    span = max(float(np.max(hi - lo)), 100.0)
+    center = (lo + hi) / 2.0
+    half = span * (0.5 + margin)
+    return (center[0] - half, center[0] + half, center[1] - half, center[1] + half)
+
+@lru_cache(maxsize=16)
+def _cached_gdop(layout, n, reference):
+    stations = np.array(layout)
+    bounds = layout_bounds(stations)
+    xs, ys, gdop = gdop_grid(stations, bounds, n, reference)
+    return bounds, gdop
+
+def gdop_map(stations, n=60, reference=None):
+    """GDOP grid over the layout's box, cached per station layout."""
+    layout = tuple(tuple(round(float(c), 1) for c in s) for s in stations)
+    return _cached_gdop(layout, n, reference)
@@ -0,0 +1,169 @@
+import os
+import json
+import wave
+import subprocess
+import numpy as np
+
+# Streaming WAV merger: interleaves mono station recordings into one
+# multi-channel WAV block by block, so peak memory is a few blocks no matter
+# how long the recordings are.
+
+BLOCK_FRAMES = 1 << 16  # frames read per input per step
+
+def sidecar_path(wav_path):
+    """<name>.wav -> <name>.json (recording metadata written next to the WAV)."""
+    return os.path.splitext(wav_path)[0] + ".json"
+
+def station_wav(wav_path):
+    """
+    Path of a station recording as WAV. Stations may upload <name>.flac
+    instead; it is decoded next to it (flac CLI) on first use.
+    Returns None when neither file exists.
+    """
+    if os.path.exists(wav_path):
+        return wav_path
+    flac_path = os.path.splitext(wav_path)[0] + ".flac"
+    if not os.path.exists(flac_path):
+        return None
+    tmp_path = wav_path + ".tmp"
+    subprocess.run(["flac", "--silent", "--decode", "--force", "-o", tmp_path, flac_path], check=True)
+    os.replace(tmp_path, wav_path)
+    return wav_path
+
+def read_start_time(wav_path):
+    """
+    Epoch time of the first sample from the WAV's sidecar, or None.
+    Stations running the GPS timing daemon also record their clock's
+    offset from GPS time, which is applied here.
+    """
+    try:
+        with open(sidecar_path(wav_path), "r") as f:
+            meta = json.load(f)
+        return float(meta["start_time"]) + float(meta.get("clock_offset_s", 0.0))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def read_clock_offset(wav_path):
+    """GPS clock offset recorded in the WAV's sidecar, or None."""
+    try:
+        with open(sidecar_path(wav_path), "r") as f:
+            return float(json.load(f)["clock_offset_s"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def mixed_clocks(wav_paths):
+    """
+    True when only some of the recordings carry a GPS clock offset: their
+    start times are then on different time bases, and aligning on them is
+    only as good as the uncorrected stations' NTP time.
+    """
+    corrected = {read_clock_offset(p) is not None for p in wav_paths}
+    return len(corrected) > 1
+
+def alignment_offsets(start_times, rate, mode="crop"):
+    """
+    Per-channel frame offsets that line the channels up on a common start.
+    mode="crop": start at the latest recording; earlier ones skip frames (+).
+    mode="pad":  start at the earliest; later ones get leading silence (-).
+    Returns (offsets, common_start_time).
+    """
+    starts = np.asarray(start_times, dtype=float)
+    common = starts.max() if mode == "crop" else starts.min()
+    offsets = np.rint((common - starts) * rate).astype(int)
+    return offsets.tolist(), float(common)
+
+def merge_wavs(input_paths, output_path, offsets=None, block_frames=BLOCK_FRAMES):
+    """
+    Interleave mono PCM WAVs into an N-channel WAV, trimmed to the shortest
+    input. All inputs must share sample rate and sample width.
+    offsets[i] > 0 skips that many leading frames of input i; < 0 prepends
+    that many frames of silence. Returns the number of frames written.
+    """
+    # Written next to the output and renamed into place when complete, so
+    # nothing ever sees (or is left with) a half-written merge
+    tmp_path = output_path + ".tmp"
+    readers = [wave.open(p, "rb") for p in input_paths]
+    try:
+        params = [(r.getnchannels(), r.getsampwidth(), r.getframerate()) for r in readers]
+        for path, (nch, _, _) in zip(input_paths, params):
+            if nch != 1:
+                raise ValueError(f"{path} has {nch} channels; expected mono")
+        if len({p[1:] for p in params}) != 1:
+            raise ValueError(f"Inputs differ in sample width / rate: {params}")
+        _, width, rate = params[0]
+
+        if offsets is None:
+            offsets = [0] * len(readers)
+        pad = [max(-o, 0) for o in offsets]
+        for r, o in zip(readers, offsets):
+            r.setpos(min(max(o, 0), r.getnframes()))
+        total = max(min(r.getnframes() - r.tell() + p for r, p in zip(readers, pad)), 0)
+
+        # 8-bit WAV is unsigned, so silence is 0x80
+        silence = np.full((block_frames, width), 0x80 if width == 1 else 0, dtype=np.uint8)
+
+        with wave.open(tmp_path, "wb") as out:
+            out.setnchannels(len(readers))
+            out.setsampwidth(width)
+            out.setframerate(rate)
+
+            written = 0
+            while written < total:
+                count = min(block_frames, total - written)
+                # (frames, width) bytes per channel -> (frames, channels, width)
+                blocks = []
+                for k, r in enumerate(readers):
+                    lead = min(pad[k], count)
+                    pad[k] -= lead
+                    data = np.frombuffer(r.readframes(count - lead), dtype=np.uint8).reshape(-1, width)
+                    blocks.append(np.concatenate([silence[:lead], data]) if lead else data)
+                out.writeframes(np.stack(blocks, axis=1).tobytes())
+                written += count
+        os.replace(tmp_path, output_path)
+        return total
+    finally:
+        for r in readers:
+            r.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def merge_aligned(input_paths, output_path, mode="crop"):
+    """
+    Merge with sample-accurate alignment from each input's start-time
+    sidecar, and record the applied offsets in the output's sidecar.
+    Inputs without a sidecar fall back to aligning on their first sample.
+    """
+    with wave.open(input_paths[0], "rb") as w:
+        rate = w.getframerate()
+
+    start_times = [read_start_time(p) for p in input_paths]
+    aligned = all(t is not None for t in start_times)
+    if aligned:
+        offsets, common_start = alignment_offsets(start_times, rate, mode)
+    else:
+        offsets, common_start = [0] * len(input_paths), None
+
+    frames = merge_wavs(input_paths, output_path, offsets)
+
+    info = {
+        "start_time": common_start,
+        "sample_rate": rate,
+        "frames": frames,
+        "aligned": aligned,
+        "mode": mode,
+        "mixed_clocks": mixed_clocks(input_paths),
+        "channels": [
+            {
+                "file": os.path.basename(p),
+                "start_time": t,
+                "clock_offset_s": read_clock_offset(p),
+                "offset_samples": o,
+            }
+            for p, t, o in zip(input_paths, start_times, offsets)
+        ],
+    }
+    tmp_path = sidecar_path(output_path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, sidecar_path(output_path))
+    return info
@@ -0,0 +1,82 @@
+// backend/services/weather.js
+// Latest per-station weather from the node samples, in the shape the
+// solver's propagation model expects (see services/propagation.py):
+//   { temp_c, humidity_pct, wind_mps: [east, north] } or null per station
+const NodeSample = require("../models/NodeSample")
+
+const MAX_AGE_MS = 30 * 60 * 1000 // ignore readings older than this
+const CACHE_MS = 60 * 1000        // re-query at most once a minute
+
+// Sample meta keys, outdoor readings before enclosure ones
+const TEMP_C_KEYS = ["exterior_temp_c", "temp_c"]
+const TEMP_F_KEYS = ["exterior_temp_f", "temp_f", "interior_temp_f"]
+const HUMIDITY_KEYS = ["exterior_humidity_pct", "humidity_pct", "interior_humidity_pct"]
+
+let cached = null
+
+function firstNumber(meta, keys) {
+  for (const k of keys) {
+    const n = Number(meta[k])
+    if (meta[k] !== undefined && meta[k] !== null && Number.isFinite(n)) return n
+  }
+  return undefined
+}
+
+function readingFrom(meta) {
+  const reading = {}
+
+  let tempC = firstNumber(meta, TEMP_C_KEYS)
+  if (tempC === undefined) {
+    const tempF = firstNumber(meta, TEMP_F_KEYS)
+    if (tempF !== undefined) tempC = (tempF - 32) * 5 / 9
+  }
+  if (tempC !== undefined) reading.temp_c = Math.round(tempC * 10) / 10
+
+  const humidity = firstNumber(meta, HUMIDITY_KEYS)
+  if (humidity !== undefined) reading.humidity_pct = Math.round(humidity)
+
+  // Wind is reported as speed and the direction it blows from (degrees)
+  const speed = firstNumber(meta, ["wind_speed_mps"])
+  const from = firstNumber(meta, ["wind_dir_deg"])
+  if (speed !== undefined && from !== undefined) {
+    const rad = (from * Math.PI) / 180
+    reading.wind_mps = [
+      Math.round(-speed * Math.sin(rad) * 10) / 10,
+      Math.round(-speed * Math.cos(rad) * 10) / 10
+    ]
+  }
+  return reading
+}
+
+async function latestByStation() {
+  if (cached && Date.now() - cached.at < CACHE_MS) return cached.byStation
+
+  const since = new Date(Date.now() - MAX_AGE_MS)
+  const samples = await NodeSample.find(
+    { at: { $gte: since } },
+    { station: 1, meta: 1, at: 1 }
+  ).sort({ at: -1 }).lean()
+
+  // Newest first: each field keeps the most recent value any node reported
+  const byStation = {}
+  for (const s of samples) {
+    const entry = byStation[s.station] || (byStation[s.station] = {})
+    for (const [k, v] of Object.entries(readingFrom(s.meta || {}))) {
+      if (entry[k] === undefined) entry[k] = v
+    }
+  }
+
+  cached = { at: Date.now(), byStation }
+  return byStation
+}
+
+// Weather for the solver's stations, given their station ids in order
+async function stationWeather(ids) {
+  const byStation = await latestByStation()
+  return ids.map((id) => {
+    const entry = byStation[id]
+    return entry && Object.keys(entry).length ? entry : null
+  })
+}
+
+module.exports = { stationWeather }
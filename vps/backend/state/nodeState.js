@@ -12,17 +12,34 @@ function makeKey(station, kind, id) {
   return `${station}:${kind}:${id}`
 }
 
-async function handleNodeUpdate({ station, kind, id, name, meta }) {
+async function handleNodeUpdate({ station, kind, id, name, meta, at }) {
   const now = Date.now()
   const key = makeKey(station, kind, id)
 
+  // Queued samples carry the time they were taken (ms); never in the future
+  const sampleAt = at !== undefined && at !== null && Number.isFinite(Number(at))
+    ? Math.min(Number(at), now)
+    : now
+
+  // Upsert on (key, at) so a batch re-sent after a lost response does not
+  // duplicate history
+  await NodeSample.updateOne(
+    { key, at: new Date(sampleAt) },
+    { $setOnInsert: { station, kind, name, meta } },
+    { upsert: true }
+  );
+
+  // A backfilled sample older than what we already have is history only
+  const current = nodes.get(key)
+  if (current && current.lastSeen > sampleAt) return
+
   const node = {
     key,
     station,
     kind,
     name,
     meta,
-    lastSeen: now,   // ms timestamp
+    lastSeen: sampleAt,   // ms timestamp
     status: "OK"
   }
 
@@ -34,15 +51,6 @@ async function handleNodeUpdate({ station, kind, id, name, meta }) {
     { upsert: true, new: true }
   )
 
-    await NodeSample.create({
-    key,
-    station,
-    kind,
-    name,
-    at: new Date(now),
-    meta
-  });
-  
   io.emit("node:update", node)
   updateStationState(station)
 }
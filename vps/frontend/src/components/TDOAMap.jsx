@@ -11,6 +11,61 @@ const socket = io(API, {
   transports: ["websocket", "polling"],
 });
 
+// Helper: Google encoded polyline → [[lat, lon], ...]
+function decodePolyline(text, precision) {
+  const scale = Math.pow(10, precision);
+  const points = [];
+  let lat = 0;
+  let lon = 0;
+  let i = 0;
+  while (i < text.length) {
+    const deltas = [];
+    for (let k = 0; k < 2; k++) {
+      let shift = 0;
+      let acc = 0;
+      let c;
+      do {
+        c = text.charCodeAt(i++) - 63;
+        acc += (c & 0x1f) * Math.pow(2, shift);
+        shift += 5;
+      } while (c >= 0x20);
+      deltas.push(acc % 2 ? -(acc + 1) / 2 : acc / 2);
+    }
+    lat += deltas[0];
+    lon += deltas[1];
+    points.push([lat / scale, lon / scale]);
+  }
+  return points;
+}
+
+// Helper: base64 little-endian int32 deltas → [[lat, lon], ...]
+function unpackPolyline(text, precision) {
+  const bytes = Uint8Array.from(atob(text), (ch) => ch.charCodeAt(0));
+  const view = new DataView(bytes.buffer);
+  const scale = Math.pow(10, precision);
+  const points = [];
+  let lat = 0;
+  let lon = 0;
+  for (let off = 0; off + 8 <= bytes.length; off += 8) {
+    lat += view.getInt32(off, true);
+    lon += view.getInt32(off + 4, true);
+    points.push([lat / scale, lon / scale]);
+  }
+  return points;
+}
+
+// Helper: hyperbola segments in whichever encoding the solver used
+function hyperbolaSegments(h, encoding) {
+  const segments = h.segments || [h.points];
+  if (encoding?.format === "polyline") {
+    return segments.map((seg) => decodePolyline(seg, encoding.precision));
+  }
+  if (encoding?.format === "binary") {
+    return segments.map((seg) => unpackPolyline(seg, encoding.precision));
+  }
+  return segments.map((seg) => seg.map((pt) => [pt[0], pt[1]]));
+}
+
 // Helper: seconds → "Xh Ym Zs"
 function secToHMS(sec) {
   const n = Number(sec);
@@ -240,7 +295,7 @@ export default function TDOAMap({ result }) {
           return (
             <Polyline
               key={idx}
-              positions={h.points.map((pt) => [pt[0], pt[1]])}
+              positions={hyperbolaSegments(h, result?.encoding)}
               color={color}
               weight={2}
               opacity={0.85}
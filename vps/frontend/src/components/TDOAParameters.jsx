@@ -11,18 +11,18 @@ export default function TDOAParameters({ stations, times, setTimes, onResult })
   };
 
   const fetchJSON = async () => {
-    if (!stations || stations.length !== 4) {
-      alert("Need 4 stations before plotting.");
+    if (!stations || stations.length < 3 || times.length !== stations.length) {
+      alert("Need at least 3 stations (and one time per station) before plotting.");
       return;
     }
 
     const query = [
-      `lat1=${stations[0].lat}`, `lon1=${stations[0].lon}`,
-      `lat2=${stations[1].lat}`, `lon2=${stations[1].lon}`,
-      `lat3=${stations[2].lat}`, `lon3=${stations[2].lon}`,
-      `lat4=${stations[3].lat}`, `lon4=${stations[3].lon}`,
-      `tA=${times[0]}`, `tB=${times[1]}`, `tC=${times[2]}`, `tD=${times[3]}`,
-      tempC !== "" ? `tempC=${tempC}` : null // <<< NEW
+      ...stations.flatMap((s, i) => [`lat${i + 1}=${s.lat}`, `lon${i + 1}=${s.lon}`]),
+      ...times.map((t, i) => `t${String.fromCharCode(65 + i)}=${t}`),
+      tempC !== "" ? `tempC=${tempC}` : null, // <<< NEW
+      // Encoded, simplified hyperbolas (decoded in TDOAMap)
+      "format=polyline",
+      "tolerance=0.5"
     ]
       .filter(Boolean) // remove null if temp empty
       .join("&");